@@ -1,9 +1,12 @@
 # seed_data.py
 
 import os
+import sys
+import json
 import uuid
 import boto3
 from datetime import datetime
+from decimal import Decimal
 
 TABLE = os.getenv("TABLE_NAME", "TrackSmartData")
 dynamo = boto3.resource("dynamodb")
@@ -27,9 +30,11 @@ def seed_partners():
         }
     ]
 
-    for p in partners:
-        print(f"Seeding provider {p['pk']}…")
-        table.put_item(Item=p)
+    # batch_writer buffers puts into BatchWriteItem calls of 25 and resends unprocessed items
+    with table.batch_writer() as batch:
+        for p in partners:
+            print(f"Seeding provider {p['pk']}…")
+            batch.put_item(Item=p)
     print("Done seeding partners.")
 
 def seed_orders():
@@ -41,9 +46,26 @@ def seed_orders():
         "created_at": datetime.utcnow().isoformat()
     }
     print(f"Seeding a sample order {order['pk']}…")
-    table.put_item(Item=order)
+    with table.batch_writer() as batch:
+        batch.put_item(Item=order)
     print("Done seeding orders.")
 
+def seed_file(path):
+    """Stream an NDJSON file of items (each with pk and sk) into the table."""
+    count = 0
+    with open(path, encoding="utf-8") as f, table.batch_writer(overwrite_by_pkeys=["pk", "sk"]) as batch:
+        for line in f:
+            if line.strip():
+                # DynamoDB numbers must be Decimal, not float
+                batch.put_item(Item=json.loads(line, parse_float=Decimal))
+                count += 1
+                if count % 10000 == 0:
+                    print(f"Seeded {count} items…")
+    print(f"Done seeding {count} items from {path}.")
+
 if __name__ == "__main__":
-    seed_partners()
-    seed_orders()
+    if len(sys.argv) > 1:
+        seed_file(sys.argv[1])
+    else:
+        seed_partners()
+        seed_orders()
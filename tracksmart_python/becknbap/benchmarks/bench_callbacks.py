@@ -0,0 +1,79 @@
+"""
+Benchmark callback throughput against a local stub BAP.
+
+Compares the old delivery path (a fresh httpx.AsyncClient per callback, one
+detached task each) with the pooled CallbackDispatcher.
+
+Run from tracksmart_python/becknbap:
+    python -m benchmarks.bench_callbacks --callbacks 5000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.stub_bap import StubBAP
+from resources.callbacks import CallbackDispatcher
+
+PAYLOAD = {
+    "context": {"domain": "retail", "country": "IND", "city": "std:080", "action": "on_status"},
+    "message": {"order": {"id": "order-1", "state": "Confirmed"}},
+}
+
+
+async def per_request_client(url: str, count: int) -> float:
+    """The delivery path used before the dispatcher: one client per callback."""
+    async def send():
+        async with httpx.AsyncClient() as client:
+            try:
+                await client.post(url, json=PAYLOAD)
+            except Exception:
+                pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(send()) for _ in range(count)))
+    return time.perf_counter() - start
+
+
+async def pooled_dispatcher(url: str, count: int, workers: int) -> float:
+    dispatcher = CallbackDispatcher({"workers": workers, "queue_size": count})
+    await dispatcher.start()
+    start = time.perf_counter()
+    for _ in range(count):
+        await dispatcher.submit(url, PAYLOAD)
+    await dispatcher.queue.join()
+    elapsed = time.perf_counter() - start
+    await dispatcher.close()
+    return elapsed
+
+
+async def main(args):
+    async with StubBAP(port=args.port) as stub:
+        before = await per_request_client(stub.url, args.callbacks)
+        received_before = stub.received
+        after = await pooled_dispatcher(stub.url, args.callbacks, args.workers)
+        received_after = stub.received - received_before
+
+    print(json.dumps({
+        "callbacks": args.callbacks,
+        "before": {
+            "seconds": round(before, 3),
+            "callbacks_per_sec": round(args.callbacks / before, 1),
+            "delivered": received_before,
+        },
+        "after": {
+            "seconds": round(after, 3),
+            "callbacks_per_sec": round(args.callbacks / after, 1),
+            "delivered": received_after,
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--callbacks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--port", type=int, default=5099)
+    asyncio.run(main(parser.parse_args()))
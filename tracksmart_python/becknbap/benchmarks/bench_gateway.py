@@ -0,0 +1,234 @@
+"""
+Benchmark for the fan-out search aggregator (resources/aggregator.py).
+
+Runs a stub registry and a set of stub BPPs in a separate process, so they
+do not compete with the aggregator for the event loop. Most BPPs
+ACK and call back quickly; a share of them are slow to ACK (exercising
+hedging), slow to call back (the quorum cuts them off) or failing. Reports
+search latency percentiles, how many BPPs answered and how often the
+registry was actually hit.
+
+Run from the becknbap directory:
+
+    python benchmarks/bench_gateway.py --bpps 40 --searches 200
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from urllib.parse import parse_qs
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resources.aggregator import SearchAggregator  # noqa: E402
+
+ACK_BODY = b'{"message":{"ack":{"status":"ACK"}}}'
+NACK_BODY = b'{"message":{"ack":{"status":"NACK"}}}'
+NAMES = ["rice", "wheat flour", "sugar", "tea", "coffee", "salt", "lentils", "oil"]
+
+
+class StubNetwork:
+    """Registry at /api/participants and BPP n at /bpp/n."""
+
+    def __init__(self, bpps: int, host: str, port: int, slow_ack: float, slow_callback: float, failing: float):
+        self.host = host
+        self.port = port
+        self.client = None
+        self.tasks = set()
+        rng = random.Random(7)
+        self.behaviour = {}
+        for n in range(bpps):
+            roll = rng.random()
+            if roll < failing:
+                self.behaviour[n] = "fail"
+            elif roll < failing + slow_ack:
+                self.behaviour[n] = "slow_ack"
+            elif roll < failing + slow_ack + slow_callback:
+                self.behaviour[n] = "slow_callback"
+            else:
+                self.behaviour[n] = "fast"
+        self.catalogs = {
+            n: [
+                {"id": f"item-{i}", "descriptor": {"name": NAMES[i % len(NAMES)]},
+                 "price": {"currency": "INR", "value": str(rng.randint(20, 500))}}
+                for i in rng.sample(range(40), 10)
+            ]
+            for n in range(bpps)
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _respond(self, send, status: int, body: bytes):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _call_back(self, n: int, payload: dict, delay: float):
+        await asyncio.sleep(delay)
+        context = {**payload["context"], "action": "on_search", "bpp_id": f"bpp-{n}"}
+        body = {"context": context, "message": {"catalog": {"items": self.catalogs[n]}}}
+        try:
+            await self.client.post(payload["context"]["bap_uri"], json=body)
+        except httpx.HTTPError:
+            pass
+
+    async def app(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body, more_body = b"", True
+        while more_body:
+            event = await receive()
+            if event["type"] == "http.disconnect":
+                return
+            body += event.get("body", b"")
+            more_body = event.get("more_body", False)
+        path = scope["path"]
+        if path == "/api/participants":
+            participants = [
+                {"subscriberId": f"bpp-{n}", "type": "BPP", "url": f"{self.url}/bpp/{n}"}
+                for n in self.behaviour
+            ]
+            return await self._respond(send, 200, json.dumps(participants).encode())
+        n = int(path.split("/")[2])
+        behaviour = self.behaviour[n]
+        if behaviour == "fail":
+            return await self._respond(send, 500, NACK_BODY)
+        if behaviour == "slow_ack" and random.random() < 0.5:
+            # Only some requests stall, so a hedged copy usually gets through
+            await asyncio.sleep(1.0)
+        delay = random.uniform(0.01, 0.05)
+        if behaviour == "slow_callback":
+            delay = 3.0
+        task = asyncio.create_task(self._call_back(n, json.loads(body), delay))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        await self._respond(send, 200, ACK_BODY)
+
+    async def serve(self):
+        self.client = httpx.AsyncClient(timeout=5.0)
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", interface="asgi3")
+        await uvicorn.Server(config).serve()
+
+
+def run_network(*args):
+    asyncio.run(StubNetwork(*args).serve())
+
+
+class CallbackReceiver:
+    """The aggregator's /on_search endpoint, served in the benchmark process."""
+
+    def __init__(self, aggregator: SearchAggregator, host: str, port: int):
+        self.aggregator = aggregator
+        self.host = host
+        self.port = port
+
+    async def app(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body, more_body = b"", True
+        while more_body:
+            event = await receive()
+            body += event.get("body", b"")
+            more_body = event.get("more_body", False)
+        query = parse_qs(scope.get("query_string", b"").decode())
+        ok = self.aggregator.receive(json.loads(body), (query.get("bpp") or [None])[0])
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": ACK_BODY if ok else NACK_BODY})
+
+    async def __aenter__(self):
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", interface="asgi3")
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.should_exit = True
+        await self.task
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bpps", type=int, default=40)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=5, help="searches in flight at once")
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--slow-ack", type=float, default=0.1, help="share of BPPs that sometimes ACK late")
+    parser.add_argument("--slow-callback", type=float, default=0.1, help="share of BPPs that call back late")
+    parser.add_argument("--failing", type=float, default=0.05, help="share of BPPs that NACK")
+    parser.add_argument("--quorum", type=float, default=0.8)
+    parser.add_argument("--deadline", type=float, default=2.0)
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    network = multiprocessing.Process(
+        target=run_network,
+        args=(args.bpps, host, args.port, args.slow_ack, args.slow_callback, args.failing),
+        daemon=True,
+    )
+    network.start()
+    network_url = f"http://{host}:{args.port}"
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(f"{network_url}/api/participants")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+    aggregator = SearchAggregator({
+        "registry_url": f"{network_url}/api/participants",
+        "callback_url": f"http://{host}:{args.port + 1}/on_search",
+        "quorum": args.quorum,
+        "search_deadline": args.deadline,
+        "http2": False,
+    })
+    await aggregator.start()
+    limit = asyncio.Semaphore(args.concurrency)
+    latencies, responded = [], []
+
+    async def one_search():
+        async with limit:
+            context = {"domain": "retail", "country": "IND", "city": "std:080",
+                       "transaction_id": str(uuid.uuid4())}
+            message = {"intent": {"item": {"descriptor": {"name": random.choice(NAMES)}}}}
+            started = time.perf_counter()
+            result = await aggregator.search(context, message)
+            latencies.append((time.perf_counter() - started) * 1000)
+            responded.append(len(result["bpps"]["responded"]))
+
+    async with CallbackReceiver(aggregator, host, args.port + 1):
+        started = time.perf_counter()
+        await asyncio.gather(*(one_search() for _ in range(args.searches)))
+        elapsed = time.perf_counter() - started
+    await aggregator.close()
+    network.terminate()
+
+    print(f"{args.searches} searches over {args.bpps} BPPs in {elapsed:.2f}s "
+          f"({args.searches / elapsed:.1f} searches/s)")
+    print(f"latency ms  p50 {percentile(latencies, 0.5):.1f}  p95 {percentile(latencies, 0.95):.1f}  "
+          f"p99 {percentile(latencies, 0.99):.1f}")
+    print(f"BPPs answered per search: mean {statistics.mean(responded):.1f}")
+    print(f"hedged requests: {aggregator.hedged}, registry lookups: {aggregator.registry.lookups}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Benchmark request latency with the synchronous file handler and with the
+queue-based logging pipeline.
+
+Drives concurrent requests against the app (ASGI transport, no network) while
+every callback fails and is logged as a multi-line error, which is the
+pattern that used to block the event loop on disk writes. Logs go to a
+temporary directory.
+
+Run from tracksmart_python/becknbap:
+    python -m benchmarks.bench_logging --requests 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+import main
+from resources.logger import RateLimitFilter, build_file_handler, build_queue_pipeline
+
+REQUEST = {
+    "context": {
+        "domain": "retail", "country": "IND", "city": "std:080", "action": "support",
+        "bap_uri": "http://127.0.0.1:9/callback",
+    },
+    "message": {},
+}
+
+
+class FailingDispatcher:
+    """Stands in for the callback dispatcher; every delivery fails and is logged."""
+
+    async def submit(self, url, payload, action=None):
+        try:
+            raise ConnectionError("connection refused")
+        except ConnectionError as e:
+            main.logger.error(f"Failed to send callback to {url}: {main.format_exception_info(e)}")
+        return False
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def drive(total: int, concurrency: int):
+    transport = httpx.ASGITransport(app=main.app)
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bpp") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                await client.post("/support", json=REQUEST)
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "requests_per_sec": round(total / elapsed, 1),
+    }
+
+
+def install(root: logging.Logger, handler: logging.Handler):
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+
+async def run(args):
+    root = logging.getLogger()
+    saved_handlers = list(root.handlers)
+    main.callback_dispatcher = FailingDispatcher()
+    results = {"requests": args.requests, "concurrency": args.concurrency}
+    with tempfile.TemporaryDirectory() as tmp:
+        install(root, build_file_handler(os.path.join(tmp, "sync.log")))
+        results["sync_file_handler"] = await drive(args.requests, args.concurrency)
+
+        queue_handler, listener = build_queue_pipeline(build_file_handler(os.path.join(tmp, "queued.log")))
+        install(root, queue_handler)
+        listener.start()
+        results["queue_pipeline"] = await drive(args.requests, args.concurrency)
+
+        queue_handler.addFilter(RateLimitFilter(window=60, burst=10))
+        results["queue_pipeline_rate_limited"] = await drive(args.requests, args.concurrency)
+        listener.stop()
+
+        install(root, build_file_handler(os.path.join(tmp, "sync.json"), json_lines=True))
+        results["sync_json_lines"] = await drive(args.requests, args.concurrency)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in saved_handlers:
+        root.addHandler(handler)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Microbenchmarks for parsing and dumping the models in models.py.
+
+Each case reports microseconds per call, so the old and new ways of doing the
+same thing (e.g. building the ACK, encoding a callback) can be compared.
+
+Run from tracksmart_python/becknbap:
+    python -m benchmarks.bench_models --number 20000
+"""
+import argparse
+import json
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+import orjson
+
+from models import AckResponse, BecknRequest, BecknResponse, Catalog, Context, Item
+from resources.serialization import ACK_BODY, callback_body, dump_json, type_adapter
+
+CONTEXT = {
+    "domain": "retail", "country": "IND", "city": "std:080", "action": "status",
+    "bap_id": "bap.example.com", "bap_uri": "https://bap.example.com/callback",
+    "bpp_id": "bpp.example.com", "bpp_uri": "https://bpp.example.com",
+    "transaction_id": "6b1f6a0e-8a2b-4b69-9d0a-0c0ef7d7c0f1",
+    "message_id": "8f7b2c1e-4c2a-4a5e-9b7e-0b9d8f6c5a41",
+    "timestamp": "2025-01-01T00:00:00Z",
+}
+REQUEST = {"context": CONTEXT, "message": {"order": {"id": "order-1"}}}
+REQUEST_BYTES = json.dumps(REQUEST).encode()
+ITEMS = [
+    {"id": f"item{n}", "descriptor": {"name": f"Product {n}"},
+     "price": {"value": str(100 + n), "currency": "INR"}, "category_id": "grocery"}
+    for n in range(1000)
+]
+
+
+def old_callback(context: Context, message):
+    """The send_callback encoding used before the serialization layer."""
+    response_context = context.model_copy()
+    response_context.action = f"on_{context.action}"
+    response_context.message_id = str(uuid.uuid4())
+    response_context.timestamp = datetime.now(timezone.utc).isoformat() + "Z"
+    payload = BecknResponse(context=response_context, message=message)
+    return json.dumps(payload.model_dump(mode="json")).encode()
+
+
+def new_callback(context: Context, message):
+    response_context = context.model_copy(update={
+        "action": f"on_{context.action}",
+        "message_id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat() + "Z",
+    })
+    return callback_body(response_context, message)
+
+
+def main(args):
+    context = Context(**CONTEXT)
+    catalog = Catalog(items=[Item(**item) for item in ITEMS])
+    request_adapter = type_adapter(BecknRequest)
+    order_message = {"order": {"id": "order-1", "state": "Confirmed"}}
+
+    cases = {
+        "parse_request_model_validate": lambda: BecknRequest.model_validate(REQUEST),
+        "parse_request_json_loads_then_validate": lambda: BecknRequest(**json.loads(REQUEST_BYTES)),
+        "parse_request_model_validate_json": lambda: BecknRequest.model_validate_json(REQUEST_BYTES),
+        "parse_request_cached_adapter_json": lambda: request_adapter.validate_json(REQUEST_BYTES),
+        "ack_create_model_and_dump": lambda: AckResponse(message={"ack": {"status": "ACK"}}).model_dump_json(),
+        "ack_static_bytes": lambda: ACK_BODY,
+        "callback_old_model_dump_json_dumps": lambda: old_callback(context, order_message),
+        "callback_new_dump_json_bytes": lambda: new_callback(context, order_message),
+    }
+    catalog_cases = {
+        "catalog_1000_validate": lambda: Catalog(items=[Item(**item) for item in ITEMS]),
+        "catalog_1000_model_dump_json_dumps": lambda: json.dumps(catalog.model_dump(mode="json")),
+        "catalog_1000_model_dump_orjson": lambda: orjson.dumps(catalog.model_dump(mode="json")),
+        "catalog_1000_dump_json_bytes": lambda: dump_json(catalog),
+    }
+
+    results = {}
+    for name, func in cases.items():
+        seconds = timeit.timeit(func, number=args.number)
+        results[name] = round(seconds / args.number * 1e6, 3)
+    for name, func in catalog_cases.items():
+        seconds = timeit.timeit(func, number=args.catalog_number)
+        results[name] = round(seconds / args.catalog_number * 1e6, 3)
+    print(json.dumps({"unit": "us_per_call", "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--catalog-number", type=int, default=50)
+    main(parser.parse_args())
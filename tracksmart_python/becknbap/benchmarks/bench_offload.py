@@ -0,0 +1,129 @@
+"""
+Benchmark for the offload executor (resources/offload.py).
+
+Large filtered searches (every page of a generated catalog, validated and
+encoded per page) run back to back while a probe sends small /status
+requests at a steady rate. Reported: ACK latency percentiles of the small
+requests (from when each was due) and how many large searches completed, so runs with --executor
+inline, thread and process can be compared. The app runs in-process on the
+in-memory SQLite backend; callbacks are encoded but not sent anywhere.
+
+Run from tracksmart_python/becknbap:
+    python -m benchmarks.bench_offload --items 20000 --executor process
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+import main
+from resources.offload import Offloader
+from resources.storage import create_storage
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 2) if ordered else None
+
+
+def generate_item(n: int) -> dict:
+    return {
+        "id": f"item{n:08d}",
+        "descriptor": {"name": f"product {n}"},
+        "price": {"currency": "INR", "value": f"{random.uniform(10, 5000):.2f}"},
+        "category_id": f"category-{n % 50}",
+        "tags": {"brand": f"brand-{n % 200}", "veg": n % 2 == 0},
+    }
+
+
+def request(action: str, message: dict) -> dict:
+    return {
+        "context": {
+            "domain": "retail", "country": "IND", "city": "std:080", "action": action,
+            "bap_id": "bench-bap", "bap_uri": "http://bap.invalid/", "transaction_id": str(uuid.uuid4()),
+            "message_id": str(uuid.uuid4()), "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "message": message,
+    }
+
+
+async def run(args):
+    await main.start_services(await create_storage("memory"))
+    main.admission_controller = None
+    main.offloader.close()
+    main.offloader = Offloader({
+        "executor": args.executor,
+        "max_workers": args.workers,
+        "offload_min_items": args.min_items,
+    })
+    main.offloader.start()
+    main.catalog_cache.offloader = main.offloader
+    main.callback_dispatcher.offloader = main.offloader
+
+    callback_bytes = 0
+
+    async def discard(url, payload, action=None, bap_id=None):
+        nonlocal callback_bytes
+        callback_bytes += len(payload)
+        return True
+
+    main.callback_dispatcher.submit = discard
+    await main.storage.catalog.replace_all([generate_item(n) for n in range(args.items)])
+    await main.catalog_cache.load()
+    main.catalog_cache.config["search_page_size"] = args.page_size
+    order_id = str(uuid.uuid4())
+    await main.storage.orders.insert({"id": order_id, "state": "Created", "items": []})
+
+    transport = httpx.ASGITransport(app=main.app)
+    probe_latencies = []
+    searches = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bpp", timeout=120) as client:
+        # Warm the pool up so worker start-up is not measured
+        await client.post("/search", json=request("search", {"intent": {"item": {"price": {"minimum_value": 0}}}}))
+        deadline = time.perf_counter() + args.duration
+
+        async def large_searches():
+            nonlocal searches
+            # A filter matching every item, so pages are read and validated rather than served from the cache
+            message = {"intent": {"item": {"price": {"minimum_value": 0}}}}
+            while time.perf_counter() < deadline:
+                # Every page is sent, from the request's background task
+                await client.post("/search", json=request("search", message))
+                searches += 1
+
+        async def probe():
+            # Latency is measured from when each request was due, so time spent
+            # waiting for a blocked event loop counts against it
+            due = time.perf_counter()
+            while due < deadline:
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                await client.post("/status", json=request("status", {"order": {"id": order_id}}))
+                probe_latencies.append(time.perf_counter() - due)
+                due = max(due + args.probe_interval, time.perf_counter())
+
+        started = time.perf_counter()
+        await asyncio.gather(probe(), *(large_searches() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    await main.stop_services()
+
+    print(f"executor {args.executor}: {searches} large searches of {args.items} items in {elapsed:.1f}s, "
+          f"{callback_bytes / 1e6:.1f} MB of callbacks encoded")
+    print(f"small /status ACK  p50 {percentile(probe_latencies, 50)}ms  p99 {percentile(probe_latencies, 99)}ms  "
+          f"max {percentile(probe_latencies, 100)}ms  ({len(probe_latencies)} requests)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--executor", choices=("inline", "thread", "process"), default="process")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--min-items", type=int, default=500, help="offload_min_items")
+    parser.add_argument("--page-size", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=2, help="large searches in flight at once")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--probe-interval", type=float, default=0.02, help="seconds between small requests")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""
+Benchmark order lookups as the orders collection grows.
+
+For each collection size it measures p50/p99 latency of the /status lookup,
+the /track projected lookup and the /cancel write, once without indexes and
+once after ensure_indexes, and compares update_one + find_one with a single
+find_one_and_update.
+
+Run from tracksmart_python/becknbap against a local mongod:
+    python -m benchmarks.bench_orders --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from pymongo import AsyncMongoClient, ReturnDocument
+
+from resources.indexes import ensure_indexes
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def generate_order() -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "items": [{"id": "item1", "descriptor": {"name": "Product 1"},
+                   "price": {"value": "100", "currency": "INR"}}],
+        "state": "Confirmed",
+        "provider": {"id": f"bpp-{random.randint(1, 20)}"},
+        "payment": {"status": "Pending"},
+    }
+
+
+async def measure(repeat, func, ids):
+    samples = []
+    for _ in range(repeat):
+        order_id = random.choice(ids)
+        start = time.perf_counter()
+        await func(order_id)
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+async def run_cases(orders, ids, repeat):
+    async def status(order_id):
+        await orders.find_one({"id": order_id}, {"_id": 0})
+
+    async def track(order_id):
+        await orders.find_one({"id": order_id}, {"_id": 0, "state": 1})
+
+    async def cancel_two_round_trips(order_id):
+        await orders.update_one({"id": order_id}, {"$set": {"state": "Cancelled"}})
+        await orders.find_one({"id": order_id}, {"_id": 0})
+
+    async def cancel_single_round_trip(order_id):
+        await orders.find_one_and_update(
+            {"id": order_id}, {"$set": {"state": "Cancelled"}},
+            projection={"_id": 0}, return_document=ReturnDocument.AFTER,
+        )
+
+    return {
+        "status": await measure(repeat, status, ids),
+        "track": await measure(repeat, track, ids),
+        "cancel_update_then_find": await measure(repeat, cancel_two_round_trips, ids),
+        "cancel_find_one_and_update": await measure(repeat, cancel_single_round_trip, ids),
+    }
+
+
+async def main(args):
+    client = AsyncMongoClient(args.mongo_uri)
+    db = client[args.db]
+    results = []
+    for size in args.sizes:
+        await client.drop_database(args.db)
+        orders = db["orders"]
+        ids = []
+        for start in range(0, size, 5000):
+            batch = [generate_order() for _ in range(min(5000, size - start))]
+            ids.extend(order["id"] for order in batch)
+            await orders.insert_many(batch, ordered=False)
+        unindexed = await run_cases(orders, ids, min(args.repeat, args.unindexed_repeat))
+        await ensure_indexes(db)
+        indexed = await run_cases(orders, ids, args.repeat)
+        results.append({"orders": size, "unindexed": unindexed, "indexed": indexed})
+    print(json.dumps(results, indent=2))
+    await client.drop_database(args.db)
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--unindexed-repeat", type=int, default=50,
+                        help="fewer samples for the collection-scan runs")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="tracksmart_bench")
+    asyncio.run(main(parser.parse_args()))
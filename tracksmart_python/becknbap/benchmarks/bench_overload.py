@@ -0,0 +1,102 @@
+"""
+Overload benchmark for admission control (resources/admission.py).
+
+A noisy BAP floods /search with many concurrent requests while a polite BAP
+sends a steady trickle. The app runs in-process on the in-memory SQLite
+backend with callbacks delivered to a local stub BAP. Reported per BAP:
+response status counts and response time percentiles, so runs with and
+without --no-admission show whether the polite BAP is protected. Over the
+in-process ASGI transport a response completes only after the request's
+background tasks, so admitted searches include queueing their callbacks.
+
+Run from tracksmart_python/becknbap:
+    python -m benchmarks.bench_overload --noisy-requests 5000 --noisy-rate 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+import main
+from benchmarks.stub_bap import StubBAP
+from resources.admission import AdmissionController
+from resources.storage import create_storage
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 2) if ordered else None
+
+
+async def send(client: httpx.AsyncClient, stub: StubBAP, bap_id: str, statuses, latencies):
+    body = {
+        "context": {
+            "domain": "retail", "country": "IND", "city": "std:080", "action": "search",
+            "bap_id": bap_id, "bap_uri": stub.url, "transaction_id": str(uuid.uuid4()),
+            "message_id": str(uuid.uuid4()), "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "message": {"intent": {"item": {"descriptor": {"name": "Product"}}}},
+    }
+    started = time.perf_counter()
+    response = await client.post("/search", json=body)
+    latencies[bap_id].append(time.perf_counter() - started)
+    statuses[bap_id][response.status_code] += 1
+
+
+async def run(args):
+    statuses = defaultdict(Counter)
+    latencies = defaultdict(list)
+    async with StubBAP(port=args.stub_port) as stub:
+        await main.start_services(await create_storage("memory"))
+        await main.init_catalog()
+        if args.no_admission:
+            main.admission_controller = None
+        else:
+            main.admission_controller = AdmissionController(
+                {
+                    "baps": {"noisy-bap": {"rate": args.noisy_rate, "burst": args.noisy_rate}},
+                    "max_in_flight": args.max_in_flight,
+                },
+                main.admission_controller.queue_depth,
+            )
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bpp", timeout=60) as client:
+            limit = asyncio.Semaphore(args.noisy_concurrency)
+
+            async def noisy():
+                async with limit:
+                    await send(client, stub, "noisy-bap", statuses, latencies)
+
+            async def polite():
+                for _ in range(args.polite_requests):
+                    await send(client, stub, "polite-bap", statuses, latencies)
+                    await asyncio.sleep(1 / args.polite_rate)
+
+            started = time.perf_counter()
+            await asyncio.gather(polite(), *(noisy() for _ in range(args.noisy_requests)))
+            elapsed = time.perf_counter() - started
+        await main.stop_services()
+
+    print(f"admission {'off' if args.no_admission else 'on'}, {elapsed:.2f}s, "
+          f"{stub.received} callbacks delivered")
+    for bap_id in ("polite-bap", "noisy-bap"):
+        counts = ", ".join(f"{status}: {count}" for status, count in sorted(statuses[bap_id].items()))
+        print(f"{bap_id:11s} {counts:24s} p50 {percentile(latencies[bap_id], 50)}ms "
+              f"p99 {percentile(latencies[bap_id], 99)}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--noisy-requests", type=int, default=3000)
+    parser.add_argument("--noisy-concurrency", type=int, default=50)
+    parser.add_argument("--noisy-rate", type=float, default=100.0, help="requests/s allowed to the noisy BAP")
+    parser.add_argument("--polite-requests", type=int, default=100)
+    parser.add_argument("--polite-rate", type=float, default=20.0, help="requests/s sent by the polite BAP")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--no-admission", action="store_true", help="run without admission control")
+    parser.add_argument("--stub-port", type=int, default=5097)
+    asyncio.run(run(parser.parse_args()))
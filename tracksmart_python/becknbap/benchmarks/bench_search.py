@@ -0,0 +1,117 @@
+"""
+Benchmark catalog search over a large generated catalog.
+
+Loads N generated `Item` documents into a scratch database, creates the
+startup indexes and reports latency percentiles and payload size for the
+old full-collection search and for filtered, paginated queries.
+
+Run from tracksmart_python/becknbap against a local mongod:
+    python -m benchmarks.bench_search --items 100000 --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from pymongo import AsyncMongoClient
+
+from models import Catalog, Item
+from resources.catalog_search import (
+    CATALOG_PROJECTION, build_catalog_query, catalog_document, find_catalog_page
+)
+from resources.indexes import ensure_indexes
+
+CATEGORIES = [f"category-{n}" for n in range(50)]
+WORDS = ["rice", "atta", "dal", "oil", "sugar", "salt", "tea", "coffee", "soap", "biscuit"]
+
+
+def generate_item(n: int) -> dict:
+    return {
+        "id": f"item{n:08d}",
+        "descriptor": {"name": f"{random.choice(WORDS)} {random.choice(WORDS)} {n}"},
+        "price": {"currency": "INR", "value": f"{random.uniform(10, 5000):.2f}"},
+        "category_id": random.choice(CATEGORIES),
+        "tags": {"brand": f"brand-{n % 200}", "veg": n % 2 == 0},
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(samples, payload_bytes):
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "payload_bytes": payload_bytes,
+    }
+
+
+async def full_scan(collection):
+    """The search path before pagination: every item in one payload."""
+    items = [Item(**item) async for item in collection.find({}, CATALOG_PROJECTION)]
+    return json.dumps(Catalog(items=items).model_dump(mode="json"))
+
+
+async def paged(collection, message, limit):
+    documents, _ = await find_catalog_page(collection, build_catalog_query(message), None, limit)
+    items = [Item(**document).model_dump(mode="json") for document in documents]
+    return json.dumps({"catalog": {"items": items}})
+
+
+async def timed(repeat, func, *args):
+    samples, body = [], ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await func(*args)
+        samples.append(time.perf_counter() - start)
+    return report(samples, len(body.encode()))
+
+
+async def main(args):
+    client = AsyncMongoClient(args.mongo_uri)
+    db = client[args.db]
+    collection = db["catalog"]
+    await collection.drop()
+    batch = []
+    for n in range(args.items):
+        batch.append(catalog_document(generate_item(n)))
+        if len(batch) == 5000:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    await ensure_indexes(db)
+
+    cases = {
+        "category": {"intent": {"category": {"id": "category-7"}}},
+        "price_range": {"intent": {"item": {"price": {"minimum_value": "100", "maximum_value": "150"}}}},
+        "name_text": {"intent": {"item": {"descriptor": {"name": "coffee"}}}},
+        "tags": {"intent": {"item": {"tags": {"brand": "brand-42"}}}},
+        "unfiltered_page": {},
+    }
+    results = {"items": args.items, "page_size": args.page_size}
+    results["full_scan"] = await timed(args.full_scan_repeat, full_scan, collection)
+    for name, message in cases.items():
+        results[name] = await timed(args.repeat, paged, collection, message, args.page_size)
+    print(json.dumps(results, indent=2))
+
+    if not args.keep:
+        await client.drop_database(args.db)
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--full-scan-repeat", type=int, default=3)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="tracksmart_bench")
+    parser.add_argument("--keep", action="store_true", help="keep the generated database")
+    asyncio.run(main(parser.parse_args()))
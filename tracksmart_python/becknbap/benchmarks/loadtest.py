@@ -0,0 +1,191 @@
+"""
+Load test for the BPP endpoints in main.py.
+
+Each virtual user runs the full /search -> /select -> /init -> /confirm ->
+/status -> /track flow against the app, with callbacks delivered to a local
+stub BAP. The app runs in-process over the ASGI transport against a local
+mongod (--mongo-uri), mongomock-motor (--mongomock) or the in-memory SQLite
+storage backend (--sqlite).
+
+Reported per action: ACK latency percentiles and callback round trip (request
+sent until the on_<action> callback reaches the stub BAP). Also reported:
+flow and request throughput, errors, and memory. Results are written as JSON
+(--output) so runs can be compared for regressions.
+
+Run from tracksmart_python/becknbap:
+    python -m benchmarks.loadtest --mongomock --flows 500 --concurrency 50 --output loadtest.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import statistics
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+from pymongo import AsyncMongoClient
+
+import main
+from benchmarks.stub_bap import StubBAP
+from resources.storage import Storage, create_storage
+from resources.utils import MongoClient
+
+FLOW = ["search", "select", "init", "confirm", "status", "track"]
+ITEM = {"id": "item1", "descriptor": {"name": "Product 1"}, "price": {"value": "100", "currency": "INR"}}
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(pct):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": at(50), "p90_ms": at(90), "p99_ms": at(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+    }
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, stub: StubBAP, callback_timeout: float):
+        self.client = client
+        self.stub = stub
+        self.callback_timeout = callback_timeout
+        self.ack_latency = defaultdict(list)
+        self.callback_latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.requests = 0
+
+    def context(self, action: str, transaction_id: str) -> dict:
+        return {
+            "domain": "retail", "country": "IND", "city": "std:080", "action": action,
+            "bap_id": "loadtest-bap", "bap_uri": self.stub.url,
+            "bpp_id": "tracksmart-bpp", "bpp_uri": "http://bpp.local",
+            "transaction_id": transaction_id, "message_id": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def call(self, action: str, transaction_id: str, message: dict):
+        """Send one action, record ACK and callback latency, return the callback payload."""
+        callback = self.stub.expect(transaction_id, f"on_{action}")
+        body = {"context": self.context(action, transaction_id), "message": message}
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(f"/{action}", json=body)
+        except Exception:
+            self.errors[f"{action}_request"] += 1
+            return None
+        self.ack_latency[action].append(time.perf_counter() - start)
+        self.requests += 1
+        if response.status_code != 200 or b'"ACK"' not in response.content:
+            self.errors[f"{action}_nack"] += 1
+            return None
+        try:
+            received_at, payload = await asyncio.wait_for(callback, timeout=self.callback_timeout)
+        except asyncio.TimeoutError:
+            self.stub.waiters.pop((transaction_id, f"on_{action}"), None)
+            self.errors[f"{action}_callback_timeout"] += 1
+            return None
+        self.callback_latency[action].append(received_at - start)
+        if payload.get("error"):
+            self.errors[f"{action}_callback_error"] += 1
+        return payload
+
+    async def flow(self):
+        transaction_id = str(uuid.uuid4())
+        order = {"items": [ITEM]}
+        await self.call("search", transaction_id, {"intent": {}})
+        await self.call("select", transaction_id, {"order": order})
+        await self.call("init", transaction_id, {"order": order})
+        confirmed = await self.call("confirm", transaction_id, {"order": order})
+        order_id = ((confirmed or {}).get("message") or {}).get("order", {}).get("id")
+        if not order_id:
+            self.errors["flow_without_order"] += 1
+            return
+        await self.call("status", transaction_id, {"order": {"id": order_id}})
+        await self.call("track", transaction_id, {"order": {"id": order_id}})
+
+
+async def connect(args) -> Storage:
+    if args.sqlite:
+        return await create_storage("memory")
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    else:
+        client = AsyncMongoClient(args.mongo_uri)
+        await client.drop_database(args.db)
+    return await create_storage("mongo", MongoClient(client, db_name=args.db, collection_name=""))
+
+
+async def run(args):
+    tracemalloc.start()
+    async with StubBAP(port=args.stub_port) as stub:
+        await main.start_services(await connect(args))
+        # One BAP drives every flow; admission control is measured by bench_overload
+        main.admission_controller = None
+        await main.init_catalog()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bpp", timeout=30) as client:
+            test = LoadTest(client, stub, args.callback_timeout)
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def limited():
+                async with semaphore:
+                    await test.flow()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(limited() for _ in range(args.flows)))
+            elapsed = time.perf_counter() - start
+        await main.stop_services()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results = {
+        "config": {
+            "flows": args.flows, "concurrency": args.concurrency,
+            "backend": "sqlite" if args.sqlite else "mongomock" if args.mongomock else args.mongo_uri,
+            "python": platform.python_version(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "duration_s": round(elapsed, 3),
+        "throughput": {
+            "flows_per_sec": round(args.flows / elapsed, 2),
+            "requests_per_sec": round(test.requests / elapsed, 2),
+        },
+        "ack_latency": {action: percentiles(test.ack_latency[action]) for action in FLOW},
+        "callback_round_trip": {action: percentiles(test.callback_latency[action]) for action in FLOW},
+        "errors": dict(test.errors),
+        "memory": {
+            "python_peak_mb": round(peak / 2**20, 2),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+        },
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flows", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock-motor instead of a mongod")
+    parser.add_argument("--sqlite", action="store_true", help="use the in-memory SQLite storage backend")
+    parser.add_argument("--db", default="tracksmart_loadtest")
+    parser.add_argument("--stub-port", type=int, default=5098)
+    parser.add_argument("--callback-timeout", type=float, default=10.0)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    asyncio.run(run(parser.parse_args()))
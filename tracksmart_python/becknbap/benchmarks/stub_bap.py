@@ -0,0 +1,80 @@
+"""
+A minimal BAP callback receiver used by the benchmarks.
+
+It ACKs every POST and counts what it received, optionally keeping the
+decoded bodies so a benchmark can match callbacks to requests, and lets a
+benchmark wait for the callback of a given transaction and action.
+"""
+import asyncio
+import json
+import time
+
+import uvicorn
+
+ACK_BODY = b'{"message":{"ack":{"status":"ACK"}}}'
+
+
+class StubBAP:
+    def __init__(self, host: str = "127.0.0.1", port: int = 5099, keep_bodies: bool = False):
+        self.host = host
+        self.port = port
+        self.keep_bodies = keep_bodies
+        self.received = 0
+        self.bodies = []
+        self.waiters = {}
+        self.server = None
+        self.task = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+    async def app(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        more_body = True
+        while more_body:
+            event = await receive()
+            body += event.get("body", b"")
+            more_body = event.get("more_body", False)
+        self.received += 1
+        received_at = time.perf_counter()
+        if (self.keep_bodies or self.waiters) and body:
+            payload = json.loads(body)
+            if self.keep_bodies:
+                self.bodies.append((received_at, payload))
+            context = payload.get("context") or {}
+            waiter = self.waiters.pop((context.get("transaction_id"), context.get("action")), None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result((received_at, payload))
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": ACK_BODY})
+
+    def expect(self, transaction_id: str, action: str) -> asyncio.Future:
+        """
+        Return a future resolved with (received_at, payload) when the callback
+        for `action` (e.g. "on_confirm") of `transaction_id` arrives.
+        Register it before sending the request.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[(transaction_id, action)] = future
+        return future
+
+    async def __aenter__(self):
+        config = uvicorn.Config(
+            self.app, host=self.host, port=self.port, log_level="warning", interface="asgi3"
+        )
+        self.server = uvicorn.Server(config)
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.should_exit = True
+        await self.task
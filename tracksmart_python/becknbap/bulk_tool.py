@@ -0,0 +1,102 @@
+"""
+Bulk import and export of the catalog and orders.
+
+Imports stream NDJSON or CSV files (nested fields as dotted CSV columns, e.g.
+descriptor.name, price.value) through batched validation and parallel bulk
+upserts keyed on `id`. Exports stream a collection to NDJSON or CSV. Use "-"
+as the file for stdin/stdout. The format defaults to the file extension.
+
+Works on MongoDB only: the SQLite and DynamoDB backends (STORAGE_BACKEND) are
+rejected. Run from tracksmart_python/becknbap (connects with
+appRepo/mongo_config.json unless --mongo-uri is given):
+    python bulk_tool.py import catalog items.ndjson --batch-size 2000 --parallel 8
+    python bulk_tool.py export orders orders.csv
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from pymongo import AsyncMongoClient
+
+from resources.bulk import BULK_TARGETS, BulkImporter, export_collection, read_records
+from resources.catalog_cache import bump_catalog_version
+from resources.indexes import ensure_indexes
+from resources.utils import MongoClient
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+async def connect(args) -> MongoClient:
+    if args.mongo_uri:
+        return MongoClient(AsyncMongoClient(args.mongo_uri), db_name=args.db, collection_name="")
+    client = await MongoClient.create()
+    if client is None:
+        sys.exit("Could not connect to MongoDB, see the system log")
+    return client
+
+
+async def run_import(db, args):
+    fmt = detect_format(args.file, args.format)
+    stream = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    importer = BulkImporter(db, args.target, {
+        "batch_size": args.batch_size,
+        "parallel_batches": args.parallel,
+    })
+    start = time.perf_counter()
+    try:
+        summary = await importer.run(read_records(stream, fmt))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    if args.target == "catalog":
+        # Running BPP workers reload their catalog caches on the version bump.
+        await bump_catalog_version(db)
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    summary["records_per_sec"] = round(summary["read"] / summary["seconds"], 1) if summary["seconds"] else None
+    print(json.dumps(summary, indent=2))
+
+
+async def run_export(db, args):
+    fmt = detect_format(args.file, args.format)
+    stream = sys.stdout if args.file == "-" else open(args.file, "w", newline="", encoding="utf-8")
+    try:
+        written = await export_collection(db, args.target, stream, fmt, batch_size=args.batch_size)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"Exported {written} {args.target} records", file=sys.stderr)
+
+
+async def main(args):
+    backend = os.getenv("STORAGE_BACKEND", "mongo").lower()
+    if backend != "mongo" and not args.mongo_uri:
+        sys.exit(f"bulk_tool.py only supports MongoDB, not STORAGE_BACKEND={backend}")
+    client = await connect(args)
+    try:
+        if args.command == "import":
+            await ensure_indexes(client.db)
+            await run_import(client.db, args)
+        else:
+            await run_export(client.db, args)
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("target", choices=sorted(BULK_TARGETS))
+    parser.add_argument("file", help='input/output path, or "-" for stdin/stdout')
+    parser.add_argument("--format", choices=["ndjson", "csv"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--parallel", type=int, default=4, help="bulk_write batches in flight")
+    parser.add_argument("--mongo-uri", help="connect here instead of using mongo_config.json")
+    parser.add_argument("--db", default="DBtest", help="database name with --mongo-uri")
+    asyncio.run(main(parser.parse_args()))
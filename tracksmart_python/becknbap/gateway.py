@@ -0,0 +1,92 @@
+"""
+A Beckn gateway that answers /search with one aggregated on_search.
+
+The BAP's search is ACKed immediately and fanned out to every BPP in the
+registry by resources.aggregator.SearchAggregator; the BPPs call back on
+/on_search, and the merged catalog is sent to the BAP as a single on_search.
+Set `callback_url` in appRepo/gateway_config.json to this app's /on_search.
+
+    uvicorn gateway:app --port 5000
+"""
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+from models import BecknRequest, Context
+from resources.aggregator import SearchAggregator
+from resources.callbacks import CallbackDispatcher
+from resources.logger import Logger, format_exception_info
+from resources.metrics import REGISTRY, MetricsMiddleware
+from resources.serialization import FastJSONResponse, ack_response, callback_body, nack_response
+
+logger = Logger()
+# Fan-out client, registry cache and in-flight searches
+aggregator = None
+# Delivers the aggregated on_search to the BAP
+callback_dispatcher = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global aggregator, callback_dispatcher
+    aggregator = await SearchAggregator.create()
+    callback_dispatcher = await CallbackDispatcher.create()
+    yield
+    await callback_dispatcher.close()
+    await aggregator.close()
+
+app = FastAPI(
+    title="Beckn Gateway",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(MetricsMiddleware)
+
+
+async def aggregate_search(context: Context, message: dict):
+    try:
+        result = await aggregator.search(context.model_dump(mode="json", exclude_none=True), message)
+        logger.info(
+            f"Search {context.transaction_id}: {len(result['bpps']['responded'])}/{result['bpps']['queried']} "
+            f"BPPs in {result['elapsed_ms']}ms"
+        )
+        if not context.bap_uri:
+            return
+        response_context = context.model_copy(update={
+            "action": "on_search",
+            "message_id": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat() + "Z",
+        })
+        body = callback_body(response_context, {"catalog": result["catalog"]})
+        await callback_dispatcher.submit(str(context.bap_uri), body, action="on_search")
+    except Exception as e:
+        logger.error(f"Search {context.transaction_id} failed: {format_exception_info(e)}")
+
+
+@app.post("/search")
+async def search(request: BecknRequest, background_tasks: BackgroundTasks):
+    if aggregator is None:
+        return nack_response(503)
+    background_tasks.add_task(aggregate_search, request.context, request.message)
+    return ack_response()
+
+
+@app.post("/on_search")
+async def on_search(request: Request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        return nack_response(400)
+    if aggregator is None or not aggregator.receive(payload, request.query_params.get("bpp")):
+        # Late or unknown: the search has already been answered
+        return nack_response()
+    return ack_response()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,105 +1,351 @@
 import asyncio
-import httpx
+import os
 import uuid
 from datetime import datetime, timezone
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+
+from pydantic import ValidationError
 
 from models import (
-    Context, Error, AckResponse, Item,
-    Catalog, Order, BecknRequest, BecknResponse
+    Context, Error, Order, BecknRequest, Rating, Tracking, TrackingSubscription
 )
+from resources.admission import AdmissionController, AdmissionMiddleware
+from resources.callbacks import CallbackDispatcher
+from resources.catalog_cache import CatalogCache
+from resources.catalog_search import build_catalog_query, parse_pagination
+from resources.idempotency import IdempotencyCache
 from resources.logger import Logger, format_exception_info
-from resources.utils import MongoClient
+from resources.metrics import REGISTRY, MetricsMiddleware, probe_event_loop_lag, watch_dispatcher
+from resources.offload import Offloader
+from resources.order_batch import DEFAULT_BATCH_CONFIG, batch_order_ids, chunked
+from resources.order_state import (
+    CANCELLED, OrderConflict, conflict_error, expected_version, parse_update, sources
+)
+from resources.ratings import RatingStatsCache, empty_stats, rating_keys, summarize
+from resources.serialization import (
+    FastJSONResponse, ack_response, callback_body, catalog_callback_body, dump_json, encode_documents,
+    encode_items, nack_response, with_field
+)
+from resources.shipment_events import parse_time
+from resources.storage import Storage, create_storage
+from resources.tracking import TrackingStore, check_webhook_url
+from resources.utils import ConfigManager, MongoClient
 
 logger = Logger()
-# MongoDB client initialization
-mongo_client = None
+# Repositories of the configured storage backend (see resources.storage)
+storage = None
+# MongoDB database when the backend is MongoDB, else None
 db = None
+# Shared callback dispatcher (pooled HTTP client + bounded worker queue)
+callback_dispatcher = None
+# In-memory catalog snapshot shared by /search and /select
+catalog_cache = None
+# Running rating stats per provider and item, served to /search and /ratings
+rating_stats = None
+# Latest order states and push subscriptions for tracking
+tracking_store = None
+# Results of recent requests, keyed on transaction_id/message_id/action
+idempotency_cache = None
+# (message, error) returned by the action handlers
+ActionResult = Tuple[Dict[str, Any], Optional[Error]]
+# Seconds between keep-alive comments on idle tracking streams
+SSE_HEARTBEAT = 15.0
+# Background task measuring event-loop lag for /metrics
+loop_lag_probe = None
+# Per-BAP rate limits and load shedding, applied by AdmissionMiddleware
+admission_controller = None
+# Executor for validating/serializing large catalogs and compressing large callbacks
+offloader = None
+# Background task opening storage and starting the services (see lifespan)
+startup_task = None
+# First and longest wait between attempts to reach the database at startup
+STARTUP_RETRY_DELAY = 1.0
+STARTUP_RETRY_MAX = 30.0
+
+async def open_storage(backend: Optional[str] = None) -> Optional[Storage]:
+    """Connect the configured backend (STORAGE_BACKEND, MongoDB by default)."""
+    backend = backend or os.getenv("STORAGE_BACKEND", "mongo")
+    client = await MongoClient.create() if backend == "mongo" else None
+    try:
+        return await create_storage(backend, client)
+    except Exception as e:
+        logger.error(f"Failed to open {backend} storage: {format_exception_info(e)}")
+        if client is not None:
+            await client.close()
+        return None
+
+async def start_services(repositories: Optional[Storage]):
+    """
+    Wire up every component around the storage repositories (or None when the
+    database is unavailable). Split out of lifespan so benchmarks can start
+    the app against a local MongoDB stand-in or the SQLite backend.
+    """
+    global storage, db, callback_dispatcher, catalog_cache, rating_stats, tracking_store, idempotency_cache
+    global loop_lag_probe, admission_controller, offloader
+    loop_lag_probe = asyncio.create_task(probe_event_loop_lag())
+    offloader = await Offloader.create()
+    storage = repositories
+    if storage is None:
+        logger.error("Failed to connect to the database during startup")
+    else:
+        db = storage.db
+        try:
+            catalog_cache = await CatalogCache.create(storage.catalog, offloader)
+        except Exception as e:
+            logger.error(f"Failed to load catalog cache: {format_exception_info(e)}")
+        try:
+            rating_stats = await RatingStatsCache.create(storage.ratings)
+        except Exception as e:
+            logger.error(f"Failed to load rating stats: {format_exception_info(e)}")
+    # Shared through MongoDB so duplicates landing on different workers run once
+    idempotency_cache = await IdempotencyCache.create(db, ActionResult)
+    callback_dispatcher = await CallbackDispatcher.create(storage.outbox if storage else None, offloader)
+    watch_dispatcher(callback_dispatcher)
+    admission_controller = await AdmissionController.create(callback_dispatcher)
+    # Tracking history and push subscriptions are kept in MongoDB only
+    if db is not None:
+        try:
+            tracking_store = await TrackingStore.create(db, callback_dispatcher)
+        except Exception as e:
+            logger.error(f"Failed to start tracking store: {format_exception_info(e)}")
+    elif storage is not None:
+        logger.info(
+            f"The {storage.backend} backend keeps no tracking history or push subscriptions (the tracking "
+            f"endpoints answer 501), and duplicate requests are only detected within each worker"
+        )
+
+def tracking_unavailable() -> Tuple[int, str]:
+    """
+    Why tracking_store is None, as (HTTP status, message): 501 when the
+    storage backend does not support tracking, 503 when it did not start.
+    """
+    if storage is not None and storage.db is None:
+        return 501, f"Tracking history and push updates are not supported by the {storage.backend} storage backend"
+    return 503, "Tracking not available"
+
+def started() -> bool:
+    """Startup has finished: storage is open and the services, callbacks included, are running."""
+    return (
+        storage is not None
+        and callback_dispatcher is not None
+        and (startup_task is None or startup_task.done())
+    )
+
+async def warm_up():
+    """
+    Open storage and start the services, retrying with backoff until the
+    backend answers. Runs in the background so the worker serves requests
+    while MongoDB is still coming up: the health probes, and a 503 NACK for
+    every Beckn action until it is done (see started).
+    """
+    delay = STARTUP_RETRY_DELAY
+    while True:
+        repositories = await open_storage()
+        if repositories is not None:
+            if await repositories.ping():
+                break
+            await repositories.close()
+        logger.error(f"Database unavailable during startup, retrying in {delay:.0f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, STARTUP_RETRY_MAX)
+    await start_services(repositories)
+    logger.info(f"Started on {repositories.backend} storage")
+
+async def stop_services():
+    if startup_task and not startup_task.done():
+        startup_task.cancel()
+        try:
+            await startup_task
+        except asyncio.CancelledError:
+            pass
+    if loop_lag_probe:
+        loop_lag_probe.cancel()
+    if tracking_store:
+        await tracking_store.close()
+    if catalog_cache:
+        await catalog_cache.close()
+    if rating_stats:
+        await rating_stats.close()
+    if callback_dispatcher:
+        # Drain queued callbacks before the database connection goes away
+        await callback_dispatcher.close()
+    if offloader:
+        offloader.close()
+    if storage:
+        # Flushes buffered order writes, then closes the connection
+        await storage.close()
+        logger.info(f"{storage.backend} storage closed during shutdown")
 
 # Lifespan event handler for startup and shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global mongo_client, db
-    # Startup logic
-    mongo_client = await MongoClient.create()
-    # print(mongo_client)
-    if mongo_client is None:
-        logger.error("Failed to connect to MongoDB during startup")
-    else:
-        db = mongo_client.db
-        # print(db)
+    global startup_task
+    # Startup logic, in the background: /health/ready reports when it is done
+    startup_task = asyncio.create_task(warm_up())
     yield
     # Shutdown logic
-    if mongo_client:
-        await mongo_client.close()
-        logger.info("MongoDB connection closed during shutdown")
+    await stop_services()
+
+app = FastAPI(
+    title="Beckn Provider Platform (BPP) API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+# Sheds requests before they are parsed; added first so /metrics counts the rejections
+app.add_middleware(AdmissionMiddleware, controller=lambda: admission_controller, ready=started)
+# Per-action request counts and ACK latency for /metrics
+app.add_middleware(MetricsMiddleware)
 
-app = FastAPI(title="Beckn Provider Platform (BPP) API", lifespan=lifespan)
 
+def response_context(context: Context) -> Context:
+    return context.model_copy(update={
+        "action": f"on_{context.action}",
+        "message_id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat() + "Z",
+    })
 
 # Helper function to send callback
 async def send_callback(context: Context, message: Dict[str, Any], error: Optional[Error] = None):
-    callback_url = context.bap_uri
-    if not callback_url:
+    if not context.bap_uri or callback_dispatcher is None:
         return
-    response_context = context.model_copy()
-    response_context.action = f"on_{context.action}"
-    response_context.message_id = str(uuid.uuid4())
-    response_context.timestamp = datetime.now(timezone.utc).isoformat() + "Z"
-    
-    payload = BecknResponse(context=response_context, message=message, error=error)
-    async with httpx.AsyncClient() as client:
-        try:
-            await client.post(callback_url, json=payload.model_dump())
-        except Exception as e:
-            logger.error(f"Failed to send callback to {callback_url}: {format_exception_info(e)}")
+    callback_url = str(context.bap_uri)
+    try:
+        callback_context = response_context(context)
+        body = callback_body(callback_context, message, error)
+        await callback_dispatcher.submit(
+            callback_url, body, action=callback_context.action, bap_id=context.bap_id
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue callback to {callback_url}: {format_exception_info(e)}")
 
-# ACK Response
+async def send_catalog_page(context: Context, item_ids: List[str], items: List[bytes], pagination: Dict[str, Any]):
+    """send_callback for a page of already encoded catalog items."""
+    if not context.bap_uri or callback_dispatcher is None:
+        return
+    callback_url = str(context.bap_uri)
+    try:
+        if rating_stats and rating_stats.summaries:
+            items = [
+                with_field(item, "rating", summary) if (summary := rating_stats.item(item_id)) else item
+                for item_id, item in zip(item_ids, items)
+            ]
+        callback_context = response_context(context)
+        body = catalog_callback_body(callback_context, items, {"pagination": pagination})
+        await callback_dispatcher.submit(
+            callback_url, body, action=callback_context.action, bap_id=context.bap_id
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue callback to {callback_url}: {format_exception_info(e)}")
+
+# Actions that change state, claimed across workers; read-only ones are only collapsed per worker
+SHARED_IDEMPOTENT_ACTIONS = {"init", "confirm", "cancel", "update", "rating"}
+
+async def run_idempotent(context: Context, handler, request: BecknRequest):
+    """
+    Run an action handler once per (transaction_id, message_id, action).
+    Concurrent duplicates wait for the first call and later retries get its
+    stored (message, error) back, so only the callback is sent again.
+    """
+    if idempotency_cache is None:
+        return await handler(request)
+    key = (context.transaction_id, context.message_id, context.action)
+    shared = context.action in SHARED_IDEMPOTENT_ACTIONS
+    return await idempotency_cache.run(key, handler, request, shared=shared)
+
+# ACK Response (pre-encoded body, see resources.serialization)
 def create_ack():
-    return AckResponse(message={"ack": {"status": "ACK"}})
+    return ack_response()
+
+def create_nack():
+    return nack_response()
 
 # Initialize catalog with sample data
 async def init_catalog():
-    global mongo_client, db
-    if mongo_client:
+    if storage:
         try:
-            catalog_collection = db["catalog"]
-            # Clear existing data
-            await catalog_collection.delete_many({})
-            # Insert sample items
+            # Replace existing data with sample items
             sample_items = [
                 {"id": "item1", "descriptor": {"name": "Product 1"}, "price": {"value": "100", "currency": "INR"}},
                 {"id": "item2", "descriptor": {"name": "Product 2"}, "price": {"value": "200", "currency": "INR"}}
             ]
-            await catalog_collection.insert_many(sample_items)
+            await storage.catalog.replace_all(sample_items)
+            if catalog_cache:
+                await catalog_cache.load()
             logger.info("Catalog initialized with sample data")
         except Exception as e:
             logger.error(f"Failed to initialize catalog: {format_exception_info(e)}")
 
 
+async def fetch_catalog_page(query: Dict[str, Any], cursor: Optional[str], limit: int):
+    """
+    A page of search results as (item ids, encoded items, next cursor).
+    Unfiltered pages come from the catalog cache, filtered ones from an
+    indexed query, validated and encoded in the offload executor when large.
+    """
+    if not query:
+        return await catalog_cache.page_json(cursor, limit)
+    documents, next_cursor = await storage.catalog.find_page(query, cursor, limit)
+    if offloader is not None:
+        item_ids, items = await offloader.run(encode_items, encode_documents(documents), items=len(documents))
+    else:
+        item_ids, items = encode_items(encode_documents(documents))
+    return item_ids, items, next_cursor
+
+async def send_search_results(context: Context, query: Dict[str, Any], cursor: Optional[str],
+                              limit: int, all_pages: bool):
+    """Send one on_search callback per page, or just the requested page."""
+    page = 0
+    try:
+        while True:
+            item_ids, items, next_cursor = await fetch_catalog_page(query, cursor, limit)
+            page += 1
+            pagination = {"page": page, "cursor": cursor, "next_cursor": next_cursor}
+            await send_catalog_page(context, item_ids, items, pagination)
+            if not all_pages or next_cursor is None:
+                break
+            cursor = next_cursor
+            # Let other requests in between pages, even when nothing above had to wait
+            await asyncio.sleep(0)
+    except Exception as e:
+        logger.error(f"Catalog search failed: {format_exception_info(e)}")
+        error = Error(code="INTERNAL_SERVER_ERROR", message="Catalog search failed")
+        await send_callback(context, {}, error)
+
+
 app.lifespan = lifespan
 
 # BPP Endpoints
 @app.post("/search")
-async def search(request: BecknRequest):
+async def search(request: BecknRequest, background_tasks: BackgroundTasks):
     if request.context.action != "search":
         raise HTTPException(status_code=400, detail="Invalid action")
     
     # Return ACK
     ack = create_ack()
     
-    # Fetch catalog from MongoDB
-    if db is None:
+    # Serve catalog from the in-memory cache
+    if catalog_cache is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    catalog_collection = db["catalog"]
-    items = [Item(**item) async for item in catalog_collection.find()]
-    catalog = Catalog(items=items)
-    asyncio.create_task(send_callback(request.context, {"catalog": catalog.model_dump()}))
+    try:
+        query = build_catalog_query(request.message)
+        requested, cursor, limit = parse_pagination(
+            request.message,
+            catalog_cache.config["search_page_size"],
+            catalog_cache.config["search_max_page_size"],
+        )
+    except (TypeError, ValueError) as e:
+        error = Error(code="INVALID_INTENT", message=str(e))
+        await send_callback(request.context, {}, error)
+        return create_nack()
+    
+    # Large result sets are split into several on_search callbacks after the ACK
+    background_tasks.add_task(send_search_results, request.context, query, cursor, limit, not requested)
     
     return ack
 
@@ -112,26 +358,31 @@ async def select(request: BecknRequest):
     ack = create_ack()
     
     # Validate selected items
-    if db is None:
+    if catalog_cache is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
     selected_items = request.message.get("order", {}).get("items", [])
-    catalog_collection = db["catalog"]
-    valid_item_ids = {item["id"] async for item in catalog_collection.find({}, {"id": 1})}
+    valid_item_ids = await catalog_cache.get_ids()
     
     for item in selected_items:
         if item.get("id") not in valid_item_ids:
             error = Error(code="INVALID_ITEM", message=f"Item {item.get('id')} not found")
-            asyncio.create_task(send_callback(request.context, {}, error))
+            await send_callback(request.context, {}, error)
             return ack
     
     message = {"order": {"items": selected_items}}
-    asyncio.create_task(send_callback(request.context, message))
+    await send_callback(request.context, message)
     
     return ack
 
+async def initialize_order(request: BecknRequest):
+    order = request.message.get("order", {})
+    message = {"order": order}
+    await storage.orders.save_draft(message)
+    return message, None
+
 @app.post("/init")
 async def init(request: BecknRequest):
     try:
@@ -142,17 +393,32 @@ async def init(request: BecknRequest):
         ack = create_ack()
         
         # Simulate order initialization
-        order = request.message.get("order", {})
-        message = {"order": order}
-        asyncio.create_task(db["Order"].insert_one(message))
-        asyncio.create_task(send_callback(request.context, message))
+        message, error = await run_idempotent(request.context, initialize_order, request)
+        await send_callback(request.context, message, error)
+    except HTTPException:
+        raise
     except Exception as e:
         error = Error(code="", message=format_exception_info(e))
-        asyncio.create_task(send_callback(request.context, message, error=error))
+        await send_callback(request.context, {}, error=error)
         logger.error(format_exception_info(e))
-        return AckResponse(message={"ack": {"status": "NACK"}})
+        return create_nack()
     return ack
 
+async def confirm_order(request: BecknRequest):
+    order_id = str(uuid.uuid4())
+    order = Order(
+        id=order_id,
+        items=request.message.get("order", {}).get("items", []),
+        state="Confirmed",
+        provider={"id": request.context.bpp_id},
+        payment={"status": "Pending"},
+        bap_uri=str(request.context.bap_uri) if request.context.bap_uri else None,
+    )
+    await storage.orders.insert(order.model_dump())
+    if tracking_store:
+        await tracking_store.record(order_id, order.state, order.provider.id)
+    return {"order": order.model_dump()}, None
+
 @app.post("/confirm")
 async def confirm(request: BecknRequest):
     if request.context.action != "confirm":
@@ -162,28 +428,90 @@ async def confirm(request: BecknRequest):
     ack = create_ack()
     
     # Confirm order and store in MongoDB
-    if db is None:
+    if storage is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    order_id = str(uuid.uuid4())
-    order = Order(
-        id=order_id,
-        items=request.message.get("order", {}).get("items", []),
-        state="Confirmed",
-        provider={"id": request.context.bpp_id},
-        payment={"status": "Pending"}
-    )
-    orders_collection = db["orders"]
-    await orders_collection.insert_one(order.model_dump())
-    message = {"order": order.model_dump()}
-    asyncio.create_task(send_callback(request.context, message))
+    # Retries of the same message get the order created the first time
+    try:
+        message, error = await run_idempotent(request.context, confirm_order, request)
+    except Exception as e:
+        logger.error(f"Failed to confirm order: {format_exception_info(e)}")
+        error = Error(code="INTERNAL_SERVER_ERROR", message="Failed to store order")
+        await send_callback(request.context, {}, error)
+        return create_nack()
+    await send_callback(request.context, message, error)
     
     return ack
 
+async def fetch_order_status(request: BecknRequest):
+    order_id = request.message.get("order", {}).get("id")
+    order = await storage.orders.get(order_id)
+    if not order:
+        return {}, Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
+    return {"order": order}, None
+
+async def fetch_order_statuses(order_ids: List[str]) -> Dict[str, Any]:
+    orders = await storage.orders.get_many(order_ids)
+    return {
+        "orders": [orders[order_id] for order_id in order_ids if order_id in orders],
+        "missing": [order_id for order_id in order_ids if order_id not in orders],
+    }
+
+async def fetch_trackings(order_ids: List[str]) -> Dict[str, Any]:
+    if tracking_store:
+        trackings = await tracking_store.latest_many(order_ids)
+    else:
+        trackings = {
+            order_id: Tracking(order_id=order_id, status=order.get("state", "In Transit"))
+            for order_id, order in (await storage.orders.get_many(order_ids)).items()
+        }
+    return {
+        "tracking": [trackings[order_id].model_dump(exclude_none=True) for order_id in order_ids if order_id in trackings],
+        "missing": [order_id for order_id in order_ids if order_id not in trackings],
+    }
+
+def parse_batch(message: Dict[str, Any]) -> Tuple[Optional[List[str]], int]:
+    """The order ids of a batched /status or /track (None if single-order) and the callback chunk size."""
+    config = {**DEFAULT_BATCH_CONFIG, **ConfigManager().get("cache_config")}
+    return batch_order_ids(message, config["batch_max_orders"]), config["batch_chunk_size"]
+
+async def send_batch_results(context: Context, fetch, order_ids: List[str], chunk_size: int):
+    """
+    Resolve a batch of orders one chunk at a time, each with a single lookup,
+    and send one callback per chunk so the first results go out while the
+    rest are still being read.
+    """
+    chunks = (len(order_ids) + chunk_size - 1) // chunk_size
+    try:
+        for chunk, ids in enumerate(chunked(order_ids, chunk_size), start=1):
+            message = await fetch(ids)
+            message["pagination"] = {"chunk": chunk, "chunks": chunks}
+            await send_callback(context, message)
+    except Exception as e:
+        logger.error(f"Batched {context.action} failed: {format_exception_info(e)}")
+        error = Error(code="INTERNAL_SERVER_ERROR", message=f"Failed to fetch orders for {context.action}")
+        await send_callback(context, {}, error)
+
+async def start_batch(request: BecknRequest, background_tasks: BackgroundTasks, fetch) -> bool:
+    """
+    Queue the chunked callbacks of a batched request; returns False for a
+    single-order request. Batches are read-only, so a retried one is simply
+    answered again rather than going through the idempotency cache.
+    """
+    try:
+        order_ids, chunk_size = parse_batch(request.message)
+    except ValueError as e:
+        await send_callback(request.context, {}, Error(code="INVALID_ORDER", message=str(e)))
+        return True
+    if order_ids is None:
+        return False
+    background_tasks.add_task(send_batch_results, request.context, fetch, order_ids, chunk_size)
+    return True
+
 @app.post("/status")
-async def status(request: BecknRequest):
+async def status(request: BecknRequest, background_tasks: BackgroundTasks):
     if request.context.action != "status":
         raise HTTPException(status_code=400, detail="Invalid action")
     
@@ -191,51 +519,98 @@ async def status(request: BecknRequest):
     ack = create_ack()
     
     # Fetch order status from MongoDB
-    if db is None:
+    if storage is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    order_id = request.message.get("order", {}).get("id")
-    orders_collection = db["orders"]
-    order = await orders_collection.find_one({"id": order_id})
-    if not order:
-        error = Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
-        asyncio.create_task(send_callback(request.context, {}, error))
+    # A list of orders is answered with one on_status callback per chunk
+    if await start_batch(request, background_tasks, fetch_order_statuses):
         return ack
     
-    message = {"order": order}
-    asyncio.create_task(send_callback(request.context, message))
+    message, error = await run_idempotent(request.context, fetch_order_status, request)
+    await send_callback(request.context, message, error)
     
     return ack
 
+async def fetch_tracking(request: BecknRequest):
+    order_id = request.message.get("order", {}).get("id")
+    history = request.message.get("history")
+    if history is not None:
+        return await fetch_tracking_history(order_id, history)
+    if tracking_store:
+        tracking = await tracking_store.latest(order_id)
+    else:
+        order = await storage.orders.get(order_id)
+        tracking = Tracking(order_id=order_id, status=order.get("state", "In Transit")) if order else None
+    if tracking is None:
+        return {}, Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
+    return {"tracking": tracking.model_dump(exclude_none=True)}, None
+
+async def fetch_tracking_history(order_id: str, history: Any):
+    """
+    The latest state plus the order's shipment events after
+    `history.cursor` (from the start without one), at most `history.limit`.
+    The returned cursor continues from the last event sent.
+    """
+    if tracking_store is None:
+        status, message = tracking_unavailable()
+        return {}, Error(code="NOT_SUPPORTED" if status == 501 else "INTERNAL_SERVER_ERROR", message=message)
+    if not isinstance(history, dict):
+        return {}, Error(code="INVALID_ORDER", message="history must be an object")
+    tracking = await tracking_store.latest(order_id)
+    if tracking is None:
+        return {}, Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
+    try:
+        events, cursor, more = await tracking_store.shipments.query(
+            order_id=order_id, cursor=history.get("cursor"), limit=history.get("limit")
+        )
+    except ValueError as e:
+        return {}, Error(code="INVALID_ORDER", message=str(e))
+    return {
+        "tracking": tracking.model_dump(exclude_none=True),
+        "history": {"events": events, "cursor": cursor, "more": more},
+    }, None
+
 @app.post("/track")
-async def track(request: BecknRequest):
+async def track(request: BecknRequest, background_tasks: BackgroundTasks):
     if request.context.action != "track":
         raise HTTPException(status_code=400, detail="Invalid action")
     
     # Return ACK
     ack = create_ack()
     
-    # Simulate order tracking
-    if db is None:
+    # Serve the latest tracking state from the tracking store
+    if storage is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    order_id = request.message.get("order", {}).get("id")
-    orders_collection = db["orders"]
-    order = await orders_collection.find_one({"id": order_id})
-    if not order:
-        error = Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
-        asyncio.create_task(send_callback(request.context, {}, error))
+    # A list of orders is answered with one on_track callback per chunk
+    if await start_batch(request, background_tasks, fetch_trackings):
         return ack
     
-    message = {"tracking": {"order_id": order_id, "status": order.get("state", "In Transit")}}
-    asyncio.create_task(send_callback(request.context, message))
+    message, error = await run_idempotent(request.context, fetch_tracking, request)
+    await send_callback(request.context, message, error)
     
     return ack
 
+async def cancel_order(request: BecknRequest):
+    order = request.message.get("order", {})
+    order_id = order.get("id")
+    try:
+        version = expected_version(order)
+        updated = await storage.orders.transition(order_id, {"state": CANCELLED}, sources(CANCELLED), version)
+    except ValueError as e:
+        return {}, Error(code="INVALID_ORDER", message=str(e))
+    except OrderConflict as conflict:
+        return {}, conflict_error(conflict, version, CANCELLED)
+    if updated is None:
+        return {}, Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
+    if tracking_store:
+        await tracking_store.record(order_id, updated.get("state"), (updated.get("provider") or {}).get("id"))
+    return {"order": updated}, None
+
 @app.post("/cancel")
 async def cancel(request: BecknRequest):
     if request.context.action != "cancel":
@@ -245,28 +620,33 @@ async def cancel(request: BecknRequest):
     ack = create_ack()
     
     # Cancel order in MongoDB
-    if db is None:
+    if storage is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    order_id = request.message.get("order", {}).get("id")
-    orders_collection = db["orders"]
-    result = await orders_collection.update_one(
-        {"id": order_id},
-        {"$set": {"state": "Cancelled"}}
-    )
-    if result.matched_count == 0:
-        error = Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
-        asyncio.create_task(send_callback(request.context, {}, error))
-        return ack
-    
-    order = await orders_collection.find_one({"id": order_id})
-    message = {"order": order}
-    asyncio.create_task(send_callback(request.context, message))
+    message, error = await run_idempotent(request.context, cancel_order, request)
+    await send_callback(request.context, message, error)
     
     return ack
 
+async def update_order(request: BecknRequest):
+    """Apply the whitelisted fields of the order, moving its state only along TRANSITIONS."""
+    order = request.message.get("order", {})
+    order_id = order.get("id")
+    try:
+        fields, states, version = parse_update(order)
+        updated = await storage.orders.transition(order_id, fields, states, version)
+    except ValueError as e:
+        return {}, Error(code="INVALID_ORDER", message=str(e))
+    except OrderConflict as conflict:
+        return {}, conflict_error(conflict, version, fields.get("state"))
+    if updated is None:
+        return {}, Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
+    if tracking_store and "state" in fields:
+        await tracking_store.record(order_id, updated.get("state"), (updated.get("provider") or {}).get("id"))
+    return {"order": updated}, None
+
 @app.post("/update")
 async def update(request: BecknRequest):
     if request.context.action != "update":
@@ -276,29 +656,32 @@ async def update(request: BecknRequest):
     ack = create_ack()
     
     # Update order in MongoDB
-    if db is None:
+    if storage is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
-        return ack
-    
-    order_id = request.message.get("order", {}).get("id")
-    orders_collection = db["orders"]
-    update_data = request.message.get("order", {})
-    result = await orders_collection.update_one(
-        {"id": order_id},
-        {"$set": update_data}
-    )
-    if result.matched_count == 0:
-        error = Error(code="INVALID_ORDER", message=f"Order {order_id} not found")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    order = await orders_collection.find_one({"id": order_id})
-    message = {"order": order}
-    asyncio.create_task(send_callback(request.context, message))
+    message, error = await run_idempotent(request.context, update_order, request)
+    await send_callback(request.context, message, error)
     
     return ack
 
+async def store_rating(request: BecknRequest):
+    try:
+        rating = Rating(**request.message.get("rating", {})).model_dump(exclude_none=True)
+    except ValidationError as e:
+        return {}, Error(code="INVALID_RATING", message=e.errors()[0]["msg"])
+    order = await storage.orders.get(rating["order_id"])
+    if order is None:
+        return {}, Error(code="INVALID_ORDER", message=f"Order {rating['order_id']} not found")
+    # Counts towards the order's provider and each of its items
+    keys = rating_keys(order)
+    if rating_stats:
+        await rating_stats.add(rating, keys)
+    else:
+        await storage.ratings.add(rating, keys)
+    return {"rating": rating}, None
+
 @app.post("/rating")
 async def rating(request: BecknRequest):
     if request.context.action != "rating":
@@ -308,21 +691,13 @@ async def rating(request: BecknRequest):
     ack = create_ack()
     
     # Store rating in MongoDB
-    if db is None:
+    if storage is None:
         error = Error(code="INTERNAL_SERVER_ERROR", message="Database not initialized")
-        asyncio.create_task(send_callback(request.context, {}, error))
+        await send_callback(request.context, {}, error)
         return ack
     
-    rating = request.message.get("rating", {})
-    orders_collection = db["orders"]
-    order_id = rating.get("order_id")
-    if order_id:
-        await orders_collection.update_one(
-            {"id": order_id},
-            {"$set": {"rating": rating}}
-        )
-    message = {"rating": rating}
-    asyncio.create_task(send_callback(request.context, message))
+    message, error = await run_idempotent(request.context, store_rating, request)
+    await send_callback(request.context, message, error)
     
     return ack
 
@@ -336,6 +711,113 @@ async def support(request: BecknRequest):
     
     # Simulate support response
     message = {"support": {"contact": "support@bpp.com", "phone": "+1234567890"}}
-    asyncio.create_task(send_callback(request.context, message))
+    await send_callback(request.context, message)
     
-    return ack
\ No newline at end of file
+    return ack
+
+
+# Tracking push subscriptions
+def sse_event(tracking: Tracking) -> bytes:
+    return b"event: tracking\ndata: " + dump_json(tracking) + b"\n\n"
+
+@app.get("/track/{order_id}/events")
+async def track_events(order_id: str, request: Request):
+    """Server-sent events stream of an order's tracking updates."""
+    if tracking_store is None:
+        raise HTTPException(*tracking_unavailable())
+    current = await tracking_store.latest(order_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
+    queue = tracking_store.subscribe(order_id)
+
+    async def stream():
+        try:
+            yield sse_event(current)
+            while True:
+                try:
+                    tracking = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                    yield sse_event(tracking)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keep-alive\n\n"
+        finally:
+            tracking_store.unsubscribe(order_id, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.post("/track/subscribe")
+async def track_subscribe(subscription: TrackingSubscription):
+    """
+    Register a webhook that receives every tracking update of an order. The
+    URL must be on the host of the BAP that placed the order (see
+    check_webhook_url).
+    """
+    if tracking_store is None:
+        raise HTTPException(*tracking_unavailable())
+    order = await storage.orders.get(subscription.order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"Order {subscription.order_id} not found")
+    try:
+        await check_webhook_url(
+            str(subscription.callback_url), order.get("bap_uri"), tracking_store.config["webhook_allow_private"]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await tracking_store.register_webhook(subscription.order_id, str(subscription.callback_url))
+    return create_ack()
+
+@app.post("/track/unsubscribe")
+async def track_unsubscribe(subscription: TrackingSubscription):
+    if tracking_store is None:
+        raise HTTPException(*tracking_unavailable())
+    await tracking_store.unregister_webhook(subscription.order_id, str(subscription.callback_url))
+    return create_ack()
+
+@app.get("/shipments/events")
+async def shipment_events(order_id: Optional[str] = None, provider_id: Optional[str] = None,
+                          start: Optional[str] = None, end: Optional[str] = None,
+                          cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Shipment events of an order or provider in [start, end), oldest first, a page at a time."""
+    if tracking_store is None:
+        raise HTTPException(*tracking_unavailable())
+    try:
+        events, next_cursor, more = await tracking_store.shipments.query(
+            order_id=order_id,
+            provider_id=provider_id,
+            start=parse_time(start) if start else None,
+            end=parse_time(end) if end else None,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"events": events, "cursor": next_cursor, "more": more}
+
+@app.get("/ratings/{kind}/{rated_id}")
+async def get_ratings(kind: str, rated_id: str):
+    """Rating count, average and histogram of a provider or item, from memory."""
+    if kind not in ("provider", "item"):
+        raise HTTPException(status_code=404, detail="Ratings are kept per provider or item")
+    if rating_stats is None:
+        raise HTTPException(status_code=503, detail="Rating stats not loaded")
+    return rating_stats.get(f"{kind}:{rated_id}") or summarize(empty_stats())
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the event loop is serving requests."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: startup has finished and the storage backend answers."""
+    if not started():
+        return FastJSONResponse({"status": "starting"}, status_code=503)
+    if not await storage.ping():
+        return FastJSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
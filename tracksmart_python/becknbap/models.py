@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, HttpUrl, field_validator
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl, field_validator
 from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, timezone
 import uuid
@@ -18,10 +18,9 @@ class Context(BaseModel):
     timestamp: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat() + "Z", description="ISO 8601 timestamp")
     ttl: Optional[str] = Field(None, description="Time to live in ISO 8601 duration format")
 
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat() + "Z"
-        }
+    model_config = ConfigDict(json_encoders={
+        datetime: lambda v: v.isoformat() + "Z"
+    })
 
 class Error(BaseModel):
     code: str = Field(..., description="Error code, e.g., 'INVALID_REQUEST'")
@@ -79,10 +78,17 @@ class Order(BaseModel):
     payment: Payment = Field(..., description="Payment details")
     billing: Optional[Dict[str, Any]] = Field(None, description="Billing information")
     fulfillment: Optional[Dict[str, Any]] = Field(None, description="Fulfillment details")
+    version: int = Field(0, description="Incremented on every change, for optimistic concurrency")
+    bap_uri: Optional[str] = Field(None, description="Callback URI of the BAP that placed the order")
 
 class Tracking(BaseModel):
     order_id: str = Field(..., description="Order ID being tracked")
     status: str = Field(..., description="Tracking status, e.g., 'In Transit'")
+    timestamp: Optional[str] = Field(None, description="ISO 8601 time of the status change")
+
+class TrackingSubscription(BaseModel):
+    order_id: str = Field(..., description="Order ID to receive tracking updates for")
+    callback_url: HttpUrl = Field(..., description="URL that tracking updates are POSTed to")
 
 class Rating(BaseModel):
     order_id: str = Field(..., description="Order ID being rated")
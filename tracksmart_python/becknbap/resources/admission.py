@@ -0,0 +1,191 @@
+"""
+This module contains admission control for the Beckn endpoints: a token
+bucket per BAP (keyed on context.bap_id), a global cap on requests in flight
+and load shedding once the callback queue fills up. Rejected requests get a
+NACK with a reason and, by default, HTTP 429 with Retry-After. Until the app
+has started, every Beckn request gets a NACK with HTTP 503.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from resources import metrics
+from resources.logger import Logger
+from resources.utils import ConfigManager
+
+DEFAULT_ADMISSION_CONFIG = {
+    "enabled": True,
+    # Requests per second and burst for a BAP without its own entry in "baps"
+    "default_rate": 200.0,
+    "default_burst": 400.0,
+    # bap_id -> {"rate": ..., "burst": ...}
+    "baps": {},
+    "max_baps": 10000,
+    "max_in_flight": 2000,
+    # Shed once the callback queue is this full (fraction of queue_size)
+    "callback_queue_threshold": 0.9,
+    # 429 with Retry-After, or 200 for a plain Beckn NACK
+    "reject_status": 429,
+}
+
+# Retry-After sent with the 503 NACKs while the app is starting
+STARTING_RETRY_AFTER = 5.0
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average and bursts of up to `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, else the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class AdmissionController:
+    """
+    Decides whether a Beckn request is taken on. Buckets are created on a
+    BAP's first request and the least recently seen are evicted past
+    `max_baps`. `queue_depth`, when given, returns the callback queue's
+    fill ratio.
+    """
+
+    def __init__(self, config: Optional[dict] = None, queue_depth: Optional[Callable[[], float]] = None):
+        self.logger = Logger()
+        self.config = {**DEFAULT_ADMISSION_CONFIG, **(config or {})}
+        self.queue_depth = queue_depth
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        metrics.REQUESTS_IN_FLIGHT.callback = lambda: self.in_flight
+
+    @classmethod
+    async def create(cls, dispatcher=None):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("admission_config")
+        queue_depth = None
+        if dispatcher is not None:
+            queue_depth = lambda: dispatcher.queue.qsize() / max(1, dispatcher.queue.maxsize)  # noqa: E731
+        return cls(config, queue_depth)
+
+    def bucket(self, bap_id: str) -> TokenBucket:
+        bucket = self.buckets.get(bap_id)
+        if bucket is not None:
+            self.buckets.move_to_end(bap_id)
+            return bucket
+        limits = self.config["baps"].get(bap_id) or {}
+        bucket = TokenBucket(
+            float(limits.get("rate", self.config["default_rate"])),
+            float(limits.get("burst", self.config["default_burst"])),
+        )
+        self.buckets[bap_id] = bucket
+        if len(self.buckets) > self.config["max_baps"]:
+            self.buckets.popitem(last=False)
+        return bucket
+
+    def admit(self, bap_id: str) -> Tuple[Optional[str], float]:
+        """Returns (None, 0) to admit, else (reason, seconds to wait before retrying)."""
+        if self.in_flight >= self.config["max_in_flight"]:
+            return "OVERLOADED", 1.0
+        if self.queue_depth is not None and self.queue_depth() >= self.config["callback_queue_threshold"]:
+            return "OVERLOADED", 1.0
+        wait = self.bucket(bap_id).take()
+        if wait:
+            return "RATE_LIMITED", wait
+        return None, 0.0
+
+
+def _bap_id(body: bytes) -> str:
+    try:
+        return str((json.loads(body).get("context") or {}).get("bap_id") or "")
+    except (ValueError, AttributeError):
+        return ""
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to POSTs of Beckn
+    actions. Until `ready()` is true they are NACKed with 503 ("STARTING"),
+    as the app could not handle them or send their callbacks yet. After
+    that, `controller` returns the current controller, or None to admit
+    everything. The body is read here to find the bap_id and replayed to the
+    app unchanged.
+    """
+
+    def __init__(self, app, controller: Callable[[], Optional[AdmissionController]],
+                 ready: Callable[[], bool] = lambda: True):
+        self.app = app
+        self.controller = controller
+        self.ready = ready
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"].strip("/") not in metrics.BECKN_ACTIONS
+        ):
+            return await self.app(scope, receive, send)
+        if not self.ready():
+            metrics.ADMISSION_REJECTED.inc("STARTING")
+            return await self._reject(send, 503, "STARTING", STARTING_RETRY_AFTER, "Service is starting, retry later")
+        controller = self.controller()
+        if controller is None or not controller.config["enabled"]:
+            return await self.app(scope, receive, send)
+
+        chunks, more_body = [], True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        reason, retry_after = controller.admit(_bap_id(body))
+        if reason is not None:
+            metrics.ADMISSION_REJECTED.inc(reason)
+            return await self._reject(
+                send, controller.config["reject_status"], reason, retry_after,
+                "Request rejected by admission control, retry later",
+            )
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        # Counted until the response and any background tasks have finished
+        controller.in_flight += 1
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            controller.in_flight -= 1
+
+    @staticmethod
+    async def _reject(send, status: int, reason: str, retry_after: float, message: str):
+        body = json.dumps({
+            "message": {"ack": {"status": "NACK"}},
+            "error": {"code": reason, "message": message},
+        }).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if status in (429, 503):
+            headers.append((b"retry-after", str(max(1, math.ceil(min(retry_after, 60.0)))).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,353 @@
+"""
+This module contains the gateway-side search aggregator: registry lookups with
+a TTL cache, concurrent fan-out of /search to every BPP and the merge of their
+on_search catalogs into one ranked result.
+"""
+import asyncio
+import math
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from resources.callbacks import HTTP2_AVAILABLE
+from resources.logger import Logger, format_exception_info
+from resources.utils import ConfigManager
+
+DEFAULT_GATEWAY_CONFIG = {
+    "registry_url": "http://localhost:3030/api/participants",
+    "callback_url": "http://localhost:5000/on_search",
+    "registry_ttl": 60.0,
+    "bpp_timeout": 2.0,
+    "hedge_delay": 0.3,
+    "hedge_budget": 0.1,
+    "max_concurrency": 50,
+    "quorum": 0.8,
+    "search_deadline": 5.0,
+    "max_connections": 200,
+    "max_keepalive_connections": 100,
+    "keepalive_expiry": 30.0,
+    "http2": True,
+}
+
+
+class RegistryCache:
+    """
+    Looks up participants in the Beckn registry and keeps each answer for
+    `ttl` seconds. Concurrent misses for the same key share one request, and
+    if the registry fails the last known answer is served instead.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, registry_url: str, ttl: float):
+        self.logger = Logger()
+        self.client = client
+        self.registry_url = registry_url
+        self.ttl = ttl
+        self.entries: Dict[Tuple[str, Optional[str]], Tuple[float, List[Dict[str, Any]]]] = {}
+        self.inflight: Dict[Tuple[str, Optional[str]], asyncio.Task] = {}
+        self.lookups = 0
+
+    async def lookup(self, participant_type: str = "BPP", domain: Optional[str] = None) -> List[Dict[str, Any]]:
+        key = (participant_type, domain)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            if entry is not None:
+                self.logger.error(f"Registry lookup failed, serving cached participants: {format_exception_info(e)}")
+                return entry[1]
+            raise
+
+    async def _fetch(self, key: Tuple[str, Optional[str]]) -> List[Dict[str, Any]]:
+        participant_type, domain = key
+        params = {"type": participant_type}
+        if domain:
+            params["domain"] = domain
+        self.lookups += 1
+        response = await self.client.get(self.registry_url, params=params)
+        response.raise_for_status()
+        participants = response.json()
+        self.entries[key] = (time.monotonic() + self.ttl, participants)
+        return participants
+
+
+class SearchCollector:
+    """
+    Gathers the on_search callbacks of one fanned-out search. It is done once
+    a `quorum` fraction of the BPPs that have not failed to ACK have called
+    back in full, so a BPP dropping out lowers the bar instead of stalling
+    the search.
+
+    A BPP sends its catalog as one on_search per page. Unless the search
+    asked for a single page (`all_pages` False), a BPP has called back in
+    full once the page without a `next_cursor` arrives; until then, or the
+    deadline, its pages so far are kept but it does not count.
+    """
+
+    def __init__(self, urls: List[str], quorum: float, all_pages: bool = True):
+        self.catalogs: Dict[str, Dict[str, Any]] = {}
+        # Pages received per BPP, by their pagination (page, cursor)
+        self.pages: Dict[str, Set[Tuple[Any, Any]]] = {}
+        self.complete: Set[str] = set()
+        # BPP urls in fan-out order; a callback names its BPP by index (see SearchAggregator.receive)
+        self.urls = urls
+        self.all_pages = all_pages
+        self.queried = len(urls)
+        self.failed = 0
+        self.quorum = quorum
+        self.enough = asyncio.Event()
+        self.check()
+
+    def add(self, bpp_id: str, catalog: Dict[str, Any], pagination: Optional[Dict[str, Any]] = None):
+        """Add one on_search page of a BPP to its catalog."""
+        if not isinstance(pagination, dict):
+            pagination = {}
+        page = (pagination.get("page"), pagination.get("cursor"))
+        pages = self.pages.setdefault(bpp_id, set())
+        if page in pages:
+            # A hedged duplicate: the BPP answered both copies, page by page.
+            return
+        pages.add(page)
+        items = catalog.get("items") or []
+        if bpp_id in self.catalogs:
+            self.catalogs[bpp_id]["items"].extend(items)
+        else:
+            self.catalogs[bpp_id] = {**catalog, "items": list(items)}
+        if not self.all_pages or not pagination.get("next_cursor"):
+            self.complete.add(bpp_id)
+        self.check()
+
+    def url(self, index: Optional[str]) -> Optional[str]:
+        """The BPP url a callback's `bpp` index refers to, or None."""
+        try:
+            position = int(index)
+        except (TypeError, ValueError):
+            return None
+        return self.urls[position] if 0 <= position < len(self.urls) else None
+
+    def fail(self):
+        self.failed += 1
+        self.check()
+
+    def check(self):
+        live = self.queried - self.failed
+        if live <= 0 or len(self.complete) >= max(1, math.ceil(live * self.quorum)):
+            self.enough.set()
+
+
+def _price(item: Dict[str, Any]) -> float:
+    try:
+        return float((item.get("price") or {}).get("value"))
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def merge_catalogs(catalogs: Dict[str, Dict[str, Any]], query: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Merge per-BPP catalogs into one list. Items with the same id and name
+    from several BPPs are collapsed to the cheapest offer, which records
+    every BPP carrying it. Items whose name matches the search text rank
+    first, then by price.
+    """
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for bpp_id, catalog in catalogs.items():
+        for item in catalog.get("items") or []:
+            name = ((item.get("descriptor") or {}).get("name") or "").strip().lower()
+            key = (item.get("id"), name)
+            offer = {**item, "bpp_id": bpp_id}
+            current = merged.get(key)
+            if current is None:
+                offer["bpp_ids"] = [bpp_id]
+                merged[key] = offer
+                continue
+            if bpp_id not in current["bpp_ids"]:
+                current["bpp_ids"].append(bpp_id)
+            if _price(offer) < _price(current):
+                offer["bpp_ids"] = current["bpp_ids"]
+                merged[key] = offer
+    words = (query or "").lower().split()
+
+    def rank(item: Dict[str, Any]):
+        name = ((item.get("descriptor") or {}).get("name") or "").lower()
+        matches = sum(word in name for word in words)
+        return (-matches, _price(item), item.get("id") or "")
+
+    return sorted(merged.values(), key=rank)
+
+
+class SearchAggregator:
+    """
+    Fans a search out to every BPP in the registry and aggregates the results.
+
+    Each BPP gets the search with `callback_url` as its bap_uri, at most
+    `max_concurrency` requests in flight. A BPP that has not ACKed within
+    `hedge_delay` seconds gets a second copy of the same message, and
+    whichever ACK arrives first wins; hedges are capped at a `hedge_budget`
+    fraction of requests so an overloaded network is not loaded further.
+    BPPs that don't ACK within `bpp_timeout` are skipped. The search returns
+    as soon as a `quorum` fraction of the ACKing BPPs have sent all their
+    on_search pages, or at `search_deadline` with the pages received so far.
+
+    Each BPP's bap_uri is `callback_url?bpp=<index>`, so a callback without
+    a bpp_id is still counted once, under the url it was fanned out to.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.logger = Logger()
+        self.config = {**DEFAULT_GATEWAY_CONFIG, **(config or {})}
+        self.client: Optional[httpx.AsyncClient] = None
+        self.registry: Optional[RegistryCache] = None
+        self.collectors: Dict[str, SearchCollector] = {}
+        self.limit = asyncio.Semaphore(self.config["max_concurrency"])
+        self.sent = 0
+        self.hedged = 0
+
+    @classmethod
+    async def create(cls):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("gateway_config")
+        aggregator = cls(config)
+        await aggregator.start()
+        return aggregator
+
+    async def start(self):
+        limits = httpx.Limits(
+            max_connections=self.config["max_connections"],
+            max_keepalive_connections=self.config["max_keepalive_connections"],
+            keepalive_expiry=self.config["keepalive_expiry"],
+        )
+        self.client = httpx.AsyncClient(
+            http2=bool(self.config["http2"] and HTTP2_AVAILABLE),
+            limits=limits,
+            timeout=self.config["bpp_timeout"],
+        )
+        self.registry = RegistryCache(self.client, self.config["registry_url"], self.config["registry_ttl"])
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def receive(self, payload: Dict[str, Any], bpp: Optional[str] = None) -> bool:
+        """
+        Hand an on_search callback to its search; `bpp` is the index from the
+        callback url's query string. Returns False if nobody is waiting for
+        it or it cannot be told which BPP sent it.
+        """
+        context = payload.get("context") or {}
+        collector = self.collectors.get(context.get("transaction_id"))
+        if collector is None:
+            return False
+        bpp_id = context.get("bpp_id") or collector.url(bpp)
+        if not bpp_id:
+            self.logger.error(f"Dropped on_search without a bpp_id or bpp index: {context.get('bpp_uri')}")
+            return False
+        message = payload.get("message") or {}
+        collector.add(bpp_id, message.get("catalog") or {}, message.get("pagination"))
+        return True
+
+    async def _post(self, url: str, body: Dict[str, Any]) -> bool:
+        response = await self.client.post(url, json=body)
+        return response.status_code < 400
+
+    async def _send(self, bpp: Dict[str, Any], body: Dict[str, Any]) -> bool:
+        """
+        POST the search to one BPP; True once any copy is ACKed. The timeout
+        and hedge delay start once the request holds a concurrency slot, and
+        the hedged copy shares that slot.
+        """
+        url = f"{bpp['url'].rstrip('/')}/search"
+        async with self.limit:
+            self.sent += 1
+            attempts = [asyncio.create_task(self._post(url, body))]
+            deadline = time.monotonic() + self.config["bpp_timeout"]
+            try:
+                while attempts:
+                    timeout = deadline - time.monotonic()
+                    hedge = (
+                        len(attempts) == 1
+                        and self.config["hedge_delay"] < timeout
+                        and self.hedged < self.sent * self.config["hedge_budget"]
+                    )
+                    if hedge:
+                        timeout = self.config["hedge_delay"]
+                    if timeout <= 0:
+                        return False
+                    done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        attempts.remove(task)
+                        if not task.exception() and task.result():
+                            return True
+                    if not done and hedge:
+                        self.hedged += 1
+                        attempts.append(asyncio.create_task(self._post(url, body)))
+                    elif not done:
+                        return False
+                return False
+            finally:
+                for task in attempts:
+                    task.cancel()
+
+    async def search(self, context: Dict[str, Any], message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run one search across the registry's BPPs. Returns the merged catalog
+        with how many BPPs were queried and failed, and which ones answered.
+        """
+        started = time.monotonic()
+        bpps = await self.registry.lookup("BPP", context.get("domain"))
+        transaction_id = context.get("transaction_id") or str(uuid.uuid4())
+        search_context = {
+            **context,
+            "action": "search",
+            "transaction_id": transaction_id,
+            "message_id": context.get("message_id") or str(uuid.uuid4()),
+        }
+        # A search naming a page gets just that page from each BPP
+        all_pages = not isinstance(message.get("pagination"), dict)
+        collector = SearchCollector([bpp.get("url") for bpp in bpps], self.config["quorum"], all_pages)
+        self.collectors[transaction_id] = collector
+
+        async def send(index: int, bpp: Dict[str, Any]):
+            body = {
+                "context": {**search_context, "bap_uri": f"{self.config['callback_url']}?bpp={index}"},
+                "message": message,
+            }
+            try:
+                acked = await self._send(bpp, body)
+            except Exception as e:
+                self.logger.error(f"Search to {bpp.get('url')} failed: {format_exception_info(e)}")
+                acked = False
+            if not acked:
+                collector.fail()
+
+        sends = [asyncio.create_task(send(index, bpp)) for index, bpp in enumerate(bpps)]
+        try:
+            remaining = self.config["search_deadline"] - (time.monotonic() - started)
+            try:
+                await asyncio.wait_for(collector.enough.wait(), timeout=max(0.0, remaining))
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self.collectors.pop(transaction_id, None)
+            for task in sends:
+                task.cancel()
+
+        query = ((message.get("intent") or {}).get("item") or {}).get("descriptor", {}).get("name")
+        return {
+            "catalog": {"items": merge_catalogs(collector.catalogs, query)},
+            "bpps": {
+                "queried": len(bpps),
+                "failed": collector.failed,
+                "responded": sorted(collector.catalogs),
+                "partial": sorted(set(collector.catalogs) - collector.complete),
+            },
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        }
@@ -0,0 +1,252 @@
+"""
+This module contains the streaming bulk import/export pipeline for the catalog
+and orders: NDJSON/CSV readers, batched validation against the models and
+parallel, chunked `bulk_write` upserts.
+"""
+import asyncio
+import csv
+import itertools
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union, get_args, get_origin
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+
+from models import Item, Order
+from resources.catalog_search import CATALOG_PROJECTION, catalog_document
+from resources.logger import Logger, format_exception_info
+from resources.serialization import type_adapter
+
+# What each importable collection holds and how a record becomes a document.
+# "insert_only" fields are written when a record is new and never overwritten
+# (an order's version belongs to its /update and /cancel history).
+BULK_TARGETS = {
+    "catalog": {"collection": "catalog", "model": Item, "to_document": catalog_document,
+                "projection": CATALOG_PROJECTION, "insert_only": ()},
+    "orders": {"collection": "orders", "model": Order, "to_document": dict,
+               "projection": {"_id": 0}, "insert_only": ("version",)},
+}
+
+DEFAULT_BULK_CONFIG = {
+    "batch_size": 1000,
+    "parallel_batches": 4,
+    "max_errors": 1000,
+}
+
+
+def _cell(value: str) -> Any:
+    """CSV cells holding JSON arrays/objects (e.g. `images`, `items`) are decoded."""
+    if value[:1] in ("[", "{"):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _nest(row: Dict[str, str]) -> Dict[str, Any]:
+    """Turn dotted CSV columns ("price.value") into nested dicts; empty cells are dropped."""
+    record: Dict[str, Any] = {}
+    for column, value in row.items():
+        if column is None or value is None or value == "":
+            continue
+        target = record
+        *parents, leaf = column.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = _cell(value)
+    return record
+
+
+def read_ndjson(stream: TextIO) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, record) for each non-blank line."""
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_number, orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield line_number, e
+
+
+def read_csv(stream: TextIO) -> Iterator[Tuple[int, Any]]:
+    """Yield (line number, record) for each CSV row; the header names the fields."""
+    for line_number, row in enumerate(csv.DictReader(stream), start=2):
+        yield line_number, _nest(row)
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    if fmt == "csv":
+        return read_csv(stream)
+    if fmt == "ndjson":
+        return read_ndjson(stream)
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def validate_batch(model, batch: List[Tuple[int, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Validate a batch in one call and return (documents, errors). Only when the
+    batch fails is it validated record by record to report the bad lines.
+    """
+    adapter = type_adapter(List[model])
+    records = [record for _, record in batch]
+    try:
+        return [item.model_dump(mode="json") for item in adapter.validate_python(records)], []
+    except ValidationError:
+        pass
+    documents, errors = [], []
+    for line_number, record in batch:
+        if isinstance(record, Exception):
+            errors.append(f"line {line_number}: invalid JSON: {record}")
+            continue
+        try:
+            documents.append(model.model_validate(record).model_dump(mode="json"))
+        except ValidationError as e:
+            errors.append(f"line {line_number}: {e.errors(include_url=False)}")
+    return documents, errors
+
+
+class BulkImporter:
+    """
+    Streams records from a file into a MongoDB collection with bounded memory.
+
+    Records are read lazily, validated `batch_size` at a time and written as
+    unordered `bulk_write` batches of `UpdateOne(..., upsert=True)` keyed on
+    `id`, so re-running an import updates instead of duplicating. At most
+    `parallel_batches` batches are being written at once; reading waits for
+    a slot, which keeps only a few batches in memory.
+    """
+
+    def __init__(self, db, target: str, config: Optional[dict] = None):
+        self.logger = Logger()
+        self.db = db
+        self.target = BULK_TARGETS[target]
+        self.collection = db[self.target["collection"]]
+        self.config = {**DEFAULT_BULK_CONFIG, **(config or {})}
+        self.read = 0
+        self.upserted = 0
+        self.modified = 0
+        self.errors: List[str] = []
+        self.failed_batches = 0
+
+    def _requests(self, documents: List[Dict[str, Any]]) -> List[UpdateOne]:
+        to_document = self.target["to_document"]
+        requests = []
+        for document in documents:
+            fields = to_document(document)
+            update = {"$set": fields}
+            on_insert = {key: fields.pop(key) for key in self.target["insert_only"] if key in fields}
+            if on_insert:
+                update["$setOnInsert"] = on_insert
+            requests.append(UpdateOne({"id": document["id"]}, update, upsert=True))
+        return requests
+
+    async def _write(self, documents: List[Dict[str, Any]]):
+        try:
+            result = await self.collection.bulk_write(self._requests(documents), ordered=False)
+            self.upserted += result.upserted_count
+            self.modified += result.modified_count
+        except Exception as e:
+            self.failed_batches += 1
+            self.logger.error(f"Bulk write of {len(documents)} records failed: {format_exception_info(e)}")
+
+    def _record_errors(self, errors: List[str]):
+        room = self.config["max_errors"] - len(self.errors)
+        self.errors.extend(errors[:max(0, room)])
+
+    async def run(self, records: Iterable[Tuple[int, Any]]) -> Dict[str, Any]:
+        pending: Set[asyncio.Task] = set()
+        invalid = 0
+        for batch in batched(records, self.config["batch_size"]):
+            self.read += len(batch)
+            documents, errors = validate_batch(self.target["model"], batch)
+            invalid += len(errors)
+            self._record_errors(errors)
+            if not documents:
+                continue
+            if len(pending) >= self.config["parallel_batches"]:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.add(asyncio.create_task(self._write(documents)))
+            # Let the writes make progress between CPU-bound validation batches.
+            await asyncio.sleep(0)
+        if pending:
+            await asyncio.wait(pending)
+        return {
+            "read": self.read,
+            "invalid": invalid,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "failed_batches": self.failed_batches,
+            "errors": self.errors,
+        }
+
+
+def _nested_model(annotation) -> Optional[type]:
+    """The model class behind `Model` or `Optional[Model]`, else None."""
+    candidates = get_args(annotation) if get_origin(annotation) is Union else (annotation,)
+    for candidate in candidates:
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+def model_columns(model, prefix: str = "") -> List[str]:
+    """
+    CSV columns for a model: nested models become dotted columns, every
+    other field (lists, free-form dicts) is one JSON cell.
+    """
+    columns = []
+    for name, field in model.model_fields.items():
+        nested = _nested_model(field.annotation)
+        if nested is not None:
+            columns.extend(model_columns(nested, f"{prefix}{name}."))
+        else:
+            columns.append(f"{prefix}{name}")
+    return columns
+
+
+def _flatten(document: Dict[str, Any], columns: Set[str], prefix: str = "") -> Dict[str, Any]:
+    row: Dict[str, Any] = {}
+    for key, value in document.items():
+        column = f"{prefix}{key}"
+        if isinstance(value, dict) and column not in columns:
+            row.update(_flatten(value, columns, f"{column}."))
+        elif isinstance(value, (dict, list)):
+            row[column] = json.dumps(value, default=str)
+        else:
+            row[column] = value
+    return row
+
+
+async def export_collection(db, target: str, out: TextIO, fmt: str = "ndjson",
+                            query: Optional[Dict[str, Any]] = None, batch_size: int = 1000) -> int:
+    """
+    Stream a collection to `out` as NDJSON or CSV and return the number of
+    records written. Documents are fetched in cursor batches of `batch_size`
+    and written as they arrive. CSV columns come from the model (see
+    `model_columns`), so every row has the same header.
+    """
+    spec = BULK_TARGETS[target]
+    cursor = db[spec["collection"]].find(query or {}, spec["projection"]).sort("id", 1).batch_size(batch_size)
+    written = 0
+    writer = None
+    columns: List[str] = []
+    if fmt == "csv":
+        columns = model_columns(spec["model"])
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+    column_set = set(columns)
+    async for document in cursor:
+        if writer is None:
+            out.write(orjson.dumps(document, default=str).decode())
+            out.write("\n")
+        else:
+            writer.writerow(_flatten(document, column_set))
+        written += 1
+    return written
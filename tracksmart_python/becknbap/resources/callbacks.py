@@ -0,0 +1,468 @@
+"""
+This module contains the pooled HTTP client and the bounded dispatcher used to
+deliver Beckn callbacks (on_search, on_confirm, ...) to BAPs.
+"""
+import asyncio
+import gzip
+import heapq
+import itertools
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpx
+
+from resources import metrics
+from resources.logger import Logger, format_exception_info
+from resources.offload import Offloader
+from resources.outbox import CircuitBreaker, backoff_delay
+from resources.storage import OutboxRepository
+from resources.utils import ConfigManager
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+DEFAULT_CALLBACK_CONFIG = {
+    "queue_size": 10000,
+    "workers": 64,
+    "enqueue_timeout": 2.0,
+    "max_connections": 200,
+    "max_keepalive_connections": 100,
+    "max_connections_per_host": 32,
+    "keepalive_expiry": 30.0,
+    "timeout": 10.0,
+    "http2": True,
+    "max_attempts": 8,
+    "backoff_base": 0.5,
+    "backoff_max": 300.0,
+    "breaker_failure_threshold": 5,
+    "breaker_reset_timeout": 30.0,
+    "drain_timeout": 10.0,
+    "outbox_lease_timeout": 300.0,
+    "outbox_claim_interval": 30.0,
+    "durable_actions": ["on_init", "on_confirm", "on_status", "on_track", "on_cancel", "on_update"],
+    # bap_id -> {"batch": true, "compression": "gzip" | "zstd"}; other BAPs get plain callbacks
+    "bap_delivery": {},
+    "batch_window": 0.05,
+    "batch_max_messages": 50,
+    "batch_max_bytes": 1048576,
+    "compression_min_bytes": 8192,
+    "compression_level": 5,
+}
+
+# HTTP statuses that are worth retrying; every other 4xx is treated as permanent.
+RETRYABLE_STATUS = {408, 425, 429}
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Set on batched envelopes to the number of callbacks inside
+BATCH_HEADER = "X-Beckn-Batch"
+
+
+def encode_body(payload: bytes, compression: Optional[str], min_bytes: int,
+                level: int) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress `payload` with `compression` when it is at least `min_bytes`
+    long. Returns the body and its Content-Encoding (None if sent as is).
+    zstd falls back to gzip when the zstandard package is not installed.
+    """
+    if not compression or len(payload) < min_bytes:
+        return payload, None
+    if compression == "zstd" and ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor(level=level).compress(payload), "zstd"
+    return gzip.compress(payload, compresslevel=level, mtime=0), "gzip"
+
+
+def batch_envelope(bodies: List[bytes]) -> bytes:
+    """Wrap encoded callbacks in {"callbacks": [...]} without decoding them."""
+    return b'{"callbacks":[' + b",".join(bodies) + b"]}"
+
+
+class PendingBatch:
+    """Callbacks waiting to be sent to one URL in a single envelope."""
+
+    __slots__ = ("bodies", "size", "flusher")
+
+    def __init__(self):
+        self.bodies: List[bytes] = []
+        self.size = 0
+        self.flusher: Optional[asyncio.Task] = None
+
+
+class CallbackDispatcher:
+    """
+    Delivers callbacks through a single connection-pooled httpx client.
+
+    Callbacks are put on a bounded queue and consumed by a fixed number of
+    workers, so a burst of requests can never create more than `workers`
+    concurrent POSTs. When the queue is full, `submit` waits up to
+    `enqueue_timeout` seconds before giving up, which pushes back on the
+    endpoint instead of piling up detached tasks.
+
+    Failed deliveries are retried with jittered exponential backoff from a
+    single scheduler task, guarded by a circuit breaker per destination host.
+    When an outbox is attached, callbacks for `durable_actions` are persisted
+    before they are queued, other callbacks only once their first attempt
+    fails, and messages that exhaust `max_attempts` are dead-lettered.
+    Every `outbox_claim_interval` seconds the dispatcher also claims outbox
+    messages whose lease expired, e.g. those of a worker process that died.
+
+    BAPs listed in `bap_delivery` may opt in to batching and compression.
+    Batched callbacks to the same URL are held for up to `batch_window`
+    seconds and sent together as {"callbacks": [...]} with an X-Beckn-Batch
+    header; durable callbacks are never held back when an outbox is attached.
+    Bodies of at least `compression_min_bytes` are sent gzip or zstd encoded,
+    large ones compressed in the offload executor when one is given.
+    """
+
+    def __init__(self, config: Optional[dict] = None, outbox: Optional[OutboxRepository] = None,
+                 offloader: Optional[Offloader] = None):
+        self.logger = Logger()
+        self.config = {**DEFAULT_CALLBACK_CONFIG, **(config or {})}
+        self.outbox = outbox
+        self.offloader = offloader
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=self.config["queue_size"])
+        self.client: Optional[httpx.AsyncClient] = None
+        self.workers: List[asyncio.Task] = []
+        self.scheduler: Optional[asyncio.Task] = None
+        self.claimer: Optional[asyncio.Task] = None
+        self.retries: List[Tuple[float, int, Dict[str, Any]]] = []
+        self.retry_counter = itertools.count()
+        self.retry_wakeup = asyncio.Event()
+        self.inflight: Dict[str, Dict[str, Any]] = {}
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.batches: Dict[Tuple[str, Optional[str]], PendingBatch] = {}
+        self.accepting = False
+        self.dropped = 0
+
+    @classmethod
+    async def create(cls, outbox: Optional[OutboxRepository] = None, offloader: Optional[Offloader] = None):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("callback_config")
+        if outbox is not None:
+            outbox.lease_timeout = config.get("outbox_lease_timeout", DEFAULT_CALLBACK_CONFIG["outbox_lease_timeout"])
+            try:
+                await outbox.open()
+            except Exception as e:
+                Logger().error(f"Callback outbox unavailable, delivering from memory only: {format_exception_info(e)}")
+                outbox = None
+        dispatcher = cls(config, outbox=outbox, offloader=offloader)
+        await dispatcher.start()
+        return dispatcher
+
+    async def start(self):
+        """Open the pooled client, start the workers and recover pending callbacks."""
+        limits = httpx.Limits(
+            max_connections=self.config["max_connections"],
+            max_keepalive_connections=self.config["max_keepalive_connections"],
+            keepalive_expiry=self.config["keepalive_expiry"],
+        )
+        http2 = bool(self.config["http2"] and HTTP2_AVAILABLE)
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=limits,
+            timeout=self.config["timeout"],
+        )
+        self.workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.config["workers"])
+        ]
+        self.scheduler = asyncio.create_task(self._schedule_retries())
+        self.accepting = True
+        recovered = await self._recover()
+        if self.outbox is not None:
+            self.claimer = asyncio.create_task(self._claim_expired())
+        self.logger.info(
+            f"Callback dispatcher started with {len(self.workers)} workers "
+            f"(http2={http2}, outbox={self.outbox is not None}, recovered={recovered})"
+        )
+
+    async def close(self):
+        """
+        Stop accepting callbacks, drain the queue for up to `drain_timeout`
+        seconds, persist whatever is still undelivered and close the client.
+        """
+        self.accepting = False
+        for key in list(self.batches):
+            await self._flush(key)
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.config["drain_timeout"])
+        except asyncio.TimeoutError:
+            self.logger.error(
+                f"Callback drain timed out with {self.queue.qsize()} queued "
+                f"and {len(self.inflight)} in flight"
+            )
+        tasks = self.workers + [task for task in (self.scheduler, self.claimer) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.scheduler = None
+        self.claimer = None
+        await self._persist_leftovers()
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+        self.logger.info("Callback dispatcher closed")
+
+    async def submit(self, url: str, payload: Union[bytes, Dict[str, Any]],
+                     action: Optional[str] = None, bap_id: Optional[str] = None) -> bool:
+        """
+        Queue a callback for delivery. `payload` is either pre-encoded JSON
+        bytes or a dict; `action` (e.g. "on_confirm") defaults to the one in
+        a dict payload's context. `bap_id` selects the BAP's delivery options
+        in `bap_delivery`.
+
+        Returns False if the dispatcher is shutting down or the queue stayed
+        full for `enqueue_timeout` seconds and the callback was dropped.
+        """
+        if not self.accepting:
+            self.dropped += 1
+            self.logger.error(f"Callback dispatcher is shutting down, dropped callback to {url}")
+            return False
+        if action is None and isinstance(payload, dict):
+            action = payload.get("context", {}).get("action")
+        delivery = self.config["bap_delivery"].get(bap_id) or {} if bap_id else {}
+        durable = bool(self.outbox) and action in self.config["durable_actions"]
+        if delivery.get("batch") and not durable and isinstance(payload, (bytes, bytearray)):
+            return await self._add_to_batch(url, bytes(payload), delivery.get("compression"))
+        message = {
+            "_id": str(uuid.uuid4()),
+            "url": url,
+            "payload": payload,
+            "attempts": 0,
+            "persisted": False,
+            "compression": delivery.get("compression"),
+        }
+        if durable:
+            message["persisted"] = await self.outbox.add(message)
+        return await self._enqueue(message)
+
+    async def _enqueue(self, message: Dict[str, Any]) -> bool:
+        url = message["url"]
+        try:
+            await asyncio.wait_for(self.queue.put(message), timeout=self.config["enqueue_timeout"])
+            return True
+        except asyncio.TimeoutError:
+            if message["persisted"]:
+                # Already durable: let the retry scheduler pick it up later.
+                self._schedule(message, self.config["backoff_base"])
+                return True
+            self.dropped += message.get("batched") or 1
+            self.logger.error(f"Callback queue full, dropped callback to {url}")
+            return False
+
+    async def _add_to_batch(self, url: str, payload: bytes, compression: Optional[str]) -> bool:
+        key = (url, compression)
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = PendingBatch()
+            batch.flusher = asyncio.create_task(self._flush_after_window(key, batch))
+        batch.bodies.append(payload)
+        batch.size += len(payload)
+        if len(batch.bodies) >= self.config["batch_max_messages"] or batch.size >= self.config["batch_max_bytes"]:
+            return await self._flush(key)
+        return True
+
+    async def _flush_after_window(self, key: Tuple[str, Optional[str]], batch: PendingBatch):
+        await asyncio.sleep(self.config["batch_window"])
+        if self.batches.get(key) is batch:
+            await self._flush(key)
+
+    async def _flush(self, key: Tuple[str, Optional[str]]) -> bool:
+        """Queue the pending batch for `key` as one message."""
+        batch = self.batches.pop(key, None)
+        if batch is None:
+            return True
+        if batch.flusher is not None and batch.flusher is not asyncio.current_task():
+            batch.flusher.cancel()
+        url, compression = key
+        message = {
+            "_id": str(uuid.uuid4()),
+            "url": url,
+            "payload": batch.bodies[0],
+            "attempts": 0,
+            "persisted": False,
+            "compression": compression,
+        }
+        if len(batch.bodies) > 1:
+            message["payload"] = batch_envelope(batch.bodies)
+            message["batched"] = len(batch.bodies)
+            metrics.CALLBACKS_COALESCED.inc(amount=len(batch.bodies))
+        return await self._enqueue(message)
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        limit = self.host_limits.get(host)
+        if limit is None:
+            limit = asyncio.Semaphore(self.config["max_connections_per_host"])
+            self.host_limits[host] = limit
+        return limit
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                self.config["breaker_failure_threshold"], self.config["breaker_reset_timeout"]
+            )
+            self.breakers[host] = breaker
+        return breaker
+
+    def _schedule(self, message: Dict[str, Any], delay: float):
+        heapq.heappush(self.retries, (time.monotonic() + delay, next(self.retry_counter), message))
+        self.retry_wakeup.set()
+
+    async def _schedule_retries(self):
+        """Move retries onto the queue as they become due."""
+        while True:
+            if not self.retries:
+                self.retry_wakeup.clear()
+                await self.retry_wakeup.wait()
+                continue
+            due = self.retries[0][0] - time.monotonic()
+            if due > 0:
+                self.retry_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.retry_wakeup.wait(), timeout=due)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, message = heapq.heappop(self.retries)
+            await self.queue.put(message)
+
+    async def _recover(self) -> int:
+        if self.outbox is None:
+            return 0
+        recovered = 0
+        now = datetime.now(timezone.utc)
+        held = set(self.inflight)
+        held.update(message["_id"] for _, _, message in self.retries)
+        try:
+            async for message in self.outbox.claim():
+                if message["_id"] in held:
+                    continue
+                next_attempt_at = message.get("next_attempt_at") or now
+                if next_attempt_at.tzinfo is None:
+                    next_attempt_at = next_attempt_at.replace(tzinfo=timezone.utc)
+                self._schedule(message, max(0.0, (next_attempt_at - now).total_seconds()))
+                recovered += 1
+        except Exception as e:
+            self.logger.error(f"Failed to recover pending callbacks: {format_exception_info(e)}")
+        return recovered
+
+    async def _claim_expired(self):
+        """Periodically take over outbox messages whose owner stopped renewing them."""
+        while True:
+            await asyncio.sleep(self.config["outbox_claim_interval"])
+            recovered = await self._recover()
+            if recovered:
+                self.logger.info(f"Claimed {recovered} pending callbacks from the outbox")
+
+    async def _persist_leftovers(self):
+        """Persist messages that were queued or in flight when the workers stopped."""
+        leftovers = list(self.inflight.values())
+        while not self.queue.empty():
+            leftovers.append(self.queue.get_nowait())
+            self.queue.task_done()
+        leftovers.extend(message for _, _, message in self.retries)
+        lost = 0
+        for message in leftovers:
+            if message.get("persisted"):
+                continue
+            if self.outbox is None or not await self.outbox.add(message):
+                lost += 1
+        self.inflight.clear()
+        self.retries.clear()
+        if lost:
+            self.logger.error(f"{lost} undelivered callbacks were lost during shutdown")
+
+    async def _handle_failure(self, message: Dict[str, Any], breaker: CircuitBreaker,
+                              reason: str, retryable: bool = True):
+        if retryable:
+            breaker.record_failure()
+        message["attempts"] = message.get("attempts", 0) + 1
+        message["last_error"] = reason
+        if not retryable or message["attempts"] >= self.config["max_attempts"]:
+            self.logger.error(
+                f"Callback to {message['url']} dead-lettered after {message['attempts']} attempts: {reason}"
+            )
+            if self.outbox:
+                await self.outbox.dead_letter(message)
+            return
+        delay = backoff_delay(message["attempts"], self.config["backoff_base"], self.config["backoff_max"])
+        if self.outbox:
+            await self.outbox.reschedule(message, delay)
+            message["persisted"] = True
+        self._schedule(message, delay)
+
+    async def _encode(self, payload: bytes, compression: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        args = (bytes(payload), compression, self.config["compression_min_bytes"], self.config["compression_level"])
+        if compression and self.offloader is not None:
+            return await self.offloader.run(encode_body, *args, size=len(payload))
+        return encode_body(*args)
+
+    async def _deliver(self, message: Dict[str, Any]):
+        url = message["url"]
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        if breaker.is_open:
+            # Hold the message back without spending an attempt.
+            if self.outbox and not message.get("persisted"):
+                message["persisted"] = await self.outbox.add(message)
+            self._schedule(message, breaker.retry_after() + self.config["backoff_base"])
+            return
+        payload, headers = message["payload"], JSON_HEADERS
+        if isinstance(payload, (bytes, bytearray)):
+            payload, encoding = await self._encode(payload, message.get("compression"))
+            if encoding or message.get("batched"):
+                headers = dict(JSON_HEADERS)
+                if encoding:
+                    headers["Content-Encoding"] = encoding
+                if message.get("batched"):
+                    headers[BATCH_HEADER] = str(message["batched"])
+            metrics.CALLBACK_BYTES.inc(encoding or "identity", amount=len(payload))
+        async with self._host_limit(host):
+            started = time.perf_counter()
+            try:
+                if isinstance(payload, (bytes, bytearray)):
+                    response = await self.client.post(url, content=payload, headers=headers)
+                else:
+                    response = await self.client.post(url, json=payload)
+            except Exception as e:
+                metrics.CALLBACK_FAILURES.inc(host)
+                await self._handle_failure(message, breaker, format_exception_info(e))
+                return
+            finally:
+                metrics.CALLBACK_LATENCY.observe(time.perf_counter() - started, host)
+        if response.status_code < 400:
+            breaker.record_success()
+            if message.get("persisted"):
+                await self.outbox.ack(message["_id"])
+            return
+        metrics.CALLBACK_FAILURES.inc(host)
+        retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS
+        await self._handle_failure(message, breaker, f"HTTP {response.status_code}", retryable)
+
+    async def _worker(self):
+        while True:
+            message = await self.queue.get()
+            self.inflight[message["_id"]] = message
+            try:
+                await self._deliver(message)
+            except asyncio.CancelledError:
+                # Leave the message in `inflight` so close() can persist it.
+                self.queue.task_done()
+                raise
+            except Exception as e:
+                self.logger.error(f"Unexpected callback delivery error: {format_exception_info(e)}")
+            self.inflight.pop(message["_id"], None)
+            self.queue.task_done()
@@ -0,0 +1,170 @@
+"""
+This module contains the process-local catalog cache used by /search and /select.
+"""
+import asyncio
+import bisect
+import json
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument
+
+from resources.logger import Logger, format_exception_info
+from resources.offload import Offloader
+from resources.serialization import encode_documents, encode_items
+from resources.utils import ConfigManager
+
+DEFAULT_CACHE_CONFIG = {
+    "catalog_ttl": 300.0,
+    "catalog_poll_interval": 5.0,
+    "search_page_size": 500,
+    "search_max_page_size": 2000,
+}
+
+CATALOG_META_ID = "catalog"
+
+
+async def bump_catalog_version(db) -> int:
+    """
+    Increment the catalog version counter. Call this after writing to the
+    catalog so caches that cannot use change streams pick the change up.
+    """
+    meta = await db["catalog_meta"].find_one_and_update(
+        {"_id": CATALOG_META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return meta["version"]
+
+
+class CatalogCache:
+    """
+    Holds the whole catalog in memory: each validated item's encoded JSON
+    (sorted by id and spliced into on_search bodies as is), the set of item
+    ids used by /select and, built on first use, the `Catalog` payload as a
+    dict. Unfiltered searches page through the sorted snapshot without
+    touching MongoDB. Large snapshots are validated and encoded in the
+    offload executor when one is given.
+
+    Items are read through a CatalogRepository (see resources.storage). The
+    cache is refreshed from the repository's change notifications (a MongoDB
+    change stream). Backends or deployments without them (no replica set)
+    fall back to polling the catalog version counter, and every read reloads
+    once the snapshot is older than `catalog_ttl` seconds.
+    """
+
+    def __init__(self, repository, config: Optional[dict] = None, offloader: Optional[Offloader] = None):
+        self.logger = Logger()
+        self.repository = repository
+        self.config = {**DEFAULT_CACHE_CONFIG, **(config or {})}
+        self.offloader = offloader
+        self.ids: Set[str] = set()
+        self.sorted_ids: List[str] = []
+        self.payload: Optional[Dict[str, Any]] = None
+        self.item_json: List[bytes] = []
+        self.version: Optional[int] = None
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.watcher: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def create(cls, repository, offloader: Optional[Offloader] = None):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("cache_config")
+        cache = cls(repository, config, offloader)
+        await cache.load()
+        cache.watcher = asyncio.create_task(cache._watch())
+        return cache
+
+    async def close(self):
+        if self.watcher:
+            self.watcher.cancel()
+            await asyncio.gather(self.watcher, return_exceptions=True)
+            self.watcher = None
+
+    async def load(self, max_age: Optional[float] = None):
+        """
+        Read the full catalog once and rebuild every cached view of it. With
+        `max_age`, skip the reload when the snapshot is not older than that,
+        so callers that waited on the lock do not reload again.
+        """
+        async with self.lock:
+            if max_age is not None and time.monotonic() - self.loaded_at <= max_age:
+                return
+            version = await self.repository.version()
+            documents = await self.repository.list_items()
+            if self.offloader is not None:
+                ids, item_json = await self.offloader.run(
+                    encode_items, encode_documents(documents), items=len(documents)
+                )
+            else:
+                ids, item_json = encode_items(encode_documents(documents))
+            self.ids = set(ids)
+            self.sorted_ids = ids
+            self.item_json = item_json
+            self.payload = None
+            self.version = version
+            self.loaded_at = time.monotonic()
+        self.logger.info(f"Catalog cache loaded {len(ids)} items (version {version})")
+
+    async def get_payload(self) -> Dict[str, Any]:
+        await self._refresh_if_expired()
+        if self.payload is None:
+            self.payload = {"items": [json.loads(item) for item in self.item_json]}
+        return self.payload
+
+    async def get_ids(self) -> Set[str]:
+        await self._refresh_if_expired()
+        return self.ids
+
+    async def page(self, cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return up to `limit` serialized items after `cursor` and the next cursor."""
+        items = (await self.get_payload())["items"]
+        start = bisect.bisect_right(self.sorted_ids, cursor) if cursor else 0
+        end = start + limit
+        next_cursor = self.sorted_ids[end - 1] if end < len(items) else None
+        return items[start:end], next_cursor
+
+    async def page_json(self, cursor: Optional[str], limit: int) -> Tuple[List[str], List[bytes], Optional[str]]:
+        """Like `page`, but returns the page's item ids and encoded items."""
+        await self._refresh_if_expired()
+        start = bisect.bisect_right(self.sorted_ids, cursor) if cursor else 0
+        end = start + limit
+        next_cursor = self.sorted_ids[end - 1] if end < len(self.item_json) else None
+        return self.sorted_ids[start:end], self.item_json[start:end], next_cursor
+
+    async def _refresh_if_expired(self):
+        if time.monotonic() - self.loaded_at > self.config["catalog_ttl"]:
+            try:
+                await self.load(max_age=self.config["catalog_ttl"])
+            except Exception as e:
+                # Keep serving the previous snapshot rather than failing the request.
+                self.logger.error(f"Catalog cache refresh failed: {format_exception_info(e)}")
+
+    async def _watch(self):
+        try:
+            async with await self.repository.watch() as stream:
+                self.logger.info("Catalog cache following the catalog change stream")
+                async for _ in stream:
+                    # Coalesce a burst of changes into a single reload.
+                    while await stream.try_next() is not None:
+                        pass
+                    await self.load()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone servers (OperationFailure) and other backends have no change streams.
+            self.logger.info(f"Change streams unavailable, polling catalog version instead: {e}")
+        await self._poll()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.config["catalog_poll_interval"])
+            try:
+                if await self.repository.version() != self.version:
+                    await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Catalog version poll failed: {format_exception_info(e)}")
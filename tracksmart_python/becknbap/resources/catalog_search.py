@@ -0,0 +1,120 @@
+"""
+This module turns a Beckn search intent into an indexed, cursor-paginated
+catalog query.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+# Fields stored alongside each catalog item that are not part of the Item model.
+CATALOG_PROJECTION = {"_id": 0, "price_amount": 0}
+
+
+def catalog_document(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the document to store for an item. Adds `price_amount`, a numeric
+    copy of `price.value` that price range queries can use an index on.
+    """
+    document = dict(item)
+    try:
+        document["price_amount"] = float(item["price"]["value"])
+    except (KeyError, TypeError, ValueError):
+        document["price_amount"] = None
+    return document
+
+
+# Values a search filter may compare against; anything else (a dict) would reach MongoDB as an operator
+FILTER_SCALARS = (str, int, float, bool)
+
+
+def _filter_value(field: str, value: Any, scalars: Tuple[type, ...] = FILTER_SCALARS) -> Any:
+    """
+    `value` as a filter on `field`: a scalar is matched exactly, a list of
+    scalars with $in. Raises ValueError for anything else.
+    """
+    if isinstance(value, scalars):
+        return value
+    if isinstance(value, list) and value and all(isinstance(entry, scalars) for entry in value):
+        return {"$in": value}
+    allowed = "a string" if scalars == (str,) else "a string, number or boolean"
+    raise ValueError(f"{field} must be {allowed} or a non-empty list of them")
+
+
+def build_catalog_query(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a MongoDB filter from `message.intent`. Supported filters:
+
+        intent.item.descriptor.name         text search on the item name
+        intent.category.id                  exact category_id
+        intent.item.price.minimum_value     price_amount >= value
+        intent.item.price.maximum_value     price_amount <= value
+        intent.item.tags                    {"key": value} matched on tags.key
+
+    Category ids are strings and tag values strings, numbers or booleans;
+    a list of them matches any. Returns an empty dict when the intent
+    carries no filters. Raises ValueError for values of any other type, so
+    request data is never read as a query operator.
+    """
+    intent = message.get("intent") or {}
+    item = intent.get("item") or {}
+    query: Dict[str, Any] = {}
+
+    name = (item.get("descriptor") or {}).get("name")
+    if name:
+        if not isinstance(name, str):
+            raise ValueError("intent.item.descriptor.name must be a string")
+        query["$text"] = {"$search": name}
+
+    category_id = (intent.get("category") or {}).get("id")
+    if category_id:
+        query["category_id"] = _filter_value("intent.category.id", category_id, (str,))
+
+    price = item.get("price") or {}
+    price_range = {}
+    if price.get("minimum_value") is not None:
+        price_range["$gte"] = float(price["minimum_value"])
+    if price.get("maximum_value") is not None:
+        price_range["$lte"] = float(price["maximum_value"])
+    if price_range:
+        query["price_amount"] = price_range
+
+    tags = item.get("tags") or {}
+    if not isinstance(tags, dict):
+        raise ValueError("intent.item.tags must be an object")
+    for key, value in tags.items():
+        if not key or key.startswith("$") or "." in key:
+            raise ValueError(f"Invalid tag name: {key}")
+        query[f"tags.{key}"] = _filter_value(f"intent.item.tags.{key}", value)
+
+    return query
+
+
+def parse_pagination(message: Dict[str, Any], default_limit: int, max_limit: int) -> Tuple[bool, Optional[str], int]:
+    """
+    Read `message.pagination`. Returns (requested, cursor, limit): `requested`
+    is False when the caller did not ask for a specific page.
+    """
+    pagination = message.get("pagination")
+    if not isinstance(pagination, dict):
+        return False, None, default_limit
+    limit = int(pagination.get("limit") or default_limit)
+    cursor = pagination.get("cursor")
+    if cursor is not None and not isinstance(cursor, str):
+        raise ValueError("pagination.cursor must be a string")
+    return True, cursor, max(1, min(limit, max_limit))
+
+
+async def find_catalog_page(collection, query: Dict[str, Any], cursor: Optional[str],
+                            limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of items ordered by id, starting after `cursor`.
+    Returns the raw item documents and the cursor of the next page (None on
+    the last page).
+    """
+    page_query = dict(query)
+    if cursor:
+        page_query["id"] = {"$gt": cursor}
+    documents = [
+        document async for document in
+        collection.find(page_query, CATALOG_PROJECTION).sort("id", 1).limit(limit + 1)
+    ]
+    next_cursor = documents[limit - 1]["id"] if len(documents) > limit else None
+    return documents[:limit], next_cursor
@@ -0,0 +1,156 @@
+"""
+This module contains the typed schema of every appRepo/<name>.json file.
+ConfigManager validates a file, environment overrides included, against its
+model each time it loads it, so a value of the wrong type or range fails at
+load time naming its key instead of deep inside the component reading it.
+Keys left out (or null) keep the component's DEFAULT_*_CONFIG value, and
+keys without a field are passed through unchecked.
+"""
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, NonNegativeFloat, NonNegativeInt, PositiveFloat, PositiveInt
+
+ReadPreference = Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"]
+
+
+class ConfigFile(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+
+class MongoConfig(ConfigFile):
+    database_user: Optional[str] = None
+    database_password: Optional[str] = None
+    cluster_address: Optional[str] = None
+    app_name: Optional[str] = None
+    db_name: Optional[str] = None
+    collection_name: Optional[str] = None
+    write_batch_size: Optional[PositiveInt] = None
+    write_batch_delay_ms: Optional[NonNegativeFloat] = None
+    max_pending_writes: Optional[PositiveInt] = None
+    server_selection_timeout_ms: Optional[PositiveInt] = None
+    max_pool_size: Optional[PositiveInt] = None
+    min_pool_size: Optional[NonNegativeInt] = None
+    max_idle_time_ms: Optional[NonNegativeInt] = None
+    max_connecting: Optional[PositiveInt] = None
+    wait_queue_timeout_ms: Optional[NonNegativeInt] = None
+    cluster_max_connections: Optional[NonNegativeInt] = None
+    compressors: Optional[List[Literal["zstd", "snappy", "zlib"]]] = None
+    zlib_compression_level: Optional[int] = Field(None, ge=-1, le=9)
+    local_threshold_ms: Optional[NonNegativeInt] = None
+    read_preference: Optional[ReadPreference] = None
+    read_preferences: Optional[Dict[str, ReadPreference]] = None
+    max_staleness_seconds: Optional[int] = Field(None, ge=-1)
+    primary_after_write_seconds: Optional[NonNegativeFloat] = None
+
+
+class CacheConfig(ConfigFile):
+    catalog_ttl: Optional[NonNegativeFloat] = None
+    catalog_poll_interval: Optional[PositiveFloat] = None
+    search_page_size: Optional[PositiveInt] = None
+    search_max_page_size: Optional[PositiveInt] = None
+    tracking_lru_size: Optional[PositiveInt] = None
+    tracking_subscriber_queue: Optional[PositiveInt] = None
+    tracking_poll_interval: Optional[PositiveFloat] = None
+    tracking_feed_ttl: Optional[PositiveInt] = None
+    webhook_allow_private: Optional[bool] = None
+    shipment_events_granularity: Optional[Literal["seconds", "minutes", "hours"]] = None
+    shipment_history_page_size: Optional[PositiveInt] = None
+    shipment_history_max_page_size: Optional[PositiveInt] = None
+    shipment_history_overlap: Optional[NonNegativeFloat] = None
+    shipment_history_overlap_events: Optional[NonNegativeInt] = None
+    idempotency_max_entries: Optional[PositiveInt] = None
+    idempotency_ttl: Optional[PositiveFloat] = None
+    idempotency_lease: Optional[PositiveFloat] = None
+    idempotency_poll_interval: Optional[PositiveFloat] = None
+    batch_max_orders: Optional[PositiveInt] = None
+    batch_chunk_size: Optional[PositiveInt] = None
+    rating_refresh_interval: Optional[PositiveFloat] = None
+
+
+class BapDelivery(ConfigFile):
+    batch: Optional[bool] = None
+    compression: Optional[Literal["gzip", "zstd"]] = None
+
+
+class CallbackConfig(ConfigFile):
+    queue_size: Optional[PositiveInt] = None
+    workers: Optional[PositiveInt] = None
+    enqueue_timeout: Optional[NonNegativeFloat] = None
+    max_connections: Optional[PositiveInt] = None
+    max_keepalive_connections: Optional[NonNegativeInt] = None
+    max_connections_per_host: Optional[PositiveInt] = None
+    keepalive_expiry: Optional[NonNegativeFloat] = None
+    timeout: Optional[PositiveFloat] = None
+    http2: Optional[bool] = None
+    max_attempts: Optional[PositiveInt] = None
+    backoff_base: Optional[NonNegativeFloat] = None
+    backoff_max: Optional[NonNegativeFloat] = None
+    breaker_failure_threshold: Optional[PositiveInt] = None
+    breaker_reset_timeout: Optional[NonNegativeFloat] = None
+    drain_timeout: Optional[NonNegativeFloat] = None
+    outbox_lease_timeout: Optional[PositiveFloat] = None
+    outbox_claim_interval: Optional[PositiveFloat] = None
+    durable_actions: Optional[List[str]] = None
+    bap_delivery: Optional[Dict[str, BapDelivery]] = None
+    batch_window: Optional[NonNegativeFloat] = None
+    batch_max_messages: Optional[PositiveInt] = None
+    batch_max_bytes: Optional[PositiveInt] = None
+    compression_min_bytes: Optional[NonNegativeInt] = None
+    compression_level: Optional[int] = None
+
+
+class GatewayConfig(ConfigFile):
+    registry_url: Optional[str] = None
+    callback_url: Optional[str] = None
+    registry_ttl: Optional[NonNegativeFloat] = None
+    bpp_timeout: Optional[PositiveFloat] = None
+    hedge_delay: Optional[NonNegativeFloat] = None
+    hedge_budget: Optional[float] = Field(None, ge=0, le=1)
+    max_concurrency: Optional[PositiveInt] = None
+    quorum: Optional[float] = Field(None, gt=0, le=1)
+    search_deadline: Optional[PositiveFloat] = None
+    max_connections: Optional[PositiveInt] = None
+    max_keepalive_connections: Optional[NonNegativeInt] = None
+    keepalive_expiry: Optional[NonNegativeFloat] = None
+    http2: Optional[bool] = None
+
+
+class BapRate(ConfigFile):
+    rate: Optional[PositiveFloat] = None
+    burst: Optional[PositiveFloat] = None
+
+
+class AdmissionConfig(ConfigFile):
+    enabled: Optional[bool] = None
+    default_rate: Optional[PositiveFloat] = None
+    default_burst: Optional[PositiveFloat] = None
+    baps: Optional[Dict[str, BapRate]] = None
+    max_baps: Optional[PositiveInt] = None
+    max_in_flight: Optional[NonNegativeInt] = None
+    callback_queue_threshold: Optional[NonNegativeFloat] = None
+    reject_status: Optional[int] = Field(None, ge=200, le=599)
+
+
+class OffloadConfig(ConfigFile):
+    executor: Optional[Literal["process", "thread", "inline"]] = None
+    max_workers: Optional[PositiveInt] = None
+    offload_min_items: Optional[NonNegativeInt] = None
+    offload_min_bytes: Optional[NonNegativeInt] = None
+
+
+CONFIG_SCHEMAS = {
+    "mongo_config": MongoConfig,
+    "cache_config": CacheConfig,
+    "callback_config": CallbackConfig,
+    "gateway_config": GatewayConfig,
+    "admission_config": AdmissionConfig,
+    "offload_config": OffloadConfig,
+}
+
+
+def validate_config(config_name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """`config` checked and coerced by the schema of `config_name`. Raises ValueError."""
+    schema = CONFIG_SCHEMAS.get(config_name)
+    if schema is None:
+        return config
+    return schema.model_validate(config).model_dump(exclude_unset=True, exclude_none=True)
@@ -0,0 +1,182 @@
+"""
+This module contains the idempotency cache that collapses duplicate Beckn
+requests (same transaction_id, message_id and action) into one computation.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from resources.logger import Logger, format_exception_info
+from resources.serialization import dump_json, type_adapter
+from resources.utils import WORKER_ID, ConfigManager
+
+DEFAULT_IDEMPOTENCY_CONFIG = {
+    "idempotency_max_entries": 100000,
+    "idempotency_ttl": 600.0,
+    "idempotency_lease": 30.0,
+    "idempotency_poll_interval": 0.05,
+}
+
+
+class IdempotencyCache:
+    """
+    Single-flight execution with a bounded TTL cache of results.
+
+    The first call for a key runs the handler; calls for the same key that
+    arrive while it is running await the same future. Successful results are
+    kept for `idempotency_ttl` seconds (up to `idempotency_max_entries`,
+    least recently used evicted first). Failures are not cached, so a retry
+    after an error runs the handler again.
+
+    With a `collection`, keys run with `shared=True` are also claimed in
+    MongoDB so that only one worker process runs the handler. Other workers wait for the stored
+    result (encoded as `result_type`). A claim whose owner has not finished
+    within `idempotency_lease` seconds can be taken over. A TTL index drops
+    keys after `idempotency_ttl`.
+    """
+
+    def __init__(self, config: Optional[dict] = None, collection=None, result_type: Any = Any):
+        self.logger = Logger()
+        self.config = {**DEFAULT_IDEMPOTENCY_CONFIG, **(config or {})}
+        self.collection = collection
+        self.result_type = result_type
+        self.results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+
+    @classmethod
+    async def create(cls, db=None, result_type: Any = Any):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("cache_config")
+        collection = None
+        if db is not None:
+            collection = db["idempotency_keys"]
+            try:
+                await collection.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as e:
+                Logger().error(f"Shared idempotency keys unavailable: {format_exception_info(e)}")
+                collection = None
+        return cls(config, collection, result_type)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self.results.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.results[key]
+            return False, None
+        self.results.move_to_end(key)
+        return True, value
+
+    def put(self, key: Hashable, value: Any):
+        self.results[key] = (time.monotonic() + self.config["idempotency_ttl"], value)
+        self.results.move_to_end(key)
+        while len(self.results) > self.config["idempotency_max_entries"]:
+            self.results.popitem(last=False)
+
+    async def run(self, key: Hashable, handler, *args, shared: bool = True):
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value
+        future = self.inflight.get(key)
+        if future is not None:
+            self.hits += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # The first caller was cancelled, not us: run it ourselves.
+                    return await self.run(key, handler, *args, shared=shared)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            if shared and self.collection is not None:
+                value = await self._run_shared(key, handler, *args)
+            else:
+                value = await handler(*args)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self.inflight[key]
+
+    @staticmethod
+    def _key_id(key: Hashable) -> str:
+        return ":".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+    async def _claim(self, key_id: str, takeover: bool = False) -> bool:
+        now = datetime.now(timezone.utc)
+        claim = {
+            "state": "pending",
+            "owner": WORKER_ID,
+            "lease_until": now + timedelta(seconds=self.config["idempotency_lease"]),
+            "expires_at": now + timedelta(seconds=self.config["idempotency_ttl"]),
+        }
+        if takeover:
+            taken = await self.collection.find_one_and_update(
+                {"_id": key_id, "state": "pending", "lease_until": {"$lt": now}},
+                {"$set": claim},
+            )
+            return taken is not None
+        try:
+            await self.collection.insert_one({"_id": key_id, **claim})
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _run_shared(self, key: Hashable, handler, *args):
+        """Run the handler if this worker wins the key, else wait for the winner's result."""
+        key_id = self._key_id(key)
+        claimed = await self._claim(key_id)
+        while not claimed:
+            document = await self.collection.find_one({"_id": key_id})
+            if document is None:
+                # The owner failed and released the key.
+                claimed = await self._claim(key_id)
+                continue
+            if document["state"] == "done":
+                return type_adapter(self.result_type).validate_json(document["result"])
+            lease_until = document["lease_until"]
+            if lease_until.tzinfo is None:
+                lease_until = lease_until.replace(tzinfo=timezone.utc)
+            if lease_until < datetime.now(timezone.utc):
+                claimed = await self._claim(key_id, takeover=True)
+                continue
+            await asyncio.sleep(self.config["idempotency_poll_interval"])
+
+        try:
+            value = await handler(*args)
+        except BaseException:
+            await self._release(key_id)
+            raise
+        try:
+            await self.collection.update_one(
+                {"_id": key_id, "owner": WORKER_ID},
+                {"$set": {"state": "done", "result": dump_json(value, self.result_type)}},
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to store idempotent result for {key_id}: {format_exception_info(e)}")
+        return value
+
+    async def _release(self, key_id: str):
+        try:
+            await self.collection.delete_one({"_id": key_id, "owner": WORKER_ID, "state": "pending"})
+        except Exception as e:
+            self.logger.error(f"Failed to release idempotency key {key_id}: {format_exception_info(e)}")
@@ -0,0 +1,48 @@
+"""
+This module creates the MongoDB indexes the endpoints rely on. It runs once at
+startup; create_index is a no-op for indexes that already exist.
+"""
+from pymongo import ASCENDING, TEXT, IndexModel
+
+from resources.logger import Logger, format_exception_info
+
+CATALOG_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="catalog_id", unique=True),
+    IndexModel([("category_id", ASCENDING), ("id", ASCENDING)], name="catalog_category_id"),
+    IndexModel([("price_amount", ASCENDING), ("id", ASCENDING)], name="catalog_price_id"),
+    IndexModel([("descriptor.name", TEXT)], name="catalog_name_text"),
+    IndexModel([("tags.$**", ASCENDING)], name="catalog_tags"),
+]
+
+ORDER_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="orders_id", unique=True),
+    IndexModel([("provider.id", ASCENDING), ("state", ASCENDING)], name="orders_provider_state"),
+]
+
+RATING_INDEXES = [
+    IndexModel([("order_id", ASCENDING)], name="ratings_order_id", unique=True),
+]
+
+RATING_STATS_INDEXES = [
+    IndexModel([("updated_at", ASCENDING)], name="rating_stats_updated_at"),
+]
+
+
+async def ensure_indexes(db):
+    logger = Logger()
+    try:
+        catalog = db["catalog"]
+        # Items written before price_amount existed get it derived from price.value.
+        await catalog.update_many(
+            {"price_amount": {"$exists": False}, "price.value": {"$exists": True}},
+            [{"$set": {"price_amount": {"$convert": {
+                "input": "$price.value", "to": "double", "onError": None, "onNull": None
+            }}}}],
+        )
+        await catalog.create_indexes(CATALOG_INDEXES)
+        await db["orders"].create_indexes(ORDER_INDEXES)
+        await db["ratings"].create_indexes(RATING_INDEXES)
+        await db["rating_stats"].create_indexes(RATING_STATS_INDEXES)
+        logger.info("MongoDB indexes ensured")
+    except Exception as e:
+        logger.error(f"Failed to ensure MongoDB indexes: {format_exception_info(e)}")
@@ -1,14 +1,33 @@
 """
 This module contains the logger implementation.
+
+Records are handed to a QueueHandler on the calling thread and written to the
+rotating log file by a QueueListener thread, so logging never blocks the event
+loop on disk I/O. Behaviour is configured through environment variables:
+
+    LOG_LEVEL           minimum level, e.g. DEBUG, INFO (default), WARNING
+    LOG_FORMAT          "text" (default) or "json" for one JSON object per line
+    LOG_RATE_WINDOW     seconds over which repeated warnings/errors are limited (default 60)
+    LOG_RATE_BURST      records let through per call site and window (default 10, 0 disables)
 """
+import atexit
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 import os
 
 from settings import BASE_DIR
 
 import traceback
 
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(filename)s::%(funcName)s::%(lineno)d:\n%(message)s'
+
+_logger = None
+_listener = None
+
 def format_exception_info(
     e: Exception,
     include_code: bool = True,
@@ -47,26 +66,106 @@ def format_exception_info(
     except Exception as formatting_error:
         return f"{str(e)} (could not extract traceback details: {formatting_error})"
 
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each record as a single JSON object on one line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}::{record.funcName}::{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` WARNING-or-above records per call site through in
+    each `window` seconds, e.g. a callback failure repeated for every request
+    to an unreachable BAP. The first record after a suppressed stretch
+    reports how many were dropped.
+    """
+
+    def __init__(self, window: float = 60.0, burst: int = 10):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sites = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno < logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        window_start, count, suppressed = self.sites.get(site, (now, 0, 0))
+        if now - window_start >= self.window:
+            window_start, count = now, 0
+        if count >= self.burst:
+            self.sites[site] = (window_start, count, suppressed + 1)
+            return False
+        if suppressed:
+            record.msg = f"{record.getMessage()}\n[{suppressed} similar messages suppressed]"
+            record.args = ()
+        self.sites[site] = (window_start, count + 1, 0)
+        return True
+
+
+def build_file_handler(path: str, json_lines: bool = False) -> logging.Handler:
+    fh = TimedRotatingFileHandler(
+        path,
+        when='midnight',
+        interval=1,
+        backupCount=31,
+        encoding='utf-8'
+    )
+    fh.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    return fh
+
+
+def build_queue_pipeline(*handlers: logging.Handler):
+    """Return a QueueHandler feeding `handlers` from a background QueueListener."""
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    return queue_handler, listener
+
+
 def Logger() -> logging.Logger:
+    global _logger, _listener
+    if _logger is not None:
+        return _logger
     logger_folder_path = os.path.join(BASE_DIR, "appRepo", "LOGGER")
-    assert os.path.exists(logger_folder_path), f"{logger_folder_path} doesn't exist and is required by logger"
     logger = logging.getLogger()
     if len(logger.handlers) == 0:
-        logger.setLevel(logging.INFO)
+        level = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+        logger.setLevel(level)
+        json_lines = os.getenv("LOG_FORMAT", "text").lower() == "json"
         # create time rotating file handler which logs messages
-        if not os.path.exists(os.path.join(logger_folder_path, "system_logs")):
-            os.mkdir(os.path.join(logger_folder_path, "system_logs"))
-        fh = TimedRotatingFileHandler(
-            os.path.join(logger_folder_path, "system_logs", "system.log"), 
-            when='midnight', 
-            interval=1, 
-            backupCount=31, 
-            encoding='utf-8'
-        )
-        fh.setLevel(logging.INFO)
-        # create formatter and add it to the handlers
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(filename)s::%(funcName)s::%(lineno)d:\n%(message)s')
-        fh.setFormatter(formatter)
-        # add the handlers to the logger
-        logger.addHandler(fh)
-    return logger
\ No newline at end of file
+        unwritable = None
+        try:
+            os.makedirs(os.path.join(logger_folder_path, "system_logs"), exist_ok=True)
+            fh = build_file_handler(os.path.join(logger_folder_path, "system_logs", "system.log"), json_lines)
+        except OSError as e:
+            # e.g. a read-only container filesystem: log to stderr rather than fail to start
+            unwritable = e
+            fh = logging.StreamHandler(sys.stderr)
+            fh.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+        # the file is written from the listener thread, never from the event loop
+        queue_handler, _listener = build_queue_pipeline(fh)
+        queue_handler.addFilter(RateLimitFilter(
+            window=float(os.getenv("LOG_RATE_WINDOW", "60")),
+            burst=int(os.getenv("LOG_RATE_BURST", "10")),
+        ))
+        logger.addHandler(queue_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
+        if unwritable is not None:
+            logger.warning(f"Cannot write logs under {logger_folder_path}, logging to stderr: {unwritable}")
+    _logger = logger
+    return logger
@@ -0,0 +1,326 @@
+"""
+This module contains the in-process metrics registry exposed on /metrics in the
+Prometheus text format, the MongoDB command and connection pool listeners, the
+event-loop lag probe and the opt-in per-request profiler.
+"""
+import asyncio
+import math
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+from resources.logger import Logger
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """A gauge that is either set directly or read from `callback` at render time."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str):
+        self.values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.callback is not None:
+            try:
+                lines.append(f"{self.name} {float(self.callback())}")
+            except Exception:
+                pass
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # per label set: [bucket counts..., +Inf count], sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = ([0] * (len(self.buckets) + 1), [0.0])
+            self.values[label_values] = entry
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{bound}"'
+                bucket_labels = _format_labels(self.labels, label_values, le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total[0]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "bpp_requests_total", "Beckn requests by action and HTTP status.", ("action", "status")))
+ACK_LATENCY = REGISTRY.register(Histogram(
+    "bpp_ack_latency_seconds", "Time from request received to ACK sent.", ("action",)))
+MONGO_LATENCY = REGISTRY.register(Histogram(
+    "bpp_mongo_command_seconds", "MongoDB command duration.", ("command",)))
+MONGO_FAILURES = REGISTRY.register(Counter(
+    "bpp_mongo_command_failures_total", "Failed MongoDB commands.", ("command",)))
+MONGO_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "bpp_mongo_pool_connections", "Open connections in the MongoDB pool per server.", ("address",)))
+MONGO_POOL_CHECKED_OUT = REGISTRY.register(Gauge(
+    "bpp_mongo_pool_checked_out", "MongoDB connections in use per server.", ("address",)))
+MONGO_POOL_CHECKOUT = REGISTRY.register(Histogram(
+    "bpp_mongo_pool_checkout_seconds", "Time spent waiting for a pooled MongoDB connection.", ("address",)))
+MONGO_POOL_CHECKOUT_FAILURES = REGISTRY.register(Counter(
+    "bpp_mongo_pool_checkout_failures_total", "Failed MongoDB connection check-outs per server and reason.",
+    ("address", "reason")))
+MONGO_POOL_CLEARED = REGISTRY.register(Counter(
+    "bpp_mongo_pool_cleared_total", "Times a MongoDB server's pool was cleared after an error.", ("address",)))
+CALLBACK_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bpp_callback_queue_depth", "Callbacks waiting in the dispatcher queue."))
+CALLBACK_RETRY_DEPTH = REGISTRY.register(Gauge(
+    "bpp_callback_retry_depth", "Callbacks waiting for a retry."))
+CALLBACK_LATENCY = REGISTRY.register(Histogram(
+    "bpp_callback_delivery_seconds", "Callback POST duration per BAP host.", ("host",)))
+CALLBACK_FAILURES = REGISTRY.register(Counter(
+    "bpp_callback_failures_total", "Failed callback deliveries per BAP host.", ("host",)))
+CALLBACK_BYTES = REGISTRY.register(Counter(
+    "bpp_callback_bytes_total", "Callback body bytes sent per content encoding.", ("encoding",)))
+CALLBACKS_COALESCED = REGISTRY.register(Counter(
+    "bpp_callbacks_coalesced_total", "Callbacks sent inside a batched envelope."))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bpp_requests_in_flight", "Admitted Beckn requests still being handled, background work included."))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "bpp_admission_rejected_total", "Beckn requests shed by admission control.", ("reason",)))
+OFFLOAD_LATENCY = REGISTRY.register(Histogram(
+    "bpp_offload_job_seconds", "Duration of jobs run in the offload executor, queueing included.", ("job",)))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    "bpp_event_loop_lag_seconds", "How late the event loop woke a periodic probe.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records the duration of every MongoDB command; pass it in `event_listeners`."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, event.command_name)
+        MONGO_FAILURES.inc(event.command_name)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Tracks the connection pool of every MongoDB server: open and checked-out
+    connections, check-out wait time and failures. Pass it in `event_listeners`.
+    """
+
+    def __init__(self):
+        self.connections: Dict[str, int] = {}
+        self.checked_out: Dict[str, int] = {}
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _add(self, counts: Dict[str, int], gauge: Gauge, address: str, amount: int):
+        counts[address] = max(0, counts.get(address, 0) + amount)
+        gauge.set(counts[address], address)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.inc(self._address(event))
+
+    def pool_closed(self, event):
+        address = self._address(event)
+        self._add(self.connections, MONGO_POOL_CONNECTIONS, address, -self.connections.get(address, 0))
+        self._add(self.checked_out, MONGO_POOL_CHECKED_OUT, address, -self.checked_out.get(address, 0))
+
+    def connection_created(self, event):
+        self._add(self.connections, MONGO_POOL_CONNECTIONS, self._address(event), 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(self.connections, MONGO_POOL_CONNECTIONS, self._address(event), -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        address = self._address(event)
+        MONGO_POOL_CHECKOUT_FAILURES.inc(address, str(event.reason))
+        if event.duration is not None:
+            MONGO_POOL_CHECKOUT.observe(event.duration, address)
+
+    def connection_checked_out(self, event):
+        address = self._address(event)
+        self._add(self.checked_out, MONGO_POOL_CHECKED_OUT, address, 1)
+        if event.duration is not None:
+            MONGO_POOL_CHECKOUT.observe(event.duration, address)
+
+    def connection_checked_in(self, event):
+        self._add(self.checked_out, MONGO_POOL_CHECKED_OUT, self._address(event), -1)
+
+
+async def probe_event_loop_lag(interval: float = 0.5):
+    """Sleep for `interval` in a loop and record how late each wake-up was."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+
+def watch_dispatcher(dispatcher):
+    """Report the callback dispatcher's queue depths at scrape time."""
+    CALLBACK_QUEUE_DEPTH.callback = dispatcher.queue.qsize
+    CALLBACK_RETRY_DEPTH.callback = lambda: len(dispatcher.retries)
+
+
+PROFILE_HEADER = "x-profile"
+
+
+def profiling_enabled() -> bool:
+    """Profiling is opt-in: ENABLE_PROFILING=1 and pyinstrument installed."""
+    if os.getenv("ENABLE_PROFILING", "0") != "1":
+        return False
+    try:
+        import pyinstrument  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class RequestProfiler:
+    """Profiles one request with pyinstrument and logs the call tree."""
+
+    def __init__(self, label: str):
+        from pyinstrument import Profiler
+        self.label = label
+        self.profiler = Profiler(async_mode="enabled")
+
+    def __enter__(self):
+        self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.stop()
+        Logger().info(f"Profile for {self.label}:\n{self.profiler.output_text(unicode=False, color=False)}")
+        return False
+
+
+BECKN_ACTIONS = frozenset({
+    "search", "select", "init", "confirm", "status", "track",
+    "cancel", "update", "rating", "support",
+})
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests per Beckn action and timing the ACK
+    (request received until the response headers are sent). Paths that are
+    not Beckn actions are grouped under "other" to keep label sets small.
+    A request carrying `X-Profile: 1` is profiled when profiling_enabled().
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiling = profiling_enabled()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"].strip("/")
+        action = path if path in BECKN_ACTIONS else "other"
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                ACK_LATENCY.observe(time.perf_counter() - started, action)
+            await send(message)
+
+        try:
+            if self.profiling and (PROFILE_HEADER.encode(), b"1") in scope.get("headers", ()):
+                with RequestProfiler(f"{scope['method']} {scope['path']}"):
+                    await self.app(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS.inc(action, str(status["code"]))
@@ -0,0 +1,90 @@
+"""
+This module contains the executor layer for CPU-heavy work: validating and
+serializing large catalog pages and snapshots, and compressing large callback
+bodies. Jobs below a size threshold run inline on the event loop; bigger ones
+go to a process pool (or a thread pool), taking and returning bytes so the
+hand-off stays cheap.
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from resources import metrics
+from resources.logger import Logger, format_exception_info
+from resources.utils import ConfigManager
+
+DEFAULT_OFFLOAD_CONFIG = {
+    # "process", "thread" or "inline" (everything runs on the event loop)
+    "executor": "process",
+    "max_workers": 2,
+    # Jobs with at least this many catalog items, or this many bytes, are offloaded
+    "offload_min_items": 500,
+    "offload_min_bytes": 262144,
+}
+
+
+class Offloader:
+    """
+    Runs module-level functions either inline or in an executor, depending on
+    the size of the job. Process pool workers are spawned rather than forked,
+    so they do not inherit the event loop or open database connections. If
+    the pool breaks (a worker died) it is replaced and the job runs inline.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.logger = Logger()
+        self.config = {**DEFAULT_OFFLOAD_CONFIG, **(config or {})}
+        self.executor: Optional[Executor] = None
+
+    @classmethod
+    async def create(cls):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("offload_config")
+        offloader = cls(config)
+        offloader.start()
+        return offloader
+
+    def start(self):
+        kind = self.config["executor"]
+        if kind == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.config["max_workers"],
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=self.config["max_workers"], thread_name_prefix="offload")
+        else:
+            self.executor = None
+        self.logger.info(f"Offloading CPU-heavy jobs to: {kind} (workers={self.config['max_workers']})")
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def should_offload(self, items: int = 0, size: int = 0) -> bool:
+        return self.executor is not None and (
+            items >= self.config["offload_min_items"] or size >= self.config["offload_min_bytes"]
+        )
+
+    async def run(self, func: Callable[..., Any], *args, items: int = 0, size: int = 0) -> Any:
+        """
+        Call `func(*args)`, in the executor when the job has at least
+        `offload_min_items` items or `offload_min_bytes` bytes. `func` must be
+        a module-level function and its arguments picklable.
+        """
+        if not self.should_offload(items, size):
+            return func(*args)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        except BrokenProcessPool as e:
+            self.logger.error(f"Offload pool broke, restarting it: {format_exception_info(e)}")
+            self.close()
+            self.start()
+            return func(*args)
+        finally:
+            metrics.OFFLOAD_LATENCY.observe(time.perf_counter() - started, func.__name__)
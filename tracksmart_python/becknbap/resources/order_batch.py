@@ -0,0 +1,44 @@
+"""
+This module contains the batched form of /status and /track: parsing the list
+of order ids a request carries and splitting it into the chunks answered by
+one callback each.
+"""
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_BATCH_CONFIG = {
+    "batch_max_orders": 5000,
+    "batch_chunk_size": 500,
+}
+
+
+def batch_order_ids(message: Dict[str, Any], max_orders: int) -> Optional[List[str]]:
+    """
+    The order ids of a batched request, or None for a single-order one.
+    Accepts `message.order_ids` (a list of ids) or `message.orders` (a list
+    of {"id": ...}). Duplicates are dropped, keeping the first occurrence.
+    Raises ValueError.
+    """
+    if "order_ids" in message:
+        ids = message["order_ids"]
+        if not isinstance(ids, list):
+            raise ValueError("order_ids must be a list of order ids")
+    elif "orders" in message:
+        orders = message["orders"]
+        if not isinstance(orders, list) or not all(isinstance(order, dict) for order in orders):
+            raise ValueError("orders must be a list of objects with an id")
+        ids = [order.get("id") for order in orders]
+    else:
+        return None
+    if not all(isinstance(order_id, str) and order_id for order_id in ids):
+        raise ValueError("Every order id must be a non-empty string")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError("No order ids given")
+    if len(ids) > max_orders:
+        raise ValueError(f"At most {max_orders} orders per request, got {len(ids)}")
+    return ids
+
+
+def chunked(ids: List[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
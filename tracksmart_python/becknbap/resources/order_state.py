@@ -0,0 +1,101 @@
+"""
+This module contains the order state machine: the allowed state transitions,
+the fields a BAP may change with /update, and the conflict raised when a
+conditional order update does not apply.
+"""
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import Error, Order
+from resources.serialization import type_adapter
+
+CREATED = "Created"
+CONFIRMED = "Confirmed"
+IN_TRANSIT = "In Transit"
+DELIVERED = "Delivered"
+CANCELLED = "Cancelled"
+
+# state -> states it may move to; Delivered and Cancelled are final
+TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    CREATED: frozenset({CONFIRMED, CANCELLED}),
+    CONFIRMED: frozenset({IN_TRANSIT, CANCELLED}),
+    IN_TRANSIT: frozenset({DELIVERED}),
+    DELIVERED: frozenset(),
+    CANCELLED: frozenset(),
+}
+
+# Order fields /update may set; id, items, provider and version are not client-writable
+UPDATABLE_FIELDS = ("state", "billing", "fulfillment", "payment")
+
+
+class OrderConflict(Exception):
+    """
+    A conditional order update matched the order id but not its state or
+    version. `order` is the order as it is now.
+    """
+
+    def __init__(self, order: Dict[str, Any]):
+        super().__init__(f"Order {order.get('id')} is {order.get('state')} at version {order.get('version', 0)}")
+        self.order = order
+
+
+def sources(target: str) -> FrozenSet[str]:
+    """The states an order may move to `target` from."""
+    return frozenset(state for state, targets in TRANSITIONS.items() if target in targets)
+
+
+def open_states() -> FrozenSet[str]:
+    """States whose orders may still change."""
+    return frozenset(state for state, targets in TRANSITIONS.items() if targets)
+
+
+def parse_update(order: Dict[str, Any]) -> Tuple[Dict[str, Any], FrozenSet[str], Optional[int]]:
+    """
+    Turn the `order` of an /update into (fields to set, states the order must
+    be in, expected version). Fields outside UPDATABLE_FIELDS are ignored and
+    the rest are validated against the Order model. Raises ValueError.
+    """
+    fields = {}
+    for name in UPDATABLE_FIELDS:
+        if name in order:
+            try:
+                value = type_adapter(Order.model_fields[name].annotation).validate_python(order[name])
+            except ValidationError as e:
+                raise ValueError(f"Invalid {name}: {e.errors()[0]['msg']}")
+            fields[name] = value.model_dump() if hasattr(value, "model_dump") else value
+    if not fields:
+        raise ValueError(f"Nothing to update, expected one of: {', '.join(UPDATABLE_FIELDS)}")
+    if "state" in fields:
+        if fields["state"] not in TRANSITIONS:
+            raise ValueError(f"Unknown order state: {fields['state']}")
+        allowed = sources(fields["state"])
+    else:
+        allowed = open_states()
+    return fields, allowed, expected_version(order)
+
+
+def expected_version(order: Dict[str, Any]) -> Optional[int]:
+    """The version a client based its change on, if it sent one."""
+    version = order.get("version")
+    if version is None:
+        return None
+    if isinstance(version, bool) or not isinstance(version, int) or version < 0:
+        raise ValueError("Invalid version: expected a non-negative integer")
+    return version
+
+
+def conflict_error(conflict: OrderConflict, version: Optional[int], target: Optional[str]) -> Error:
+    order = conflict.order
+    current = order.get("version", 0)
+    if version is not None and version != current:
+        return Error(
+            code="ORDER_VERSION_CONFLICT",
+            message=f"Order {order.get('id')} is at version {current}, not {version}",
+        )
+    if target is not None:
+        return Error(
+            code="INVALID_STATE_TRANSITION",
+            message=f"Order {order.get('id')} cannot move from {order.get('state')} to {target}",
+        )
+    return Error(code="INVALID_STATE_TRANSITION", message=f"Order {order.get('id')} is {order.get('state')}")
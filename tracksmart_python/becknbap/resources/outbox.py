@@ -0,0 +1,158 @@
+"""
+This module contains the durable callback outbox and the per-destination
+circuit breaker used by the callback dispatcher.
+"""
+import random
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from resources.logger import Logger, format_exception_info
+from resources.storage import OutboxRepository
+from resources.utils import WORKER_ID
+
+
+def backoff_delay(attempts: int, base: float, maximum: float) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(maximum, base * 2**attempts))."""
+    return random.uniform(0, min(maximum, base * (2 ** attempts)))
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive delivery failures to one destination host.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    callbacks to that host are held back for `reset_timeout` seconds. The
+    first delivery after that is a trial: success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial delivery through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class CallbackOutbox(OutboxRepository):
+    """
+    MongoDB-backed store for callbacks that have not been delivered yet.
+
+    Messages live in `callback_outbox` until they are delivered (and removed)
+    or exhaust their retries, at which point they are moved to
+    `callback_dead_letter`.
+
+    Every stored message is leased to the worker process that wrote it until
+    `lease_timeout` seconds after its next attempt. Workers claim messages
+    whose lease has run out (on startup and periodically), so when several
+    processes share the outbox each message is delivered by one of them and
+    the messages of a crashed worker are picked up by the others.
+    """
+
+    def __init__(self, mongo_client, collection_name: str = "callback_outbox",
+                 dead_letter_name: str = "callback_dead_letter", lease_timeout: float = 300.0):
+        self.logger = Logger()
+        self.mongo_client = mongo_client
+        self.collection_name = collection_name
+        self.dead_letter_name = dead_letter_name
+        self.lease_timeout = lease_timeout
+        self.collection = None
+        self.dead_letter_collection = None
+
+    async def open(self):
+        self.collection = await self.mongo_client.get_collection(self.collection_name)
+        self.dead_letter_collection = await self.mongo_client.get_collection(self.dead_letter_name)
+        await self.collection.create_index("next_attempt_at")
+        await self.collection.create_index("lease_until")
+
+    async def add(self, message: Dict[str, Any]) -> bool:
+        """Persist a message. Returns False if the write failed."""
+        try:
+            await self.collection.insert_one(self._to_document(message))
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to persist callback {message['_id']}: {format_exception_info(e)}")
+            return False
+
+    async def ack(self, message_id: str):
+        try:
+            await self.collection.delete_one({"_id": message_id})
+        except Exception as e:
+            self.logger.error(f"Failed to remove delivered callback {message_id}: {format_exception_info(e)}")
+
+    async def reschedule(self, message: Dict[str, Any], delay: float):
+        """Record a failed attempt and when the message is due again."""
+        try:
+            message["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            document = self._to_document(message)
+            await self.collection.replace_one({"_id": message["_id"]}, document, upsert=True)
+        except Exception as e:
+            self.logger.error(f"Failed to reschedule callback {message['_id']}: {format_exception_info(e)}")
+
+    async def dead_letter(self, message: Dict[str, Any]):
+        """Move a message that exhausted its retries to the dead-letter collection."""
+        try:
+            document = self._to_document(message)
+            document["dead_lettered_at"] = datetime.now(timezone.utc)
+            await self.dead_letter_collection.replace_one({"_id": message["_id"]}, document, upsert=True)
+            await self.collection.delete_one({"_id": message["_id"]})
+        except Exception as e:
+            self.logger.error(f"Failed to dead-letter callback {message['_id']}: {format_exception_info(e)}")
+
+    async def claim(self, limit: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Take over up to `limit` messages whose lease ran out, oldest due first."""
+        for _ in range(limit):
+            now = datetime.now(timezone.utc)
+            document = await self.collection.find_one_and_update(
+                {"$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]},
+                {"$set": {"owner": WORKER_ID, "lease_until": now + timedelta(seconds=self.lease_timeout)}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if document is None:
+                return
+            yield self._from_document(document)
+
+    def _to_document(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        next_attempt_at = message.get("next_attempt_at") or datetime.now(timezone.utc)
+        return {
+            "_id": message["_id"],
+            "url": message["url"],
+            "payload": message["payload"],
+            "attempts": message.get("attempts", 0),
+            "last_error": message.get("last_error"),
+            # How the body is sent: number of callbacks in a batched envelope, content encoding
+            "batched": message.get("batched"),
+            "compression": message.get("compression"),
+            "created_at": message.get("created_at") or datetime.now(timezone.utc),
+            "next_attempt_at": next_attempt_at,
+            "owner": WORKER_ID,
+            "lease_until": next_attempt_at + timedelta(seconds=self.lease_timeout),
+        }
+
+    @staticmethod
+    def _from_document(document: Dict[str, Any]) -> Dict[str, Any]:
+        message = dict(document)
+        message["persisted"] = True
+        return message
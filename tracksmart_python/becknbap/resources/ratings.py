@@ -0,0 +1,137 @@
+"""
+This module contains the running rating statistics kept per provider and per
+item, and the process-local cache that serves them to /search and /ratings.
+
+Each rating is applied to its keys ("provider:<id>", "item:<id>") as an
+increment of count, sum and a 1-5 histogram, so reading an average never
+scans the ratings themselves.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from resources.logger import Logger, format_exception_info
+from resources.utils import ConfigManager
+
+DEFAULT_RATING_CONFIG = {
+    "rating_refresh_interval": 10.0,
+}
+
+RATING_VALUES = range(1, 6)
+# Stats changed this long before the last refresh are fetched again, for clock skew between workers
+REFRESH_OVERLAP = 5.0
+
+
+def rating_keys(order: Dict[str, Any]) -> List[str]:
+    """The stats keys a rating of `order` counts towards."""
+    keys = []
+    provider_id = (order.get("provider") or {}).get("id")
+    if provider_id:
+        keys.append(f"provider:{provider_id}")
+    for item in order.get("items") or []:
+        if item.get("id") and f"item:{item['id']}" not in keys:
+            keys.append(f"item:{item['id']}")
+    return keys
+
+
+def rating_delta(value: int, previous: Optional[int]) -> Dict[str, int]:
+    """
+    The increments that take a key's stats from `previous` (None for a first
+    rating) to `value`. Fields are "count", "sum" and "histogram.<value>".
+    """
+    if previous is None:
+        return {"count": 1, "sum": value, f"histogram.{value}": 1}
+    if previous == value:
+        return {}
+    return {"sum": value - previous, f"histogram.{value}": 1, f"histogram.{previous}": -1}
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {"count": 0, "sum": 0, "histogram": {str(value): 0 for value in RATING_VALUES}}
+
+
+def apply_delta(stats: Dict[str, Any], delta: Dict[str, int]):
+    for field, amount in delta.items():
+        if field.startswith("histogram."):
+            bucket = field[len("histogram."):]
+            stats["histogram"][bucket] = stats["histogram"].get(bucket, 0) + amount
+        else:
+            stats[field] = stats.get(field, 0) + amount
+
+
+def summarize(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """The public form of a key's stats: count, average and histogram."""
+    count = stats.get("count", 0)
+    return {
+        "count": count,
+        "average": round(stats.get("sum", 0) / count, 2) if count else None,
+        "histogram": {str(value): stats.get("histogram", {}).get(str(value), 0) for value in RATING_VALUES},
+    }
+
+
+class RatingStatsCache:
+    """
+    Holds the stats of every key in memory, summarized, so lookups are a dict
+    read. Ratings submitted to this worker are applied at once; those of
+    other workers arrive with the next refresh, which only fetches the keys
+    changed since the previous one.
+    """
+
+    def __init__(self, repository, config: Optional[dict] = None):
+        self.logger = Logger()
+        self.repository = repository
+        self.config = {**DEFAULT_RATING_CONFIG, **(config or {})}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        self.refreshed_at: Optional[float] = None
+        self.refresher: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def create(cls, repository):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("cache_config")
+        cache = cls(repository, config)
+        await cache.refresh()
+        cache.refresher = asyncio.create_task(cache._refresh_periodically())
+        return cache
+
+    async def close(self):
+        if self.refresher:
+            self.refresher.cancel()
+            await asyncio.gather(self.refresher, return_exceptions=True)
+            self.refresher = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.summaries.get(key)
+
+    def item(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return self.summaries.get(f"item:{item_id}")
+
+    async def add(self, rating: Dict[str, Any], keys: Iterable[str]):
+        """Store a rating through the repository and apply it to the cached stats."""
+        keys = list(keys)
+        delta = await self.repository.add(rating, keys)
+        if delta:
+            for key in keys:
+                stats = self.stats.setdefault(key, empty_stats())
+                apply_delta(stats, delta)
+                self.summaries[key] = summarize(stats)
+
+    async def refresh(self):
+        started = time.time()
+        since = self.refreshed_at - REFRESH_OVERLAP if self.refreshed_at is not None else None
+        changed = await self.repository.stats(since)
+        for key, stats in changed.items():
+            self.stats[key] = stats
+            self.summaries[key] = summarize(stats)
+        self.refreshed_at = started
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.config["rating_refresh_interval"])
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Rating stats refresh failed: {format_exception_info(e)}")
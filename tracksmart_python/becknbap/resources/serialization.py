@@ -0,0 +1,92 @@
+"""
+This module contains the fast serialization helpers used on the hot path:
+pre-encoded ACK/NACK bodies, cached TypeAdapters, direct-to-bytes dumps and
+on_search bodies assembled from already encoded catalog items.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+from models import BecknResponse, Context, Error, Item
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The ACK/NACK bodies never change, so they are encoded once at import time.
+ACK_BODY = b'{"message":{"ack":{"status":"ACK"}}}'
+NACK_BODY = b'{"message":{"ack":{"status":"NACK"}}}'
+JSON_MEDIA_TYPE = "application/json"
+# Stands in for the catalog items while the rest of an on_search body is encoded
+ITEMS_PLACEHOLDER = "__catalog_items__"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+def ack_response() -> Response:
+    return Response(content=ACK_BODY, media_type=JSON_MEDIA_TYPE)
+
+
+def nack_response(status_code: int = 200) -> Response:
+    return Response(content=NACK_BODY, media_type=JSON_MEDIA_TYPE, status_code=status_code)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp) -> TypeAdapter:
+    """Return a TypeAdapter for `tp`, building it only once per type."""
+    return TypeAdapter(tp)
+
+
+def dump_json(value: Any, tp=None) -> bytes:
+    """Serialize a model (or any value of type `tp`) straight to JSON bytes."""
+    return type_adapter(tp or type(value)).dump_json(value)
+
+
+def callback_body(context: Context, message: Dict[str, Any], error: Optional[Error] = None) -> bytes:
+    """
+    Encode a callback envelope without a dict round trip. `context` is the
+    already-validated response context, so validation is skipped.
+    """
+    payload = BecknResponse.model_construct(context=context, message=message, error=error)
+    return dump_json(payload, BecknResponse)
+
+
+def encode_documents(documents: List[Dict[str, Any]]) -> bytes:
+    return dump_json(documents, List[Dict[str, Any]])
+
+
+def encode_items(documents: bytes) -> Tuple[List[str], List[bytes]]:
+    """
+    Validate JSON-encoded catalog documents as `Item`s and encode each one.
+    Returns (item ids, encoded items). Runs in the offload executor for large
+    pages (see resources.offload), so it takes and returns bytes.
+    """
+    items = type_adapter(List[Item]).validate_json(documents)
+    return [item.id for item in items], [dump_json(item) for item in items]
+
+
+def with_field(encoded: bytes, key: str, value: Any) -> bytes:
+    """Add `key` to an encoded JSON object that does not have it yet."""
+    return encoded[:-1] + b',"' + key.encode() + b'":' + dump_json(value, Any) + b"}"
+
+
+def catalog_callback_body(context: Context, items: List[bytes], message: Dict[str, Any]) -> bytes:
+    """
+    Encode an on_search callback whose `catalog.items` are the encoded
+    `items`, joined in without decoding them. `message` holds the other
+    message fields (e.g. pagination).
+    """
+    body = callback_body(context, {**message, "catalog": {"items": ITEMS_PLACEHOLDER}})
+    # The catalog is the message's last field, so its placeholder is the last one in the body
+    head, _, tail = body.rpartition(b'"' + ITEMS_PLACEHOLDER.encode() + b'"')
+    return head + b"[" + b",".join(items) + b"]" + tail
@@ -0,0 +1,242 @@
+"""
+This module contains the append-only shipment event store: every tracking
+state change of an order, kept as a compact record in a MongoDB time-series
+collection for history, analytics and ETA, and read back with keyset
+paginated range queries by order or provider and time window.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import CollectionInvalid
+
+from resources.logger import Logger, format_exception_info
+from resources.utils import ConfigManager, RecentWrites, mongo_config, routed
+from resources.write_batcher import WriteBatcher
+
+DEFAULT_SHIPMENT_EVENT_CONFIG = {
+    "shipment_events_granularity": "seconds",
+    "shipment_history_page_size": 100,
+    "shipment_history_max_page_size": 1000,
+    # Seconds re-read behind a cursor, for events stored late (another worker's clock, a delayed batch)
+    "shipment_history_overlap": 5.0,
+    # Returned events a cursor remembers within the overlap; past this, re-reads start after the ones it dropped
+    "shipment_history_overlap_events": 32,
+}
+
+SHIPMENT_EVENTS = "shipment_events"
+# Records are {"t": time, "m": {"o": order id, "p": provider id}, "s": status}
+SHIPMENT_EVENT_INDEXES = [
+    IndexModel([("m.o", ASCENDING), ("t", ASCENDING)], name="shipment_events_order_time"),
+    IndexModel([("m.p", ASCENDING), ("t", ASCENDING)], name="shipment_events_provider_time"),
+]
+
+
+def event_record(order_id: str, provider_id: Optional[str], status: str, at: datetime) -> Dict[str, Any]:
+    return {"t": at, "m": {"o": order_id, "p": provider_id}, "s": status}
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def public_event(record: Dict[str, Any]) -> Dict[str, Any]:
+    meta = record.get("m") or {}
+    return {
+        "order_id": meta.get("o"),
+        "provider_id": meta.get("p"),
+        "status": record.get("s"),
+        "timestamp": _utc(record["t"]).isoformat(),
+    }
+
+
+CursorEntry = Tuple[int, ObjectId]
+
+
+def cursor_entry(record: Dict[str, Any]) -> CursorEntry:
+    """An event's time in milliseconds and its _id."""
+    return int(_utc(record["t"]).timestamp() * 1000), record["_id"]
+
+
+def encode_cursor(entries: List[CursorEntry], floor: Optional[CursorEntry] = None) -> str:
+    """
+    An opaque position: the entry of the last event returned, followed by
+    those of the newest events already returned within the overlap window
+    behind it and, after "|", the entry re-reads start after once older
+    ones had to be left out.
+    """
+    cursor = ";".join(f"{millis}:{record_id}" for millis, record_id in entries)
+    return f"{cursor}|{floor[0]}:{floor[1]}" if floor else cursor
+
+
+def _decode_entry(entry: str) -> CursorEntry:
+    millis, record_id = entry.split(":", 1)
+    return int(millis), ObjectId(record_id)
+
+
+def decode_cursor(cursor: str) -> Tuple[List[CursorEntry], Optional[CursorEntry]]:
+    """The entries and floor of a cursor. Raises ValueError."""
+    try:
+        entries, _, floor = cursor.partition("|")
+        return [_decode_entry(entry) for entry in entries.split(";")], _decode_entry(floor) if floor else None
+    except (ValueError, InvalidId):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _from_millis(millis: int) -> datetime:
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+
+
+def parse_time(value: str) -> datetime:
+    """An ISO 8601 time, taken as UTC when it has no offset. Raises ValueError."""
+    try:
+        return _utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time: {value}")
+
+
+class ShipmentEventStore:
+    """
+    Appends shipment events through a write-behind batcher and serves them
+    by order or provider, oldest first, a page at a time.
+
+    Event times come from the recording worker and writes are batched, so
+    an event can be stored after a reader's cursor has passed its time.
+    Oldest-first reads from a cursor therefore re-read the
+    `shipment_history_overlap` seconds behind it and skip the events the
+    cursor says were returned already, as TrackingStore._poll does. A
+    cursor remembers at most `shipment_history_overlap_events` of them, so
+    in a denser window the re-read starts after the newest event it had to
+    drop instead: it stays small, every page moves forward, and no event is
+    returned twice.
+
+    The collection is created as a time-series collection (metaField "m",
+    timeField "t"), which MongoDB stores in compressed columnar buckets. On
+    servers without time-series support (before 5.0) it falls back to a
+    plain collection with the same indexes.
+    """
+
+    def __init__(self, db, config: Optional[dict] = None):
+        self.logger = Logger()
+        self.db = db
+        self.config = {**DEFAULT_SHIPMENT_EVENT_CONFIG, **(config or {})}
+        self.collection = db[SHIPMENT_EVENTS]
+        # History is read with the "track" read preference, from the primary for orders appended to lately
+        self.reads = routed(self.collection, "track")
+        self.recent_writes = RecentWrites(mongo_config()["primary_after_write_seconds"])
+        self.writer = WriteBatcher(self.collection, config)
+
+    @classmethod
+    async def create(cls, db):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("cache_config")
+        store = cls(db, config)
+        await store.open()
+        return store
+
+    async def open(self):
+        try:
+            await self.db.create_collection(SHIPMENT_EVENTS, timeseries={
+                "timeField": "t",
+                "metaField": "m",
+                "granularity": self.config["shipment_events_granularity"],
+            })
+        except CollectionInvalid:
+            pass
+        except Exception as e:
+            self.logger.info(f"Time-series collections unavailable, storing shipment events as documents: {e}")
+        await self.collection.create_indexes(SHIPMENT_EVENT_INDEXES)
+
+    async def close(self):
+        await self.writer.close()
+
+    async def append(self, order_id: str, provider_id: Optional[str], status: str, at: datetime):
+        self.recent_writes.mark(order_id)
+        try:
+            await self.writer.insert(event_record(order_id, provider_id, status, at))
+        except Exception as e:
+            self.logger.error(f"Failed to store shipment event for {order_id}: {format_exception_info(e)}")
+
+    def page_size(self, limit: Optional[int]) -> int:
+        if limit is None:
+            return self.config["shipment_history_page_size"]
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            raise ValueError("limit must be a positive integer")
+        return min(limit, self.config["shipment_history_max_page_size"])
+
+    async def query(self, order_id: Optional[str] = None, provider_id: Optional[str] = None,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    cursor: Optional[str] = None, limit: Optional[int] = None,
+                    newest_first: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str], bool]:
+        """
+        Events of an order or a provider within [start, end), after `cursor`.
+        Returns (events, cursor of the last one returned, whether more
+        follow). With no events the given cursor is returned, so a client
+        can keep polling from where it is. Raises ValueError.
+        """
+        if not order_id and not provider_id:
+            raise ValueError("An order_id or provider_id is required")
+        limit = self.page_size(limit)
+        query: Dict[str, Any] = {}
+        if order_id:
+            query["m.o"] = order_id
+        if provider_id:
+            query["m.p"] = provider_id
+        window = {}
+        if start is not None:
+            window["$gte"] = start
+        if end is not None:
+            window["$lt"] = end
+        entries, floor = decode_cursor(cursor) if cursor else ([], None)
+        if entries and newest_first:
+            millis, record_id = entries[0]
+            after = _from_millis(millis)
+            query["$or"] = [{"t": {"$lt": after}}, {"t": after, "_id": {"$lt": record_id}}]
+        elif entries:
+            horizon = _from_millis(entries[0][0]) - timedelta(seconds=self.config["shipment_history_overlap"])
+            window["$gte"] = max(window.get("$gte", horizon), horizon)
+            if floor:
+                after = _from_millis(floor[0])
+                query["$or"] = [{"t": {"$gt": after}}, {"t": after, "_id": {"$gt": floor[1]}}]
+            query["_id"] = {"$nin": [record_id for _, record_id in entries]}
+        if window:
+            query["t"] = window
+        direction = DESCENDING if newest_first else ASCENDING
+        reads = self.collection if order_id in self.recent_writes else self.reads
+        records = [
+            record async for record in reads.find(query)
+            .sort([("t", direction), ("_id", direction)])
+            .limit(limit + 1)
+        ]
+        more = len(records) > limit
+        records = records[:limit]
+        if not records:
+            next_cursor = cursor
+        elif newest_first:
+            next_cursor = encode_cursor([cursor_entry(records[-1])])
+        else:
+            next_cursor = encode_cursor(*self._advance(entries, floor, [cursor_entry(record) for record in records]))
+        return [public_event(record) for record in records], next_cursor, more
+
+    def _advance(self, entries: List[CursorEntry], floor: Optional[CursorEntry],
+                 returned: List[CursorEntry]) -> Tuple[List[CursorEntry], Optional[CursorEntry]]:
+        """
+        The cursor entries and floor after returning `returned`: the new
+        position, the newest events its overlap window holds, and the newest
+        one left out of them. Every returned event after the floor and within
+        the window stays in the entries, so re-reads skip all of them.
+        """
+        position = max(entries[:1] + returned)
+        horizon = position[0] - int(self.config["shipment_history_overlap"] * 1000)
+        seen = sorted(
+            {entry for entry in entries + returned if entry != position and entry[0] >= horizon},
+            reverse=True,
+        )
+        limit = self.config["shipment_history_overlap_events"]
+        if len(seen) > limit:
+            floor = max(floor, seen[limit]) if floor else seen[limit]
+        if floor and floor[0] < horizon:
+            floor = None
+        return [position] + seen[:limit], floor
@@ -0,0 +1,181 @@
+"""
+This module contains the repository interfaces the endpoints persist through
+(catalog, orders, ratings, callback outbox) and `create_storage`, which builds
+them for the configured backend.
+
+Backends (STORAGE_BACKEND):
+    mongo       MongoDB through resources.utils.MongoClient (default)
+    dynamodb    the single-table pk/sk schema used by seed_data.py. Catalog
+                reads scan the whole table: every filtered /search the
+                catalog cache cannot answer costs a full Scan, so keep the
+                catalog small or use mongo/sqlite for large ones
+    sqlite      in-process SQLite; SQLITE_PATH defaults to ":memory:"
+    memory      alias for sqlite with an in-memory database
+
+Tracking history, SSE streams and webhooks (resources.tracking), shipment
+event queries and idempotency shared across workers need MongoDB. On the
+other backends the tracking endpoints answer 501 Not Implemented, and
+duplicate requests are only detected within each worker.
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+CatalogPage = Tuple[List[Dict[str, Any]], Optional[str]]
+
+
+class CatalogRepository(ABC):
+    """Catalog items keyed on `id`, plus a version counter bumped on every change."""
+
+    @abstractmethod
+    async def list_items(self) -> List[Dict[str, Any]]:
+        """Every item, ordered by id."""
+
+    @abstractmethod
+    async def find_page(self, query: Dict[str, Any], cursor: Optional[str], limit: int) -> CatalogPage:
+        """
+        One page of items matching a query from build_catalog_query, ordered
+        by id and starting after `cursor`, and the cursor of the next page.
+        """
+
+    @abstractmethod
+    async def replace_all(self, items: List[Dict[str, Any]]):
+        """Replace the whole catalog."""
+
+    @abstractmethod
+    async def version(self) -> int:
+        pass
+
+    @abstractmethod
+    async def bump_version(self) -> int:
+        pass
+
+    async def watch(self):
+        """An async context manager yielding change events; backends without one raise."""
+        raise NotImplementedError("change notifications are not supported by this backend")
+
+
+class OrderRepository(ABC):
+    @abstractmethod
+    async def insert(self, order: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    async def save_draft(self, message: Dict[str, Any]):
+        """Store the order sent with /init."""
+
+    @abstractmethod
+    async def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def get_many(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """The orders among `order_ids` that exist, keyed on id, fetched in one query where possible."""
+
+    @abstractmethod
+    async def update(self, order_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Set `fields` on the order and return it updated, or None if it does not exist."""
+
+    @abstractmethod
+    async def transition(self, order_id: str, fields: Dict[str, Any], states: Iterable[str],
+                         version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically set `fields` and increment `version` if the order is in one
+        of `states` and, when `version` is given, at that version. Returns the
+        updated order or None if it does not exist, and raises
+        resources.order_state.OrderConflict if it exists but does not match.
+        """
+
+    async def close(self):
+        """Flush buffered writes."""
+
+
+class RatingRepository(ABC):
+    """Ratings, one per order, and the running stats of each key (see resources.ratings)."""
+
+    @abstractmethod
+    async def add(self, rating: Dict[str, Any], keys: List[str]) -> Dict[str, int]:
+        """
+        Store the rating, replacing an earlier rating of the same order, and
+        increment the stats of every key by rating_delta. Returns the delta.
+        """
+
+    @abstractmethod
+    async def stats(self, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Stats ({"count", "sum", "histogram"}) of every key, or only of those
+        changed at or after the epoch time `since`.
+        """
+
+
+class OutboxRepository(ABC):
+    """Durable store for undelivered callbacks, see resources.outbox.CallbackOutbox."""
+
+    async def open(self):
+        pass
+
+    @abstractmethod
+    async def add(self, message: Dict[str, Any]) -> bool:
+        pass
+
+    @abstractmethod
+    async def ack(self, message_id: str):
+        pass
+
+    @abstractmethod
+    async def reschedule(self, message: Dict[str, Any], delay: float):
+        pass
+
+    @abstractmethod
+    async def dead_letter(self, message: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def claim(self, limit: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        pass
+
+
+class Storage:
+    """The repositories of one backend. `db` is the Mongo database when the backend is MongoDB."""
+
+    def __init__(self, backend: str, catalog: CatalogRepository, orders: OrderRepository,
+                 ratings: RatingRepository, outbox: Optional[OutboxRepository] = None, db=None, closer=None,
+                 pinger=None):
+        self.backend = backend
+        self.catalog = catalog
+        self.orders = orders
+        self.ratings = ratings
+        self.outbox = outbox
+        self.db = db
+        self.closer = closer
+        self.pinger = pinger
+
+    async def ping(self) -> bool:
+        """Whether the backend is reachable; in-process backends always are."""
+        return await self.pinger() if self.pinger is not None else True
+
+    async def close(self):
+        await self.orders.close()
+        if self.closer is not None:
+            await self.closer()
+
+
+async def create_storage(backend: Optional[str] = None, mongo_client=None) -> Optional[Storage]:
+    """
+    Build the repositories for `backend` (default: STORAGE_BACKEND or "mongo").
+    The Mongo backend needs a connected MongoClient and returns None without one.
+    """
+    backend = (backend or os.getenv("STORAGE_BACKEND", "mongo")).lower()
+    if backend == "mongo":
+        if mongo_client is None:
+            return None
+        from resources.storage_mongo import create_mongo_storage
+        return await create_mongo_storage(mongo_client)
+    if backend in ("sqlite", "memory"):
+        from resources.storage_sqlite import create_sqlite_storage
+        path = ":memory:" if backend == "memory" else os.getenv("SQLITE_PATH", ":memory:")
+        return await create_sqlite_storage(path)
+    if backend == "dynamodb":
+        from resources.storage_dynamo import create_dynamo_storage
+        return await create_dynamo_storage(os.getenv("TABLE_NAME", "TrackSmartData"))
+    raise ValueError(f"Unknown storage backend: {backend}")
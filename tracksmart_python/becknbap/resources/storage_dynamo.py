@@ -0,0 +1,402 @@
+"""
+This module contains the DynamoDB implementation of the repositories in
+resources.storage, on the single-table pk/sk schema used by seed_data.py:
+
+    pk                  sk                  holds
+    item#<id>           catalog             catalog item
+    catalog             meta                catalog version counter
+    order#<id>          created#<iso time>  order (as written by seed_data.py)
+    order#<id>          rating              rating of the order
+    ratingstats#<key>   stats               running rating stats of a provider or item
+    draft#<uuid>        init                order sent with /init
+    outbox#<id>         message             undelivered callback
+    deadletter#<id>     message             callback that exhausted its retries
+
+Full documents are kept as JSON in `doc`; `status` and `provider_id` are
+also set on orders as in seed_data.py. boto3 is synchronous, so every call
+runs in the default thread pool.
+"""
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from resources.catalog_search import catalog_document
+from resources.logger import Logger, format_exception_info
+from resources.order_state import OrderConflict
+from resources.ratings import RATING_VALUES, rating_delta
+from resources.storage import (
+    CatalogPage, CatalogRepository, OrderRepository, OutboxRepository, RatingRepository, Storage,
+)
+from resources.utils import WORKER_ID
+
+try:
+    import boto3
+    from boto3.dynamodb.conditions import Attr, Key
+except ImportError:  # optional dependency, only needed for this backend
+    boto3 = None
+
+
+def _run(func, *args, **kwargs):
+    return asyncio.to_thread(func, *args, **kwargs)
+
+
+def _doc(item: Dict[str, Any]) -> Dict[str, Any]:
+    return json.loads(item["doc"])
+
+
+def _equals(actual: Any, value: Any) -> bool:
+    """Whether `actual` equals a filter value, or any of a {"$in": [...]} list."""
+    return actual in value["$in"] if isinstance(value, dict) else actual == value
+
+
+def _matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluate a query from build_catalog_query against one catalog document."""
+    for key, value in query.items():
+        if key == "$text":
+            name = ((document.get("descriptor") or {}).get("name") or "").lower()
+            if not any(word.lower() in name for word in value["$search"].split()):
+                return False
+        elif key == "price_amount":
+            amount = document.get("price_amount")
+            if amount is None:
+                return False
+            if "$gte" in value and amount < value["$gte"]:
+                return False
+            if "$lte" in value and amount > value["$lte"]:
+                return False
+        elif key.startswith("tags."):
+            if not _equals((document.get("tags") or {}).get(key[len("tags."):]), value):
+                return False
+        elif not _equals(document.get(key), value):
+            return False
+    return True
+
+
+class DynamoCatalogRepository(CatalogRepository):
+    """
+    Catalog reads scan the `item#` partition keys, so filtered searches are
+    evaluated in process; serve them from the catalog cache where possible.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    async def _scan_items(self) -> List[Dict[str, Any]]:
+        items, kwargs = [], {"FilterExpression": Attr("sk").eq("catalog") & Attr("pk").begins_with("item#")}
+        while True:
+            page = await _run(self.table.scan, **kwargs)
+            items.extend(_doc(item) for item in page["Items"])
+            if "LastEvaluatedKey" not in page:
+                return sorted(items, key=lambda item: item["id"])
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    async def list_items(self) -> List[Dict[str, Any]]:
+        return await self._scan_items()
+
+    async def find_page(self, query: Dict[str, Any], cursor: Optional[str], limit: int) -> CatalogPage:
+        documents = [
+            item for item in await self._scan_items()
+            if (not cursor or item["id"] > cursor) and _matches(catalog_document(item), query)
+        ]
+        next_cursor = documents[limit - 1]["id"] if len(documents) > limit else None
+        return documents[:limit], next_cursor
+
+    async def replace_all(self, items: List[Dict[str, Any]]):
+        existing = await self._scan_items()
+
+        def write():
+            with self.table.batch_writer(overwrite_by_pkeys=["pk", "sk"]) as batch:
+                keep = {item["id"] for item in items}
+                for item in existing:
+                    if item["id"] not in keep:
+                        batch.delete_item(Key={"pk": f"item#{item['id']}", "sk": "catalog"})
+                for item in items:
+                    batch.put_item(Item={"pk": f"item#{item['id']}", "sk": "catalog", "doc": json.dumps(item)})
+
+        await _run(write)
+        await self.bump_version()
+
+    async def version(self) -> int:
+        response = await _run(self.table.get_item, Key={"pk": "catalog", "sk": "meta"})
+        return int(response.get("Item", {}).get("version", 0))
+
+    async def bump_version(self) -> int:
+        response = await _run(
+            self.table.update_item,
+            Key={"pk": "catalog", "sk": "meta"},
+            UpdateExpression="ADD version :one",
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["version"])
+
+
+class DynamoOrderRepository(OrderRepository):
+    def __init__(self, table):
+        self.table = table
+
+    async def insert(self, order: Dict[str, Any]):
+        await _run(self.table.put_item, Item=self._item(order, datetime.now(timezone.utc).isoformat()))
+
+    @staticmethod
+    def _item(order: Dict[str, Any], created_at: str) -> Dict[str, Any]:
+        return {
+            "pk": f"order#{order['id']}",
+            "sk": f"created#{created_at}",
+            "provider_id": f"provider#{(order.get('provider') or {}).get('id')}",
+            "status": order.get("state"),
+            "created_at": created_at,
+            "doc": json.dumps(order, default=str),
+        }
+
+    async def save_draft(self, message: Dict[str, Any]):
+        await _run(self.table.put_item, Item={
+            "pk": f"draft#{uuid.uuid4()}", "sk": "init", "doc": json.dumps(message, default=str),
+        })
+
+    async def _find(self, order_id: str) -> Optional[Dict[str, Any]]:
+        response = await _run(
+            self.table.query,
+            KeyConditionExpression=Key("pk").eq(f"order#{order_id}") & Key("sk").begins_with("created#"),
+            Limit=1,
+        )
+        return response["Items"][0] if response["Items"] else None
+
+    @staticmethod
+    def _to_order(item: Dict[str, Any]) -> Dict[str, Any]:
+        if "doc" in item:
+            return _doc(item)
+        # Orders seeded by seed_data.py only carry status and provider_id.
+        return {
+            "id": item["pk"][len("order#"):],
+            "state": item.get("status"),
+            "provider": {"id": item.get("provider_id", "").split("#", 1)[-1]},
+        }
+
+    async def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        item = await self._find(order_id)
+        return self._to_order(item) if item else None
+
+    async def get_many(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        # The sort key holds the creation time, so BatchGetItem cannot address
+        # orders by id alone; query the partitions concurrently instead.
+        items = await asyncio.gather(*(self._find(order_id) for order_id in order_ids))
+        return {order_id: self._to_order(item) for order_id, item in zip(order_ids, items) if item}
+
+    async def update(self, order_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        item = await self._find(order_id)
+        if item is None:
+            return None
+        order = self._to_order(item)
+        for key, value in fields.items():
+            target = order
+            *parents, leaf = key.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = value
+        await _run(
+            self.table.update_item,
+            Key={"pk": item["pk"], "sk": item["sk"]},
+            UpdateExpression="SET #doc = :doc, #status = :status",
+            ExpressionAttributeNames={"#doc": "doc", "#status": "status"},
+            ExpressionAttributeValues={":doc": json.dumps(order, default=str), ":status": order.get("state")},
+        )
+        return order
+
+    async def transition(self, order_id: str, fields: Dict[str, Any], states: Iterable[str],
+                         version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        item = await self._find(order_id)
+        if item is None:
+            return None
+        order = self._to_order(item)
+        current = order.get("version", 0)
+        if order.get("state") not in set(states) or (version is not None and current != version):
+            raise OrderConflict(order)
+        for key, value in fields.items():
+            target = order
+            *parents, leaf = key.split(".")
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = value
+        order["version"] = current + 1
+        try:
+            # The read above is only a snapshot; the write applies if nobody changed the order since
+            await _run(
+                self.table.update_item,
+                Key={"pk": item["pk"], "sk": item["sk"]},
+                UpdateExpression="SET #doc = :doc, #status = :status, #version = :next",
+                ConditionExpression="attribute_not_exists(#version) OR #version = :current"
+                if current == 0 else "#version = :current",
+                ExpressionAttributeNames={"#doc": "doc", "#status": "status", "#version": "version"},
+                ExpressionAttributeValues={
+                    ":doc": json.dumps(order, default=str), ":status": order.get("state"),
+                    ":next": current + 1, ":current": current,
+                },
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise OrderConflict(await self.get(order_id) or order)
+        return order
+
+
+class DynamoRatingRepository(RatingRepository):
+    def __init__(self, table):
+        self.table = table
+
+    async def add(self, rating: Dict[str, Any], keys: List[str]) -> Dict[str, int]:
+        now = time.time()
+        response = await _run(self.table.put_item, Item={
+            "pk": f"order#{rating['order_id']}", "sk": "rating", "value": rating["value"],
+            "doc": json.dumps({**rating, "keys": keys}, default=str),
+        }, ReturnValues="ALL_OLD")
+        old = response.get("Attributes")
+        previous = None
+        if old:
+            previous = int(old["value"]) if "value" in old else _doc(old).get("value")
+        delta = rating_delta(rating["value"], previous)
+        if delta:
+            names = {f"#f{n}": field.replace("histogram.", "h") for n, field in enumerate(delta)}
+            values = {f":v{n}": amount for n, amount in enumerate(delta.values())}
+            expression = "ADD " + ", ".join(f"#f{n} :v{n}" for n in range(len(delta))) + " SET updated_at = :now"
+            for key in keys:
+                await _run(
+                    self.table.update_item,
+                    Key={"pk": f"ratingstats#{key}", "sk": "stats"},
+                    UpdateExpression=expression,
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues={**values, ":now": int(now * 1000)},
+                )
+        return delta
+
+    async def stats(self, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        condition = Attr("pk").begins_with("ratingstats#")
+        if since is not None:
+            condition = condition & Attr("updated_at").gte(int(since * 1000))
+        stats, kwargs = {}, {"FilterExpression": condition}
+        while True:
+            page = await _run(self.table.scan, **kwargs)
+            for item in page["Items"]:
+                stats[item["pk"][len("ratingstats#"):]] = {
+                    "count": int(item.get("count", 0)),
+                    "sum": int(item.get("sum", 0)),
+                    "histogram": {str(value): int(item.get(f"h{value}", 0)) for value in RATING_VALUES},
+                }
+            if "LastEvaluatedKey" not in page:
+                return stats
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+class DynamoOutbox(OutboxRepository):
+    """
+    Same semantics as resources.outbox.CallbackOutbox. Claims use a
+    conditional update on `lease_until`, so only one worker wins a message.
+    """
+
+    def __init__(self, table, lease_timeout: float = 300.0):
+        self.logger = Logger()
+        self.table = table
+        self.lease_timeout = lease_timeout
+
+    def _item(self, message: Dict[str, Any], next_attempt_at: float) -> Dict[str, Any]:
+        payload = message["payload"]
+        if isinstance(payload, (bytes, bytearray)):
+            payload = bytes(payload)
+        else:
+            payload = json.dumps(payload, default=str).encode()
+        return {
+            "pk": f"outbox#{message['_id']}",
+            "sk": "message",
+            "url": message["url"],
+            "payload": payload,
+            "attempts": message.get("attempts", 0),
+            "last_error": message.get("last_error"),
+            "batched": message.get("batched"),
+            "compression": message.get("compression"),
+            "next_attempt_at": int(next_attempt_at * 1000),
+            "owner": WORKER_ID,
+            "lease_until": int((next_attempt_at + self.lease_timeout) * 1000),
+        }
+
+    async def add(self, message: Dict[str, Any]) -> bool:
+        try:
+            await _run(self.table.put_item, Item=self._item(message, time.time()))
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to persist callback {message['_id']}: {format_exception_info(e)}")
+            return False
+
+    async def ack(self, message_id: str):
+        try:
+            await _run(self.table.delete_item, Key={"pk": f"outbox#{message_id}", "sk": "message"})
+        except Exception as e:
+            self.logger.error(f"Failed to remove delivered callback {message_id}: {format_exception_info(e)}")
+
+    async def reschedule(self, message: Dict[str, Any], delay: float):
+        try:
+            await _run(self.table.put_item, Item=self._item(message, time.time() + delay))
+        except Exception as e:
+            self.logger.error(f"Failed to reschedule callback {message['_id']}: {format_exception_info(e)}")
+
+    async def dead_letter(self, message: Dict[str, Any]):
+        try:
+            item = self._item(message, time.time())
+            item["pk"] = f"deadletter#{message['_id']}"
+            await _run(self.table.put_item, Item=item)
+            await self.ack(message["_id"])
+        except Exception as e:
+            self.logger.error(f"Failed to dead-letter callback {message['_id']}: {format_exception_info(e)}")
+
+    async def claim(self, limit: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        now = int(time.time() * 1000)
+        kwargs = {"FilterExpression": Attr("pk").begins_with("outbox#") & Attr("lease_until").lt(now)}
+        claimed = 0
+        while claimed < limit:
+            page = await _run(self.table.scan, **kwargs)
+            for item in sorted(page["Items"], key=lambda item: item["next_attempt_at"]):
+                try:
+                    await _run(
+                        self.table.update_item,
+                        Key={"pk": item["pk"], "sk": "message"},
+                        UpdateExpression="SET #owner = :owner, lease_until = :lease",
+                        ConditionExpression="lease_until < :now",
+                        ExpressionAttributeNames={"#owner": "owner"},
+                        ExpressionAttributeValues={
+                            ":owner": WORKER_ID,
+                            ":lease": now + int(self.lease_timeout * 1000),
+                            ":now": now,
+                        },
+                    )
+                except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+                    continue  # another worker claimed it first
+                claimed += 1
+                yield {
+                    "_id": item["pk"][len("outbox#"):],
+                    "url": item["url"],
+                    "payload": bytes(item["payload"]),
+                    "attempts": int(item.get("attempts", 0)),
+                    "last_error": item.get("last_error"),
+                    "batched": int(item["batched"]) if item.get("batched") else None,
+                    "compression": item.get("compression"),
+                    "next_attempt_at": datetime.fromtimestamp(int(item["next_attempt_at"]) / 1000, timezone.utc),
+                    "persisted": True,
+                }
+                if claimed >= limit:
+                    return
+            if "LastEvaluatedKey" not in page:
+                return
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+async def create_dynamo_storage(table_name: str) -> Storage:
+    if boto3 is None:
+        raise RuntimeError("The dynamodb storage backend needs boto3 (pip install boto3)")
+    table = boto3.resource("dynamodb").Table(table_name)
+    return Storage(
+        "dynamodb",
+        catalog=DynamoCatalogRepository(table),
+        orders=DynamoOrderRepository(table),
+        ratings=DynamoRatingRepository(table),
+        outbox=DynamoOutbox(table),
+    )
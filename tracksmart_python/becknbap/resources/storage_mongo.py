@@ -0,0 +1,179 @@
+"""
+This module contains the MongoDB implementation of the repositories in
+resources.storage.
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from resources.catalog_cache import CATALOG_META_ID, bump_catalog_version
+from resources.catalog_search import CATALOG_PROJECTION, catalog_document, find_catalog_page
+from resources.indexes import ensure_indexes
+from resources.order_state import OrderConflict
+from resources.outbox import CallbackOutbox
+from resources.ratings import rating_delta
+from resources.storage import (
+    CatalogPage, CatalogRepository, OrderRepository, RatingRepository, Storage,
+)
+from resources.utils import RecentWrites, mongo_config, routed
+from resources.write_batcher import WriteBatcher
+
+# Order documents are returned without Mongo's ObjectId
+ORDER_PROJECTION = {"_id": 0}
+
+
+class MongoCatalogRepository(CatalogRepository):
+    """Catalog reads use the "search" read preference; the cache reloads on version changes anyway."""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db["catalog"]
+        self.reads = routed(self.collection, "search")
+
+    async def list_items(self) -> List[Dict[str, Any]]:
+        return [item async for item in self.reads.find({}, CATALOG_PROJECTION).sort("id", 1)]
+
+    async def find_page(self, query: Dict[str, Any], cursor: Optional[str], limit: int) -> CatalogPage:
+        return await find_catalog_page(self.reads, query, cursor, limit)
+
+    async def replace_all(self, items: List[Dict[str, Any]]):
+        await self.collection.delete_many({})
+        if items:
+            await self.collection.insert_many([catalog_document(item) for item in items])
+        await self.bump_version()
+
+    async def version(self) -> int:
+        meta = await self.db["catalog_meta"].find_one({"_id": CATALOG_META_ID})
+        return meta["version"] if meta else 0
+
+    async def bump_version(self) -> int:
+        return await bump_catalog_version(self.db)
+
+    async def watch(self):
+        return await self.collection.watch()
+
+
+class MongoOrderRepository(OrderRepository):
+    """
+    /confirm and /init writes go through write-behind batchers (see
+    WriteBatcher). Reads use the "status" read preference, except for orders
+    this worker wrote within `primary_after_write_seconds`, which are read
+    from the primary; so are orders a secondary does not have yet.
+    """
+
+    def __init__(self, db, config: Optional[dict] = None):
+        self.collection = db["orders"]
+        self.reads = routed(self.collection, "status")
+        self.recent_writes = RecentWrites(mongo_config()["primary_after_write_seconds"])
+        self.order_writer = WriteBatcher(self.collection, config)
+        self.init_writer = WriteBatcher(db["Order"], config)
+
+    async def insert(self, order: Dict[str, Any]):
+        self.recent_writes.mark(order["id"])
+        await self.order_writer.insert(order)
+
+    async def save_draft(self, message: Dict[str, Any]):
+        # Copy so the ObjectId added on insert does not leak into the callback
+        await self.init_writer.insert(dict(message))
+
+    async def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        if self.reads is not self.collection and order_id not in self.recent_writes:
+            order = await self.reads.find_one({"id": order_id}, ORDER_PROJECTION)
+            if order is not None:
+                return order
+        return await self.collection.find_one({"id": order_id}, ORDER_PROJECTION)
+
+    async def get_many(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        orders: Dict[str, Dict[str, Any]] = {}
+        if self.reads is not self.collection:
+            settled = [order_id for order_id in order_ids if order_id not in self.recent_writes]
+            if settled:
+                async for order in self.reads.find({"id": {"$in": settled}}, ORDER_PROJECTION):
+                    orders[order["id"]] = order
+        remaining = [order_id for order_id in order_ids if order_id not in orders]
+        if remaining:
+            async for order in self.collection.find({"id": {"$in": remaining}}, ORDER_PROJECTION):
+                orders[order["id"]] = order
+        return orders
+
+    async def update(self, order_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self.recent_writes.mark(order_id)
+        return await self.collection.find_one_and_update(
+            {"id": order_id},
+            {"$set": fields},
+            projection=ORDER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def transition(self, order_id: str, fields: Dict[str, Any], states: Iterable[str],
+                         version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        query = {"id": order_id, "state": {"$in": list(states)}}
+        if version is not None:
+            # Orders stored before versioning have no version field and count as 0
+            query["version"] = {"$in": [0, None]} if version == 0 else version
+        self.recent_writes.mark(order_id)
+        order = await self.collection.find_one_and_update(
+            query,
+            {"$set": fields, "$inc": {"version": 1}},
+            projection=ORDER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if order is not None:
+            return order
+        # Only a failed update pays for the read telling "missing" from "conflict",
+        # made on the primary so the conflict carries the state that won
+        current = await self.collection.find_one({"id": order_id}, ORDER_PROJECTION)
+        if current is None:
+            return None
+        raise OrderConflict(current)
+
+    async def close(self):
+        await self.order_writer.close()
+        await self.init_writer.close()
+
+
+class MongoRatingRepository(RatingRepository):
+    def __init__(self, db):
+        self.ratings = db["ratings"]
+        self.stats_collection = db["rating_stats"]
+
+    async def add(self, rating: Dict[str, Any], keys: List[str]) -> Dict[str, int]:
+        now = time.time()
+        # The previous rating of the order, if any, is swapped out atomically
+        previous = await self.ratings.find_one_and_replace(
+            {"order_id": rating["order_id"]},
+            {**rating, "keys": keys, "rated_at": now},
+            projection={"_id": 0, "value": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        delta = rating_delta(rating["value"], previous["value"] if previous else None)
+        if delta and keys:
+            await self.stats_collection.bulk_write(
+                [UpdateOne({"_id": key}, {"$inc": delta, "$set": {"updated_at": now}}, upsert=True) for key in keys],
+                ordered=False,
+            )
+        return delta
+
+    async def stats(self, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        query = {"updated_at": {"$gte": since}} if since is not None else {}
+        return {
+            document.pop("_id"): document
+            async for document in self.stats_collection.find(query, {"updated_at": 0})
+        }
+
+
+async def create_mongo_storage(mongo_client) -> Storage:
+    db = mongo_client.db
+    await ensure_indexes(db)
+    return Storage(
+        "mongo",
+        catalog=MongoCatalogRepository(db),
+        orders=MongoOrderRepository(db, mongo_client.config),
+        ratings=MongoRatingRepository(db),
+        outbox=CallbackOutbox(mongo_client),
+        db=db,
+        closer=mongo_client.close,
+        pinger=mongo_client.ping,
+    )
@@ -0,0 +1,448 @@
+"""
+This module contains the SQLite implementation of the repositories in
+resources.storage. With the default ":memory:" path it runs entirely in
+process, which suits local benchmarks, edge deployments and tests.
+
+sqlite3 is synchronous, so the connection is driven from a thread of its
+own (see SQLiteDatabase) rather than from the event loop.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from resources.catalog_search import catalog_document
+from resources.logger import Logger, format_exception_info
+from resources.order_state import OrderConflict
+from resources.ratings import RATING_VALUES, rating_delta
+from resources.storage import (
+    CatalogPage, CatalogRepository, OrderRepository, OutboxRepository, RatingRepository, Storage,
+)
+from resources.utils import WORKER_ID
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    category_id TEXT,
+    price_amount REAL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS catalog_category ON catalog (category_id, id);
+CREATE INDEX IF NOT EXISTS catalog_price ON catalog (price_amount, id);
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS orders (id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS order_drafts (id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ratings (
+    order_id TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    doc TEXT NOT NULL,
+    rated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rating_stats (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    sum INTEGER NOT NULL,
+    h1 INTEGER NOT NULL, h2 INTEGER NOT NULL, h3 INTEGER NOT NULL, h4 INTEGER NOT NULL, h5 INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rating_stats_updated ON rating_stats (updated_at);
+CREATE TABLE IF NOT EXISTS callback_outbox (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL NOT NULL,
+    batched INTEGER,
+    compression TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_lease ON callback_outbox (lease_until, next_attempt_at);
+CREATE TABLE IF NOT EXISTS callback_dead_letter (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    dead_lettered_at REAL NOT NULL
+);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    # Outbox tables created before batched callbacks lack the delivery columns
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(callback_outbox)")}
+    for column, kind in (("batched", "INTEGER"), ("compression", "TEXT")):
+        if column not in columns:
+            connection.execute(f"ALTER TABLE callback_outbox ADD COLUMN {column} {kind}")
+    return connection
+
+
+class SQLiteDatabase:
+    """
+    One SQLite connection, used only from a dedicated thread so queries do
+    not block the event loop. Calls run one at a time in the order they were
+    made, so a transaction never interleaves with another call on the same
+    connection, which a shared thread pool (asyncio.to_thread) would allow.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.connection: Optional[sqlite3.Connection] = None
+
+    async def open(self):
+        self.connection = await self.run(connect, self.path)
+
+    def run(self, func, *args):
+        """Run `func(*args)` on the connection's thread."""
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def execute(self, sql: str, params: Iterable[Any] = ()) -> List[tuple]:
+        """Execute one statement and return its rows."""
+        return await self.run(lambda: self.connection.execute(sql, params).fetchall())
+
+    async def close(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        await self.run(connection.close)
+        self.executor.shutdown()
+
+
+def _dumps(document: Dict[str, Any]) -> str:
+    return orjson.dumps(document, default=str).decode()
+
+
+def _set_path(document: Dict[str, Any], key: str, value: Any):
+    """Apply a Mongo-style `$set` key, where dots address nested fields."""
+    *parents, leaf = key.split(".")
+    for part in parents:
+        child = document.get(part)
+        if not isinstance(child, dict):
+            child = document[part] = {}
+        document = child
+    document[leaf] = value
+
+
+def _equals(column: str, value: Any, params: List[Any]) -> str:
+    """`column` equal to a filter value, or to any of a {"$in": [...]} list."""
+    values = value["$in"] if isinstance(value, dict) else [value]
+    params.extend(values)
+    return f"{column} IN ({', '.join('?' for _ in values)})"
+
+
+def catalog_where(query: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    Translate a query from build_catalog_query into an SQL condition. `$text`
+    becomes a case-insensitive substring match on the item name, any of the
+    words matching as with a Mongo text search.
+    """
+    clauses, params = [], []
+    for key, value in query.items():
+        if key == "$text":
+            words = value["$search"].split()
+            clauses.append("(" + " OR ".join("name LIKE ?" for _ in words) + ")")
+            params.extend(f"%{word}%" for word in words)
+        elif key == "category_id":
+            clauses.append(_equals("category_id", value, params))
+        elif key == "price_amount":
+            for operator, sql in (("$gte", ">="), ("$lte", "<=")):
+                if operator in value:
+                    clauses.append(f"price_amount {sql} ?")
+                    params.append(value[operator])
+        elif key.startswith("tags."):
+            params.append(f"$.{key}")
+            clauses.append(_equals("json_extract(doc, ?)", value, params))
+        else:
+            raise ValueError(f"Unsupported catalog filter: {key}")
+    return " AND ".join(clauses) or "1", params
+
+
+class SQLiteCatalogRepository(CatalogRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    def _documents(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return [json.loads(doc) for (doc,) in self.db.connection.execute(sql, params)]
+
+    async def list_items(self) -> List[Dict[str, Any]]:
+        return await self.db.run(self._documents, "SELECT doc FROM catalog ORDER BY id")
+
+    async def find_page(self, query: Dict[str, Any], cursor: Optional[str], limit: int) -> CatalogPage:
+        where, params = catalog_where(query)
+        if cursor:
+            where += " AND id > ?"
+            params.append(cursor)
+        documents = await self.db.run(
+            self._documents, f"SELECT doc FROM catalog WHERE {where} ORDER BY id LIMIT ?", [*params, limit + 1]
+        )
+        next_cursor = documents[limit - 1]["id"] if len(documents) > limit else None
+        return documents[:limit], next_cursor
+
+    async def replace_all(self, items: List[Dict[str, Any]]):
+        rows = []
+        for item in items:
+            document = catalog_document(item)
+            rows.append((
+                item["id"],
+                (item.get("descriptor") or {}).get("name"),
+                item.get("category_id"),
+                document["price_amount"],
+                _dumps(item),
+            ))
+
+        def write():
+            with self.db.connection as connection:
+                connection.execute("BEGIN")
+                connection.execute("DELETE FROM catalog")
+                connection.executemany("INSERT INTO catalog VALUES (?, ?, ?, ?, ?)", rows)
+
+        await self.db.run(write)
+        await self.bump_version()
+
+    async def version(self) -> int:
+        rows = await self.db.execute("SELECT version FROM catalog_meta WHERE key = 'catalog'")
+        return rows[0][0] if rows else 0
+
+    async def bump_version(self) -> int:
+        def bump():
+            connection = self.db.connection
+            connection.execute(
+                "INSERT INTO catalog_meta VALUES ('catalog', 1) "
+                "ON CONFLICT(key) DO UPDATE SET version = version + 1"
+            )
+            return connection.execute("SELECT version FROM catalog_meta WHERE key = 'catalog'").fetchone()[0]
+
+        return await self.db.run(bump)
+
+
+class SQLiteOrderRepository(OrderRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def insert(self, order: Dict[str, Any]):
+        await self.db.execute("INSERT INTO orders VALUES (?, ?)", (order["id"], _dumps(order)))
+
+    async def save_draft(self, message: Dict[str, Any]):
+        await self.db.execute("INSERT INTO order_drafts (doc) VALUES (?)", (_dumps(message),))
+
+    def _get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.connection.execute("SELECT doc FROM orders WHERE id = ?", (order_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.run(self._get, order_id)
+
+    async def get_many(self, order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        def read():
+            orders = {}
+            # Stay under SQLite's default limit on bound parameters
+            for start in range(0, len(order_ids), 900):
+                chunk = order_ids[start:start + 900]
+                rows = self.db.connection.execute(
+                    f"SELECT id, doc FROM orders WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                )
+                orders.update((order_id, json.loads(doc)) for order_id, doc in rows)
+            return orders
+
+        return await self.db.run(read)
+
+    async def update(self, order_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        def write():
+            order = self._get(order_id)
+            if order is None:
+                return None
+            for key, value in fields.items():
+                _set_path(order, key, value)
+            self.db.connection.execute(
+                "UPDATE orders SET id = ?, doc = ? WHERE id = ?", (order["id"], _dumps(order), order_id)
+            )
+            return order
+
+        return await self.db.run(write)
+
+    async def transition(self, order_id: str, fields: Dict[str, Any], states: Iterable[str],
+                         version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        states = set(states)
+
+        def write():
+            with self.db.connection as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                order = self._get(order_id)
+                if order is None:
+                    return None
+                if order.get("state") not in states or (version is not None and order.get("version", 0) != version):
+                    raise OrderConflict(order)
+                for key, value in fields.items():
+                    _set_path(order, key, value)
+                order["version"] = order.get("version", 0) + 1
+                connection.execute("UPDATE orders SET doc = ? WHERE id = ?", (_dumps(order), order_id))
+            return order
+
+        return await self.db.run(write)
+
+
+class SQLiteRatingRepository(RatingRepository):
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    async def add(self, rating: Dict[str, Any], keys: List[str]) -> Dict[str, int]:
+        document = _dumps({**rating, "keys": keys})
+
+        def write():
+            now = time.time()
+            with self.db.connection as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                row = connection.execute(
+                    "SELECT value FROM ratings WHERE order_id = ?", (rating["order_id"],)
+                ).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO ratings VALUES (?, ?, ?, ?)",
+                    (rating["order_id"], rating["value"], document, now),
+                )
+                delta = rating_delta(rating["value"], row[0] if row else None)
+                if delta:
+                    increments = (
+                        delta.get("count", 0), delta.get("sum", 0),
+                        *(delta.get(f"histogram.{value}", 0) for value in RATING_VALUES),
+                    )
+                    connection.executemany(
+                        "INSERT INTO rating_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                        "count = count + excluded.count, sum = sum + excluded.sum, h1 = h1 + excluded.h1, "
+                        "h2 = h2 + excluded.h2, h3 = h3 + excluded.h3, h4 = h4 + excluded.h4, "
+                        "h5 = h5 + excluded.h5, updated_at = excluded.updated_at",
+                        [(key, *increments, now) for key in keys],
+                    )
+            return delta
+
+        return await self.db.run(write)
+
+    async def stats(self, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        rows = await self.db.execute(
+            "SELECT key, count, sum, h1, h2, h3, h4, h5 FROM rating_stats WHERE updated_at >= ?",
+            (since if since is not None else 0,),
+        )
+        return {
+            key: {"count": count, "sum": total, "histogram": dict(zip(map(str, RATING_VALUES), histogram))}
+            for key, count, total, *histogram in rows
+        }
+
+
+class SQLiteOutbox(OutboxRepository):
+    """Same semantics as resources.outbox.CallbackOutbox, including worker leases."""
+
+    def __init__(self, db: SQLiteDatabase, lease_timeout: float = 300.0):
+        self.logger = Logger()
+        self.db = db
+        self.lease_timeout = lease_timeout
+
+    @staticmethod
+    def _payload(message: Dict[str, Any]) -> bytes:
+        payload = message["payload"]
+        return bytes(payload) if isinstance(payload, (bytes, bytearray)) else orjson.dumps(payload)
+
+    @staticmethod
+    def _epoch(value: Any) -> float:
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return value.timestamp()
+        return value if value is not None else time.time()
+
+    async def _write(self, message: Dict[str, Any], next_attempt_at: float):
+        await self.db.execute(
+            "INSERT OR REPLACE INTO callback_outbox (id, url, payload, attempts, last_error, created_at, "
+            "next_attempt_at, owner, lease_until, batched, compression) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                message["_id"], message["url"], self._payload(message),
+                message.get("attempts", 0), message.get("last_error"),
+                self._epoch(message.get("created_at")), next_attempt_at,
+                WORKER_ID, next_attempt_at + self.lease_timeout,
+                message.get("batched"), message.get("compression"),
+            ),
+        )
+
+    async def add(self, message: Dict[str, Any]) -> bool:
+        try:
+            await self._write(message, self._epoch(message.get("next_attempt_at")))
+            return True
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to persist callback {message['_id']}: {format_exception_info(e)}")
+            return False
+
+    async def ack(self, message_id: str):
+        await self.db.execute("DELETE FROM callback_outbox WHERE id = ?", (message_id,))
+
+    async def reschedule(self, message: Dict[str, Any], delay: float):
+        next_attempt_at = time.time() + delay
+        message["next_attempt_at"] = datetime.fromtimestamp(next_attempt_at, timezone.utc)
+        await self._write(message, next_attempt_at)
+
+    async def dead_letter(self, message: Dict[str, Any]):
+        row = (message["_id"], message["url"], self._payload(message), message.get("attempts", 0),
+               message.get("last_error"), time.time())
+
+        def write():
+            with self.db.connection as connection:
+                connection.execute("BEGIN")
+                connection.execute("INSERT OR REPLACE INTO callback_dead_letter VALUES (?, ?, ?, ?, ?, ?)", row)
+                connection.execute("DELETE FROM callback_outbox WHERE id = ?", (message["_id"],))
+
+        await self.db.run(write)
+
+    async def claim(self, limit: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        def lease():
+            now = time.time()
+            with self.db.connection as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                rows = connection.execute(
+                    "SELECT id, url, payload, attempts, last_error, created_at, next_attempt_at, batched, compression "
+                    "FROM callback_outbox WHERE lease_until < ? ORDER BY next_attempt_at LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                connection.executemany(
+                    "UPDATE callback_outbox SET owner = ?, lease_until = ? WHERE id = ?",
+                    [(WORKER_ID, now + self.lease_timeout, row[0]) for row in rows],
+                )
+            return rows
+
+        rows = await self.db.run(lease)
+        for message_id, url, payload, attempts, last_error, created_at, next_attempt_at, batched, compression in rows:
+            yield {
+                "_id": message_id,
+                "url": url,
+                "payload": payload,
+                "attempts": attempts,
+                "last_error": last_error,
+                "created_at": datetime.fromtimestamp(created_at, timezone.utc),
+                "next_attempt_at": datetime.fromtimestamp(next_attempt_at, timezone.utc),
+                "batched": batched,
+                "compression": compression,
+                "persisted": True,
+            }
+
+
+async def create_sqlite_storage(path: str = ":memory:") -> Storage:
+    db = SQLiteDatabase(path)
+    await db.open()
+    return Storage(
+        "sqlite",
+        catalog=SQLiteCatalogRepository(db),
+        orders=SQLiteOrderRepository(db),
+        ratings=SQLiteRatingRepository(db),
+        outbox=SQLiteOutbox(db),
+        closer=db.close,
+    )
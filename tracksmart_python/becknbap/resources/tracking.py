@@ -0,0 +1,275 @@
+"""
+This module contains the order tracking engine: the latest state of each order
+kept in an LRU with write-through history in the shipment event store, and
+push delivery of state changes to SSE subscribers and registered webhooks.
+"""
+import asyncio
+import ipaddress
+import socket
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+from models import Tracking
+from resources.logger import Logger, format_exception_info
+from resources.serialization import dump_json
+from resources.shipment_events import ShipmentEventStore
+from resources.utils import WORKER_ID, ConfigManager, RecentWrites, mongo_config, routed
+from resources.write_batcher import WriteBatcher
+
+DEFAULT_TRACKING_CONFIG = {
+    "tracking_lru_size": 100000,
+    "tracking_subscriber_queue": 100,
+    "tracking_poll_interval": 1.0,
+    "tracking_feed_ttl": 86400,
+    # Let webhooks resolve to private/loopback addresses (local development only)
+    "webhook_allow_private": False,
+}
+
+# Events stored by other workers can land this late behind ones already seen.
+POLL_OVERLAP = timedelta(seconds=5)
+
+
+def _origin(url: str):
+    parts = urlsplit(url)
+    default_port = {"http": 80, "https": 443}.get(parts.scheme)
+    return parts.scheme, (parts.hostname or "").lower(), parts.port or default_port
+
+
+async def check_webhook_url(url: str, bap_uri: Optional[str], allow_private: bool = False):
+    """
+    Raise ValueError unless `url` is an http(s) URL on the host and port of
+    `bap_uri`, the callback URI of the BAP that placed the order, and the
+    host resolves only to public addresses. Keeps webhooks from being
+    pointed at arbitrary or internal hosts.
+    """
+    scheme, host, port = _origin(url)
+    if scheme not in ("http", "https") or not host:
+        raise ValueError("callback_url must be an http(s) URL")
+    if not bap_uri:
+        raise ValueError("The order has no BAP callback URI to check callback_url against")
+    _, bap_host, bap_port = _origin(bap_uri)
+    if (host, port) != (bap_host, bap_port):
+        raise ValueError(f"callback_url must be on the BAP's host {bap_host}:{bap_port}")
+    if allow_private:
+        return
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"callback_url host {host} does not resolve")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+class TrackingStore:
+    """
+    Serves the latest `Tracking` state of an order from memory.
+
+    Every state change is appended to the shipment event store (the order's
+    full history) and to the `tracking_events` feed, both through
+    write-behind batchers, and published to the order's subscribers: SSE
+    streams get it on their queue, webhooks get it POSTed through the
+    callback dispatcher. Orders not in the LRU are read from `orders` once,
+    with the "track" read preference, except for orders recorded here within
+    `primary_after_write_seconds` and orders a secondary does not have yet,
+    which are read from the primary.
+
+    Events stored by other worker processes are followed through a change
+    stream on `tracking_events` (or by polling it every
+    `tracking_poll_interval` seconds) to keep this worker's LRU and SSE
+    streams current. Webhooks are only called by the worker that stored the
+    event. The feed only has to outlive that hand-off, so its entries expire
+    after `tracking_feed_ttl` seconds.
+    """
+
+    def __init__(self, db, dispatcher=None, config: Optional[dict] = None,
+                 shipments: Optional[ShipmentEventStore] = None):
+        self.logger = Logger()
+        self.db = db
+        self.shipments = shipments or ShipmentEventStore(db, config)
+        self.dispatcher = dispatcher
+        self.config = {**DEFAULT_TRACKING_CONFIG, **(config or {})}
+        self.latest_states: "OrderedDict[str, Tracking]" = OrderedDict()
+        self.orders = db["orders"]
+        self.order_reads = routed(self.orders, "track")
+        self.recent_writes = RecentWrites(mongo_config()["primary_after_write_seconds"])
+        self.events = db["tracking_events"]
+        self.event_writer = WriteBatcher(self.events)
+        self.webhooks = db["tracking_subscriptions"]
+        self.streams: Dict[str, Set[asyncio.Queue]] = {}
+        self.follower: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def create(cls, db, dispatcher=None):
+        config_manager = ConfigManager()
+        config = await config_manager.getConfig("cache_config")
+        store = cls(db, dispatcher, config, await ShipmentEventStore.create(db))
+        await store.events.create_index([("order_id", 1), ("timestamp", 1)])
+        await store.events.create_index("created_at", expireAfterSeconds=store.config["tracking_feed_ttl"])
+        await store.webhooks.create_index([("order_id", 1), ("url", 1)], unique=True)
+        store.follower = asyncio.create_task(store._follow())
+        return store
+
+    async def close(self):
+        if self.follower:
+            self.follower.cancel()
+            await asyncio.gather(self.follower, return_exceptions=True)
+        await self.event_writer.close()
+        await self.shipments.close()
+
+    def _remember(self, tracking: Tracking):
+        self.latest_states[tracking.order_id] = tracking
+        self.latest_states.move_to_end(tracking.order_id)
+        while len(self.latest_states) > self.config["tracking_lru_size"]:
+            self.latest_states.popitem(last=False)
+
+    async def latest(self, order_id: str) -> Optional[Tracking]:
+        tracking = self.latest_states.get(order_id)
+        if tracking is not None:
+            self.latest_states.move_to_end(order_id)
+            return tracking
+        order = None
+        if self.order_reads is not self.orders and order_id not in self.recent_writes:
+            order = await self.order_reads.find_one({"id": order_id}, {"_id": 0, "state": 1})
+        if order is None:
+            order = await self.orders.find_one({"id": order_id}, {"_id": 0, "state": 1})
+        if not order:
+            return None
+        tracking = Tracking(order_id=order_id, status=order.get("state", "In Transit"))
+        self._remember(tracking)
+        return tracking
+
+    async def latest_many(self, order_ids: List[str]) -> Dict[str, Tracking]:
+        """Like `latest` for many orders; those not in the LRU are read with one query."""
+        found: Dict[str, Tracking] = {}
+        missing = []
+        for order_id in order_ids:
+            tracking = self.latest_states.get(order_id)
+            if tracking is not None:
+                self.latest_states.move_to_end(order_id)
+                found[order_id] = tracking
+            else:
+                missing.append(order_id)
+        if self.order_reads is not self.orders:
+            settled = [order_id for order_id in missing if order_id not in self.recent_writes]
+            if settled:
+                await self._load_states(self.order_reads, settled, found)
+            missing = [order_id for order_id in missing if order_id not in found]
+        if missing:
+            await self._load_states(self.orders, missing, found)
+        return found
+
+    async def _load_states(self, orders, order_ids: List[str], found: Dict[str, Tracking]):
+        async for order in orders.find({"id": {"$in": order_ids}}, {"_id": 0, "id": 1, "state": 1}):
+            tracking = Tracking(order_id=order["id"], status=order.get("state", "In Transit"))
+            self._remember(tracking)
+            found[order["id"]] = tracking
+
+    async def record(self, order_id: str, status: str, provider_id: Optional[str] = None) -> Tracking:
+        """Store a state change and push it to every subscriber of the order."""
+        now = datetime.now(timezone.utc)
+        tracking = Tracking(order_id=order_id, status=status, timestamp=now.isoformat())
+        self._remember(tracking)
+        self.recent_writes.mark(order_id)
+        try:
+            await asyncio.gather(
+                self.shipments.append(order_id, provider_id, status, now),
+                self.event_writer.insert({**tracking.model_dump(), "worker": WORKER_ID, "created_at": now}),
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to store tracking event for {order_id}: {format_exception_info(e)}")
+        await self._publish(tracking)
+        return tracking
+
+    async def history(self, order_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """The order's most recent events, newest first."""
+        events, _, _ = await self.shipments.query(order_id=order_id, limit=limit, newest_first=True)
+        return events
+
+    def subscribe(self, order_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.config["tracking_subscriber_queue"])
+        self.streams.setdefault(order_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, order_id: str, queue: asyncio.Queue):
+        queues = self.streams.get(order_id)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self.streams[order_id]
+
+    async def register_webhook(self, order_id: str, url: str):
+        await self.webhooks.update_one(
+            {"order_id": order_id, "url": url},
+            {"$set": {"order_id": order_id, "url": url}},
+            upsert=True,
+        )
+
+    async def unregister_webhook(self, order_id: str, url: str):
+        await self.webhooks.delete_one({"order_id": order_id, "url": url})
+
+    def _push_to_streams(self, tracking: Tracking):
+        for queue in self.streams.get(tracking.order_id, ()):
+            if queue.full():
+                # Slow subscriber: drop its oldest update rather than block the writer.
+                queue.get_nowait()
+            queue.put_nowait(tracking)
+
+    async def _publish(self, tracking: Tracking):
+        self._push_to_streams(tracking)
+        if self.dispatcher is None:
+            return
+        # Registrations are read from MongoDB so webhooks added through any worker are called.
+        body = None
+        async for subscription in self.webhooks.find({"order_id": tracking.order_id}, {"_id": 0, "url": 1}):
+            if body is None:
+                body = dump_json({"tracking": tracking.model_dump()}, Dict[str, Any])
+            await self.dispatcher.submit(subscription["url"], body, action="on_track")
+
+    def _apply_remote(self, event: Dict[str, Any]):
+        """Take in an event stored by another worker."""
+        event.pop("_id", None)
+        event.pop("worker", None)
+        event.pop("created_at", None)
+        tracking = Tracking(**event)
+        cached = self.latest_states.get(tracking.order_id)
+        if cached is None or (cached.timestamp or "") <= (tracking.timestamp or ""):
+            self._remember(tracking)
+        self._push_to_streams(tracking)
+
+    async def _follow(self):
+        try:
+            pipeline = [{"$match": {"operationType": "insert", "fullDocument.worker": {"$ne": WORKER_ID}}}]
+            async with await self.events.watch(pipeline) as stream:
+                async for change in stream:
+                    self._apply_remote(change["fullDocument"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.info(f"Tracking change stream unavailable, polling instead: {format_exception_info(e)}")
+            await self._poll()
+
+    async def _poll(self):
+        since = datetime.now(timezone.utc)
+        seen: Dict[Any, str] = {}
+        while True:
+            await asyncio.sleep(self.config["tracking_poll_interval"])
+            try:
+                floor = (since - POLL_OVERLAP).isoformat()
+                cursor = self.events.find(
+                    {"timestamp": {"$gte": floor}, "worker": {"$ne": WORKER_ID}}
+                ).sort("timestamp", 1)
+                async for event in cursor:
+                    if event["_id"] in seen:
+                        continue
+                    seen[event["_id"]] = event["timestamp"]
+                    self._apply_remote(event)
+                since = datetime.now(timezone.utc)
+                # Forget events that fell out of the overlap window.
+                floor = (since - POLL_OVERLAP).isoformat()
+                seen = {event_id: ts for event_id, ts in seen.items() if ts >= floor}
+            except Exception as e:
+                self.logger.error(f"Tracking poll failed: {format_exception_info(e)}")
@@ -1,13 +1,94 @@
 # utils.py
 import os
+import inspect
 import json
-import aiofiles
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
 from pymongo import AsyncMongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
 
+from resources.config_schema import validate_config
 from resources.logger import Logger, format_exception_info
+from resources.metrics import MongoCommandMetrics, MongoPoolMetrics
 from settings import BASE_DIR
 
+# Identifies this worker process in state shared through MongoDB
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Parsed appRepo/*.json files: name -> (mtime, config)
+_config_cache: Dict[str, Tuple[float, dict]] = {}
+# Last time each config file was stat'ed for changes
+_config_checked: Dict[str, float] = {}
+# Seconds between checks for an edited config file (0 checks on every call)
+CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", "2"))
+
+DEFAULT_MONGO_POOL_CONFIG = {
+    "max_pool_size": 100,
+    "min_pool_size": 0,
+    "max_idle_time_ms": 300000,
+    "max_connecting": 2,
+    "wait_queue_timeout_ms": 2000,
+    # Connections all workers together may open; when set, each worker gets its share (see WEB_CONCURRENCY)
+    "cluster_max_connections": 0,
+    # Tried in order; ones whose library is not installed are skipped
+    "compressors": ["zstd", "snappy", "zlib"],
+    "zlib_compression_level": 1,
+    "local_threshold_ms": 15,
+    # Read preference for reads without a route of their own, and per route (search, status, track).
+    # Secondaries are opt-in: a route reads from them only when set here
+    "read_preference": "primary",
+    "read_preferences": {},
+    # -1 for no limit, else at least 90
+    "max_staleness_seconds": -1,
+    # Reads of a document this worker wrote within this many seconds go to the primary
+    "primary_after_write_seconds": 90,
+}
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def _env_overrides(config_name: str, config: dict) -> dict:
+    """
+    Apply environment overrides named <CONFIG_NAME>__<KEY>, e.g.
+    MONGO_CONFIG__DB_NAME or CALLBACK_CONFIG__WORKERS. Values are kept as
+    strings where the file has a string and decoded as JSON otherwise.
+    """
+    prefix = config_name.upper() + "__"
+    overridden = dict(config)
+    for name, raw in os.environ.items():
+        if not name.startswith(prefix):
+            continue
+        key = name[len(prefix):].lower()
+        if isinstance(config.get(key), str):
+            overridden[key] = raw
+            continue
+        try:
+            overridden[key] = json.loads(raw)
+        except ValueError:
+            overridden[key] = raw
+    return overridden
+
+
 class ConfigManager:
+    """
+    Loads appRepo/<name>.json once per process and serves it from memory.
+    The file is re-read when its modification time changes, checked at most
+    every CONFIG_RELOAD_INTERVAL seconds, so edits take effect for the next
+    caller without a restart. Each load is validated against the file's
+    schema (see resources.config_schema); an edit that fails it is logged and
+    the last valid config stays in use.
+    """
+
     def __init__(self):
         self.logger = Logger()
         try:
@@ -15,23 +96,102 @@ class ConfigManager:
         except Exception as e:
             self.logger.error(format_exception_info(e))
 
-    async def getConfig(self, config_name: str) -> dict:
-        config = dict()
+    def get(self, config_name: str) -> dict:
+        path = os.path.join(self.appRepoPath, config_name + ".json")
+        cached = _config_cache.get(config_name)
+        now = time.monotonic()
+        if cached is not None and now - _config_checked.get(config_name, 0.0) < CONFIG_RELOAD_INTERVAL:
+            return dict(cached[1])
+        _config_checked[config_name] = now
         try:
-            async with aiofiles.open(os.path.join(self.appRepoPath, config_name + ".json"), "r") as json_file:
-                content = await json_file.read()
-                # print("content", content)
-                config = json.loads(content)
-                # print("config",config)
+            mtime = os.stat(path).st_mtime
+            if cached is None or cached[0] != mtime:
+                with open(path, "r") as json_file:
+                    config = validate_config(config_name, _env_overrides(config_name, json.load(json_file)))
+                if cached is not None:
+                    self.logger.info(f"Reloaded {config_name} after a change on disk")
+                cached = _config_cache[config_name] = (mtime, config)
         except Exception as e:
             self.logger.error(format_exception_info(e))
-        return config
+            if cached is None:
+                return _env_overrides(config_name, {})
+        return dict(cached[1])
+
+    async def getConfig(self, config_name: str) -> dict:
+        return self.get(config_name)
+
+
+def mongo_config() -> dict:
+    return {**DEFAULT_MONGO_POOL_CONFIG, **ConfigManager().get("mongo_config")}
+
+
+def worker_pool_size(config: dict) -> int:
+    """
+    max_pool_size, capped at this worker's share of cluster_max_connections
+    when that is set, so adding workers does not multiply the connections
+    each mongod has to serve.
+    """
+    size = config["max_pool_size"]
+    if config["cluster_max_connections"]:
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+        size = min(size, max(1, config["cluster_max_connections"] // workers))
+    return max(size, config["min_pool_size"], 1)
+
+
+def read_preference(route: str):
+    """The read preference configured for `route`, e.g. "search" or "status"."""
+    config = mongo_config()
+    mode = config["read_preferences"].get(route, config["read_preference"])
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference for {route}: {mode}")
+    if mode == "primary":
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=config["max_staleness_seconds"])
+
+
+def routed(collection, route: str):
+    """
+    `collection` reading with the preference of `route`. Writes through it
+    still go to the primary. Returned unchanged for primary reads.
+    """
+    preference = read_preference(route)
+    if preference == Primary():
+        return collection
+    return collection.with_options(read_preference=preference)
+
+
+class RecentWrites:
+    """
+    Keys (order ids) this worker wrote recently. Routed reads of them go to
+    the primary, so a secondary that is behind cannot return the state from
+    before the write.
+    """
+
+    def __init__(self, seconds: float, max_size: int = 100000):
+        self.seconds = seconds
+        self.max_size = max_size
+        self.written: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, key: str):
+        self.written[key] = time.monotonic()
+        self.written.move_to_end(key)
+        while len(self.written) > self.max_size:
+            self.written.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        horizon = time.monotonic() - self.seconds
+        # Oldest first, so expired keys are dropped from the front
+        while self.written and next(iter(self.written.values())) < horizon:
+            self.written.popitem(last=False)
+        return key in self.written
+
 
 class MongoClient:
-    def __init__(self, client: AsyncMongoClient, db_name: str, collection_name: str):
+    def __init__(self, client: AsyncMongoClient, db_name: str, collection_name: str, config: dict = None):
         self.logger = Logger()
         try:
             self.client = client
+            self.config = config or {}
             self.db = client[db_name]
             # self.collection = self.db[collection_name]
         except Exception as e:
@@ -39,6 +199,11 @@ class MongoClient:
 
     @classmethod
     async def create(cls):
+        """
+        Build the client without contacting the server: AsyncMongoClient
+        connects in the background on first use, so startup does not wait
+        on server selection. Use ping() to check the connection.
+        """
         logger = Logger()
         try:
             connection_string_template = (
@@ -62,20 +227,56 @@ class MongoClient:
                 # app_name=app_name
             )
 
-            # Initialize AsyncMongoClient
-            client = AsyncMongoClient(connection_string, serverSelectionTimeoutMS=5000)
-            # Test connection
-            await client.admin.command('ping')
-            logger.info("Connected to MongoDB")
-            return cls(client, db_name=db_name, collection_name=collection_name)
+            pool = {**DEFAULT_MONGO_POOL_CONFIG, **mongo_config}
+            options: Dict[str, Any] = {
+                "maxPoolSize": worker_pool_size(pool),
+                "minPoolSize": pool["min_pool_size"],
+                "maxIdleTimeMS": pool["max_idle_time_ms"],
+                "maxConnecting": pool["max_connecting"],
+                "waitQueueTimeoutMS": pool["wait_queue_timeout_ms"],
+                "localThresholdMS": pool["local_threshold_ms"],
+                "readPreference": pool["read_preference"],
+            }
+            # Routes pass their own staleness bound; pymongo rejects one with primary reads
+            if pool["max_staleness_seconds"] != -1 and pool["read_preference"] != "primary":
+                options["maxStalenessSeconds"] = pool["max_staleness_seconds"]
+            if pool["compressors"]:
+                options["compressors"] = pool["compressors"]
+                options["zlibCompressionLevel"] = pool["zlib_compression_level"]
+
+            # Initialize AsyncMongoClient; pymongo warns about compressors it cannot use and drops them
+            with warnings.catch_warnings(record=True) as skipped:
+                warnings.simplefilter("always")
+                client = AsyncMongoClient(
+                    connection_string,
+                    serverSelectionTimeoutMS=mongo_config.get("server_selection_timeout_ms", 5000),
+                    event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()],
+                    **options,
+                )
+            for warning in skipped:
+                logger.info(f"MongoDB client option skipped: {warning.message}")
+            logger.info(f"MongoDB pool: maxPoolSize={options['maxPoolSize']}, minPoolSize={options['minPoolSize']}")
+            return cls(client, db_name=db_name, collection_name=collection_name, config=mongo_config)
         except Exception as e:
             logger.error(f"MongoDB connection failed: {format_exception_info(e)}")
             return None
 
+    async def ping(self) -> bool:
+        """Whether the server answers a ping within the server selection timeout."""
+        try:
+            await self.client.admin.command('ping')
+            return True
+        except Exception as e:
+            self.logger.error(f"MongoDB ping failed: {format_exception_info(e)}")
+            return False
+
     async def close(self):
         """Close the MongoDB client connection."""
         if self.client:
-            self.client.close()
+            closing = self.client.close()
+            # AsyncMongoClient.close is a coroutine; test stand-ins close synchronously
+            if inspect.isawaitable(closing):
+                await closing
             self.logger.info("MongoDB connection closed")
 
     async def get_collection(self, collection_name: str):
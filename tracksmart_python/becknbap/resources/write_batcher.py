@@ -0,0 +1,97 @@
+"""
+This module contains the write-behind batcher used for order writes.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, WriteError
+
+from resources.logger import Logger, format_exception_info
+
+DEFAULT_WRITE_CONFIG = {
+    "write_batch_size": 500,
+    "write_batch_delay_ms": 5,
+    "max_pending_writes": 10000,
+}
+
+
+class WriteBatcher:
+    """
+    Collects write operations for one collection and flushes them with a
+    single unordered `bulk_write`, either when `write_batch_size` operations
+    are waiting or `write_batch_delay_ms` after the first one arrived.
+
+    Every caller awaits its own future, which resolves once its operation is
+    acknowledged or raises the error MongoDB reported for that operation, so
+    a failed write in a batch only fails its own request. At most
+    `max_pending_writes` operations are outstanding; further callers wait.
+    """
+
+    def __init__(self, collection, config: Optional[dict] = None):
+        self.logger = Logger()
+        self.collection = collection
+        self.config = {**DEFAULT_WRITE_CONFIG, **(config or {})}
+        self.batch_size = self.config["write_batch_size"]
+        self.delay = self.config["write_batch_delay_ms"] / 1000
+        self.slots = asyncio.Semaphore(self.config["max_pending_writes"])
+        self.pending: List[Tuple[Any, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushes: set = set()
+
+    async def insert(self, document: Dict[str, Any]):
+        """Insert a document as part of the next batch."""
+        await self.submit(InsertOne(document))
+
+    async def submit(self, operation):
+        """Queue a pymongo write operation and wait until it is flushed."""
+        async with self.slots:
+            future = asyncio.get_running_loop().create_future()
+            self.pending.append((operation, future))
+            if len(self.pending) >= self.batch_size:
+                self._flush_now()
+            elif self.timer is None:
+                self.timer = asyncio.get_running_loop().call_later(self.delay, self._flush_now)
+            await future
+
+    async def close(self):
+        """Flush whatever is pending and wait for in-flight batches."""
+        if self.pending:
+            self._flush_now()
+        if self.flushes:
+            await asyncio.gather(*self.flushes, return_exceptions=True)
+
+    def _flush_now(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[Any, asyncio.Future]]):
+        failed: Dict[int, Exception] = {}
+        try:
+            await self.collection.bulk_write([operation for operation, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed[write_error["index"]] = WriteError(
+                    write_error.get("errmsg"), write_error.get("code"), write_error
+                )
+            if e.details.get("writeConcernErrors"):
+                failed = {index: e for index in range(len(batch))}
+        except Exception as e:
+            self.logger.error(
+                f"Bulk write of {len(batch)} operations to {self.collection.name} failed: "
+                f"{format_exception_info(e)}"
+            )
+            failed = {index: e for index in range(len(batch))}
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in failed:
+                future.set_exception(failed[index])
+            else:
+                future.set_result(None)
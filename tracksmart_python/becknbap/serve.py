@@ -0,0 +1,54 @@
+"""
+Entry point for running the BPP with several worker processes.
+
+Each worker is a separate uvicorn process importing main:app, so it runs its
+own lifespan: its own MongoDB connection pool, callback dispatcher and
+caches. State that has to agree across workers goes through MongoDB:
+
+- catalog cache: reloads on the catalog change stream / version counter
+- idempotency keys: claimed in `idempotency_keys` so a request runs once
+- callback outbox: messages are leased to one worker and reclaimed on expiry
+- tracking: events from other workers are followed to update LRU and SSE
+
+Run from tracksmart_python/becknbap:
+    python serve.py --workers 8 --port 8000
+
+With gunicorn (uvicorn-worker installed):
+    gunicorn main:app -k uvicorn_worker.UvicornWorker -w 8 -b 0.0.0.0:8000
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the BPP API with multiple worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        help="worker processes (default: WEB_CONCURRENCY or the number of CPUs)",
+    )
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5, help="seconds to keep idle connections open")
+    args = parser.parse_args()
+    # Workers size their MongoDB pool to their share of cluster_max_connections
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        access_log=False,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
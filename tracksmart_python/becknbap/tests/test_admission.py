@@ -0,0 +1,138 @@
+"""
+Admission control (resources/admission.py) driven through the app's ASGI
+stack on the in-memory SQLite backend. Callbacks are recorded, not sent.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+import main
+from resources.admission import AdmissionController
+from resources.storage import create_storage
+
+pytestmark = pytest.mark.anyio
+
+
+def status_request(bap_id: str) -> dict:
+    return {
+        "context": {
+            "domain": "retail", "country": "IND", "city": "std:080", "action": "status",
+            "bap_id": bap_id, "bap_uri": "http://bap.invalid/", "transaction_id": str(uuid.uuid4()),
+            "message_id": str(uuid.uuid4()), "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "message": {"order": {"id": str(uuid.uuid4())}},
+    }
+
+
+@pytest.fixture
+async def client():
+    await main.start_services(await create_storage("memory"))
+
+    async def record(url, payload, action=None, bap_id=None):
+        return True
+
+    main.callback_dispatcher.submit = record
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bpp") as client:
+        yield client
+    await main.stop_services()
+
+
+def admit_with(config: dict, queue_depth=None):
+    main.admission_controller = AdmissionController(config, queue_depth)
+
+
+async def post_status(client: httpx.AsyncClient, bap_id: str) -> httpx.Response:
+    return await client.post("/status", json=status_request(bap_id))
+
+
+async def test_rate_limited_request_gets_429_with_retry_after(client):
+    admit_with({"default_rate": 1.0, "default_burst": 2.0})
+    assert (await post_status(client, "bap")).status_code == 200
+    assert (await post_status(client, "bap")).status_code == 200
+
+    response = await post_status(client, "bap")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    body = response.json()
+    assert body["message"]["ack"]["status"] == "NACK"
+    assert body["error"]["code"] == "RATE_LIMITED"
+
+
+async def test_in_flight_cap_sheds_as_overloaded(client):
+    admit_with({"max_in_flight": 0})
+    response = await post_status(client, "bap")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["error"]["code"] == "OVERLOADED"
+
+
+async def test_full_callback_queue_sheds_as_overloaded(client):
+    admit_with({"callback_queue_threshold": 0.9}, queue_depth=lambda: 0.95)
+    response = await post_status(client, "bap")
+    assert response.status_code == 429
+    assert response.json()["error"]["code"] == "OVERLOADED"
+
+    admit_with({"callback_queue_threshold": 0.9}, queue_depth=lambda: 0.5)
+    assert (await post_status(client, "bap")).status_code == 200
+
+
+async def test_token_bucket_refills_over_time(client):
+    admit_with({"default_rate": 20.0, "default_burst": 1.0})
+    assert (await post_status(client, "bap")).status_code == 200
+    assert (await post_status(client, "bap")).status_code == 429
+    # One token comes back every 1/rate seconds
+    await asyncio.sleep(0.1)
+    assert (await post_status(client, "bap")).status_code == 200
+
+
+async def test_bap_under_its_rate_is_admitted_while_another_floods(client):
+    admit_with({
+        "default_rate": 100.0,
+        "default_burst": 100.0,
+        "baps": {"noisy-bap": {"rate": 0.01, "burst": 5.0}},
+    })
+
+    async def polite():
+        statuses = []
+        for _ in range(10):
+            statuses.append((await post_status(client, "polite-bap")).status_code)
+            await asyncio.sleep(0.01)
+        return statuses
+
+    flood = [post_status(client, "noisy-bap") for _ in range(50)]
+    polite_statuses, *noisy = await asyncio.gather(polite(), *flood)
+    noisy_statuses = [response.status_code for response in noisy]
+
+    assert polite_statuses == [200] * 10
+    assert noisy_statuses.count(200) == 5
+    assert noisy_statuses.count(429) == 45
+    assert all(response.json()["error"]["code"] == "RATE_LIMITED"
+               for response in noisy if response.status_code == 429)
+
+
+async def test_reject_status_200_sends_a_plain_nack(client):
+    admit_with({"max_in_flight": 0, "reject_status": 200})
+    response = await post_status(client, "bap")
+    assert response.status_code == 200
+    assert "retry-after" not in response.headers
+    assert response.json()["message"]["ack"]["status"] == "NACK"
+
+
+async def test_nacks_with_503_until_started(client):
+    main.startup_task = asyncio.get_running_loop().create_future()
+    try:
+        response = await post_status(client, "bap")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "5"
+        assert response.json()["message"]["ack"]["status"] == "NACK"
+        assert response.json()["error"]["code"] == "STARTING"
+        assert (await client.get("/health/ready")).status_code == 503
+
+        main.startup_task.set_result(None)
+        assert (await post_status(client, "bap")).status_code == 200
+    finally:
+        main.startup_task = None
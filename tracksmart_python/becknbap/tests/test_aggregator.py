@@ -0,0 +1,41 @@
+"""
+Collecting fanned-out on_search callbacks (resources/aggregator.py).
+"""
+from resources.aggregator import SearchCollector, merge_catalogs
+
+
+def page(number, cursor, next_cursor, *item_ids):
+    catalog = {"items": [{"id": item_id, "descriptor": {"name": item_id}} for item_id in item_ids]}
+    return catalog, {"page": number, "cursor": cursor, "next_cursor": next_cursor}
+
+
+def test_paged_callbacks_count_once_complete():
+    collector = SearchCollector(["http://bpp1", "http://bpp2"], quorum=1.0)
+    collector.add("bpp1", *page(1, None, "b", "a", "b"))
+    collector.add("bpp2", {"items": [{"id": "z"}]})
+    assert not collector.enough.is_set()
+
+    # The hedged copy of the search is answered too: its pages are dropped
+    collector.add("bpp1", *page(1, None, "b", "a", "b"))
+    collector.add("bpp1", *page(2, "b", "d", "c", "d"))
+    collector.add("bpp1", *page(2, "b", "d", "c", "d"))
+    assert not collector.enough.is_set()
+
+    collector.add("bpp1", *page(3, "d", None, "e"))
+    assert collector.enough.is_set()
+    assert [item["id"] for item in collector.catalogs["bpp1"]["items"]] == ["a", "b", "c", "d", "e"]
+    assert len(merge_catalogs(collector.catalogs)) == 6
+
+
+def test_single_page_search_completes_on_first_page():
+    collector = SearchCollector(["http://bpp1"], quorum=1.0, all_pages=False)
+    collector.add("bpp1", *page(1, None, "b", "a", "b"))
+    assert collector.enough.is_set()
+
+
+def test_failed_bpps_lower_the_bar():
+    collector = SearchCollector(["http://bpp1", "http://bpp2"], quorum=1.0)
+    collector.add("bpp1", *page(1, None, None, "a"))
+    assert not collector.enough.is_set()
+    collector.fail()
+    assert collector.enough.is_set()
@@ -0,0 +1,38 @@
+"""
+Validation of the appRepo config files (resources/config_schema.py).
+"""
+import json
+import os
+
+import pytest
+
+from resources.config_schema import CONFIG_SCHEMAS, validate_config
+from resources.utils import ConfigManager
+
+
+@pytest.mark.parametrize("config_name", sorted(CONFIG_SCHEMAS))
+def test_shipped_config_files_are_valid(config_name):
+    with open(os.path.join(ConfigManager().appRepoPath, config_name + ".json")) as config_file:
+        validate_config(config_name, json.load(config_file))
+
+
+def test_values_are_coerced_and_unknown_keys_kept():
+    config = validate_config("callback_config", {"workers": "8", "timeout": 5, "custom": [1]})
+    assert config == {"workers": 8, "timeout": 5.0, "custom": [1]}
+
+
+def test_missing_and_null_keys_keep_the_defaults():
+    assert validate_config("gateway_config", {"quorum": None}) == {}
+
+
+@pytest.mark.parametrize("config_name, config", [
+    ("callback_config", {"workers": "lots"}),
+    ("cache_config", {"search_page_size": 0}),
+    ("gateway_config", {"quorum": 1.5}),
+    ("mongo_config", {"read_preferences": {"search": "closest"}}),
+    ("offload_config", {"executor": "gpu"}),
+    ("callback_config", {"bap_delivery": {"bap": {"compression": "brotli"}}}),
+])
+def test_invalid_values_are_rejected(config_name, config):
+    with pytest.raises(ValueError):
+        validate_config(config_name, config)
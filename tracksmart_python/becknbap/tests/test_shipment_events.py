@@ -0,0 +1,68 @@
+"""
+Shipment history pagination (resources/shipment_events.py) against an
+in-memory MongoDB (mongomock-motor).
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from resources.shipment_events import ShipmentEventStore, event_record
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def store():
+    store = ShipmentEventStore(mongomock_motor.AsyncMongoMockClient()["test"])
+    yield store
+    await store.close()
+
+
+async def read_all(store, cursor=None, limit=500):
+    events, pages = [], 0
+    while True:
+        page, cursor, more = await store.query(provider_id="p1", cursor=cursor, limit=limit)
+        events += page
+        pages += 1
+        assert len(cursor or "") < 2048
+        if not more:
+            return events, cursor, pages
+
+
+@pytest.mark.parametrize("spacing", [timedelta(milliseconds=1), timedelta(0)])
+async def test_dense_window_pages_forward(store, spacing):
+    # 2500 events of one provider within 2.5 seconds (or all at once), far denser than the cursor remembers
+    await store.collection.insert_many([
+        event_record(f"o{i}", "p1", "In Transit", START + i * spacing) for i in range(2500)
+    ])
+    events, cursor, pages = await read_all(store)
+    assert [event["order_id"] for event in events] == [f"o{i}" for i in range(2500)]
+    assert pages == 5
+
+    # An event stored late, just behind the position, is still picked up once
+    await store.collection.insert_one(event_record("late", "p1", "Delivered", START + 2490 * spacing))
+    events, cursor, pages = await read_all(store, cursor)
+    assert [event["order_id"] for event in events] == ["late"]
+    events, _, _ = await read_all(store, cursor)
+    assert events == []
+
+
+async def test_late_event_within_overlap(store):
+    await store.collection.insert_many([
+        event_record(f"o{i}", "p1", "In Transit", START + timedelta(seconds=i)) for i in range(10)
+    ])
+    events, cursor, _ = await read_all(store, limit=3)
+    assert len(events) == 10
+
+    await store.collection.insert_one(event_record("late", "p1", "Delivered", START + timedelta(seconds=6.5)))
+    events, _, _ = await read_all(store, cursor)
+    assert [event["order_id"] for event in events] == ["late"]
+
+
+async def test_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        await store.query(provider_id="p1", cursor="not-a-cursor")
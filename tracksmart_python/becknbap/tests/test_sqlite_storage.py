@@ -0,0 +1,62 @@
+"""
+The SQLite backend (resources/storage_sqlite.py) and the endpoints it does
+not support.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from resources.order_state import OrderConflict
+from resources.storage import create_storage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def storage():
+    storage = await create_storage("memory")
+    yield storage
+    await storage.close()
+
+
+async def test_concurrent_transitions_do_not_interleave(storage):
+    await storage.orders.insert({"id": "o1", "state": "Confirmed", "version": 0})
+
+    async def bump(version):
+        try:
+            return await storage.orders.transition("o1", {"note": version}, ["Confirmed"], version)
+        except OrderConflict:
+            return None
+
+    results = await asyncio.gather(*(bump(0) for _ in range(20)))
+    assert sum(result is not None for result in results) == 1
+    assert (await storage.orders.get("o1"))["version"] == 1
+
+
+async def test_rating_stats_and_catalog_version(storage):
+    await storage.ratings.add({"order_id": "o1", "value": 4}, ["provider:p1"])
+    await storage.ratings.add({"order_id": "o1", "value": 5}, ["provider:p1"])
+    stats = (await storage.ratings.stats())["provider:p1"]
+    assert (stats["count"], stats["sum"], stats["histogram"]["5"]) == (1, 5, 1)
+
+    await storage.catalog.replace_all([{"id": "a", "descriptor": {"name": "A"}}])
+    assert await storage.catalog.bump_version() == 2
+    assert [item["id"] for item in await storage.catalog.list_items()] == ["a"]
+
+
+async def test_tracking_endpoints_answer_501(storage):
+    await main.start_services(storage)
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bpp") as client:
+            responses = [
+                await client.get("/shipments/events", params={"order_id": "o1"}),
+                await client.post("/track/subscribe", json={"order_id": "o1", "callback_url": "http://bap/x"}),
+            ]
+        for response in responses:
+            assert response.status_code == 501
+            assert "not supported by the sqlite storage backend" in response.json()["detail"]
+    finally:
+        await main.stop_services()